@@ -160,6 +160,39 @@ class EquivalencePartitioner(object):
         else:
             return False
 
+    @staticmethod
+    def make_key_index(keys):
+        """
+        Index the keys by the value in each position of the key, so that
+        the keys that are equivalent to another key can be looked up
+        instead of comparing the key with every key.
+
+        :param keys: iterable of keys
+        :return: dict, (position, value) -> set of keys
+        """
+        key_index = collections.defaultdict(set)
+        for key in keys:
+            for position, value in enumerate(key):
+                if value is not None:
+                    key_index[(position, value)].add(key)
+        return key_index
+
+    @staticmethod
+    def find_equivalent_keys(key, key_index):
+        """
+        Return the keys of the index that are equivalent to the key,
+        using the same rule as calculate_key_equivalence.
+
+        :param key: tuple
+        :param key_index: dict, see make_key_index
+        :return: set of keys
+        """
+        equivalent_keys = set()
+        for position, value in enumerate(key):
+            if value is not None:
+                equivalent_keys.update(key_index.get((position, value), ()))
+        return equivalent_keys
+
     def calculate_comparison_key(self, obj):
         return self.equiv_comparison_key_func(obj)
 
@@ -0,0 +1,188 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2020, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+import logging
+
+from seed.lib.mcm import cleaners
+from seed.models import (
+    Column,
+    ColumnMapping,
+)
+from seed.models.column_mappings import COLUMN_VERSION_KEY, get_column_version
+from seed.utils.cache import get_cache_raw_many, set_cache_raw
+
+_log = logging.getLogger(__name__)
+
+
+def build_cleaner_ontology(org):
+    """Return the ontology of a cleaner that knows about a mapping's unit types
+
+    :param org: organization instance
+    :returns: dict, ontology to pass to the cleaners.Cleaner
+
+    This tells us how to try to cast types during cleaning, based on the Column
+    definition in the database.
+
+    Here we're also dealing with Pint with a tuple 'type' acting as a sort of
+    parameterized type like `Pint(SquareMetres)` ... just using `pint` as the
+    type doesn't tell the whole story of the type ...  eg. the "type" is
+    ('quantity', 'm**2') and the cleaner can dispatch sensibly on this.
+
+    Note that this is generally going to be on the *raw* column. Let's assume
+    an example where incoming data has created raw columns 'Gross Building Area
+    (m2)' and 'Gross Building Area (ft2)' ...  we'll need to disambiguate a
+    mapping to mapped column 'gross_building_area' based on the raw column
+    name.
+    """
+
+    def _translate_unit_to_type(unit):
+        if unit is None or unit == 'String':
+            return 'string'
+
+        return unit.lower()
+
+    # start with the predefined types
+    ontology = {'types': Column.retrieve_db_types()['types']}
+
+    query_set = Column.objects.filter(organization=org, units_pint__isnull=False)
+    for column in query_set:
+        # DON'T OVERRIDE DEFAULT COLUMNS WITH DATA FROM RAW COLUMNS
+        # THIS CAN HAPPEN IF YOU UPLOAD A FILE WITH A HEADER IDENTICAL TO THE DEFAULT COLUMN_NAME THAT ALSO HAS UNITS
+        # LIKE 'site_eui' OR 'source_eui'
+        # if column.column_name not in ontology['types']:
+        # add available pint types as a tuple type
+        ontology['types'][column.column_name] = ('quantity', column.units_pint)
+
+    # find all the extra data columns with units and add them as well
+    for column in Column.objects.filter(organization=org,
+                                        is_extra_data=True).select_related('unit'):
+        if column.unit:
+            column_type = _translate_unit_to_type(column.unit.get_unit_type_display())
+            ontology['types'][column.column_name] = column_type
+
+    return ontology
+
+
+class MappingPlan(object):
+    """
+    Everything that map_row_chunk needs to know about how to map the rows of an import file:
+    the column mappings by table, the delimited fields to expand and the cleaner ontology.
+
+    The plan is built once in map_data and cached. Each map_row_chunk task then loads it with
+    a single cache read instead of querying the organization's Columns and ColumnMappings again.
+    A plan is tagged with the version of the organization's columns that it was built from and
+    is rebuilt when that version changes, i.e. when a Column or ColumnMapping has been changed.
+    """
+    CACHE_KEY = 'SEED:mapping_plan:{}'
+
+    def __init__(self, import_file_id, version, table_mappings, delimited_fields, ontology):
+        self.import_file_id = import_file_id
+        self.version = version
+        self.table_mappings = table_mappings
+        self.delimited_fields = delimited_fields
+        self.ontology = ontology
+
+    @classmethod
+    def build(cls, import_file):
+        """
+        Build the mapping plan of the import file from the organization's column mappings and
+        cache it.
+
+        :param import_file: ImportFile instance
+        :return: MappingPlan
+        """
+        org = import_file.import_record.super_organization
+
+        # read the version before building so that a change made while building invalidates the plan
+        version = get_column_version(org.id)
+
+        # get all the table_mappings that exist for the organization
+        table_mappings = ColumnMapping.get_column_mappings_by_table_name(org)
+
+        # Remove any of the mappings that are not in the current list of raw columns because this
+        # can really mess up the mapping of delimited_fields.
+        # Ideally the table_mapping method would be attached to the import_file_id, someday...
+        list_of_raw_columns = import_file.first_row_columns
+        if list_of_raw_columns:
+            for table, mappings in table_mappings.copy().items():
+                for raw_column_name in mappings.copy():
+                    if raw_column_name not in list_of_raw_columns:
+                        del table_mappings[table][raw_column_name]
+
+            # check that the dictionaries are not empty, if empty, then delete.
+            for table in table_mappings.copy():
+                if not table_mappings[table]:
+                    del table_mappings[table]
+
+        # figure out which import field is defined as the unique field that may have a delimiter of
+        # individual values (e.g. tax lot ids). The definition of the delimited field is currently
+        # hard coded
+        try:
+            delimited_fields = {}
+            if 'TaxLotState' in table_mappings:
+                tmp = list(table_mappings['TaxLotState'].keys())[
+                    list(table_mappings['TaxLotState'].values()).index(ColumnMapping.DELIMITED_FIELD)
+                ]
+                delimited_fields['jurisdiction_tax_lot_id'] = {
+                    'from_field': tmp,
+                    'to_table': 'TaxLotState',
+                    'to_field_name': 'jurisdiction_tax_lot_id',
+                }
+
+        except ValueError:
+            delimited_fields = {}
+            # field does not exist in mapping list, so ignoring
+
+        # If a single file is being imported into both the tax lot and property table, then add
+        # an extra custom mapping for the cross-related data. If the data are not being imported into
+        # the property table then make sure to skip this so that superfluous property entries are
+        # not created.
+        if 'PropertyState' in table_mappings:
+            if delimited_fields and delimited_fields['jurisdiction_tax_lot_id']:
+                table_mappings['PropertyState'][
+                    delimited_fields['jurisdiction_tax_lot_id']['from_field']] = (
+                    'PropertyState', 'lot_number', 'Lot Number', False)
+
+        plan = cls(import_file.id, version, table_mappings, delimited_fields,
+                   build_cleaner_ontology(org))
+        plan.save()
+
+        return plan
+
+    @classmethod
+    def load(cls, import_file):
+        """
+        Return the cached mapping plan of the import file. The plan is rebuilt if it is not in
+        the cache or if the organization's columns changed since it was built.
+
+        :param import_file: ImportFile instance
+        :return: MappingPlan
+        """
+        org_id = import_file.import_record.super_organization_id
+        plan_key = cls.CACHE_KEY.format(import_file.id)
+        version_key = COLUMN_VERSION_KEY.format(org_id)
+
+        cached = get_cache_raw_many([plan_key, version_key])
+        data = cached.get(plan_key)
+        if data is None or version_key not in cached or data['version'] != cached[version_key]:
+            _log.debug("Mapping plan for import file {} is missing or stale, rebuilding".format(
+                import_file.id))
+            return cls.build(import_file)
+
+        return cls(import_file.id, data['version'], data['table_mappings'],
+                   data['delimited_fields'], data['ontology'])
+
+    def save(self):
+        set_cache_raw(self.CACHE_KEY.format(self.import_file_id), {
+            'version': self.version,
+            'table_mappings': self.table_mappings,
+            'delimited_fields': self.delimited_fields,
+            'ontology': self.ontology,
+        })
+
+    def cleaner(self):
+        """Return a cleaner instance that knows about the mapping's unit types"""
+        return cleaners.Cleaner(self.ontology)
@@ -16,7 +16,7 @@ from django.db import (
     IntegrityError,
     transaction,
 )
-from django.db.models import Subquery
+from django.db.models import Count, Q, Subquery
 
 from functools import reduce
 
@@ -43,8 +43,7 @@ from seed.models import (
 from seed.models.auditlog import AUDIT_IMPORT
 from seed.utils.match import (
     empty_criteria_filter,
-    match_merge_link,
-    matching_filter_criteria,
+    match_merge_link_views,
     matching_criteria_column_names,
 )
 from seed.utils.merge import merge_states_with_views
@@ -255,22 +254,20 @@ def inclusive_match_and_merge(unmatched_state_ids, org, StateClass):
 
     # Collapse groups of matches found in the previous step into 1 -State per group
     merges_within_file = 0
-    priorities = Column.retrieve_priorities(org)
+    merge_id_groups = []
     for ids in matched_id_groups:
         if len(ids) == 1:
             # If there's only 1, no merging is needed, so just promote the ID.
             promoted_ids += ids
         else:
-            states = [s for s in StateClass.objects.filter(pk__in=ids).order_by('-id')]
-            merge_state = states.pop()
+            # Merge the -States in the order that they were created
+            merge_id_groups.append(sorted(ids))
+            merges_within_file += len(ids) - 1
 
-            merges_within_file += len(states)
-
-            while len(states) > 0:
-                newer_state = states.pop()
-                merge_state = save_state_match(merge_state, newer_state, priorities)
-
-            promoted_ids.append(merge_state.id)
+    if merge_id_groups:
+        priorities = Column.retrieve_priorities(org)
+        merged_states = save_state_matches(merge_id_groups, priorities, StateClass)
+        promoted_ids += [merged_state.id for merged_state in merged_states]
 
     # Flag the soon to be promoted ID -States as having gone through matching
     StateClass.objects.filter(pk__in=promoted_ids).update(data_state=DATA_STATE_MATCHING)
@@ -338,57 +335,62 @@ def states_to_views(unmatched_state_ids, org, cycle, StateClass):
     # If one match is found, pass that along.
     # If multiple matches are found, merge them together, pass along the resulting record.
     # Otherwise, add current -State to be promoted as is.
+    promote_state_ids = list(promote_states.values_list('id', flat=True))
     merged_between_existing_count = 0
-    merge_state_pairs = []
-    for state in unmatched_states:
-        matching_criteria = matching_filter_criteria(state, column_names)
-        existing_state_matches = StateClass.objects.filter(
-            pk__in=Subquery(existing_cycle_views.values('state_id')),
-            **matching_criteria
-        )
-        count = existing_state_matches.count()
-
-        if count > 1:
-            merged_between_existing_count += count
-            existing_state_ids = list(existing_state_matches.order_by('updated').values_list('id', flat=True))
+    merge_id_pairs = []
+    for existing_state_ids, incoming_state_ids in match_incoming_states(
+        unmatched_states, existing_cycle_views, column_names, StateClass
+    ):
+        if not existing_state_ids:
+            promote_state_ids += incoming_state_ids
+            continue
+
+        if len(existing_state_ids) > 1:
+            merged_between_existing_count += len(existing_state_ids)
+            existing_state_ids = list(
+                StateClass.objects.filter(pk__in=existing_state_ids).order_by('updated').values_list('id', flat=True)
+            )
             # The following merge action ignores merge protection and prioritizes -States by most recent AuditLog
             merged_state = merge_states_with_views(existing_state_ids, org.id, 'System Match', StateClass)
-            merge_state_pairs.append((merged_state, state))
-        elif count == 1:
-            merge_state_pairs.append((existing_state_matches.first(), state))
+            existing_state_id = merged_state.id
         else:
-            promote_states = promote_states | StateClass.objects.filter(pk=state.id)
+            existing_state_id = existing_state_ids[0]
+
+        merge_id_pairs += [(existing_state_id, state_id) for state_id in incoming_state_ids]
 
-    # Process -States into -Views either directly (promoted_ids) or post-merge (merge_state_pairs).
-    _log.debug("There are %s merge_state_pairs and %s promote_states" % (len(merge_state_pairs), promote_states.count()))
+    # Process -States into -Views either directly (promote_state_ids) or post-merge (merge_id_pairs).
+    _log.debug("There are %s merge_id_pairs and %s promote_states" % (len(merge_id_pairs), len(promote_state_ids)))
+    pair_states = StateClass.objects.in_bulk(
+        [state_id for state_id_pair in merge_id_pairs for state_id in state_id_pair]
+    )
+    existing_views = {
+        view.state_id: view
+        for view
+        in ViewClass.objects.filter(state_id__in=[existing_state_id for existing_state_id, _state_id in merge_id_pairs])
+    }
     priorities = Column.retrieve_priorities(org.pk)
     processed_views = []
-    promoted_ids = []
     merged_state_ids = []
     try:
         with transaction.atomic():
-            for state_pair in merge_state_pairs:
-                existing_state, newer_state = state_pair
-                existing_view = ViewClass.objects.get(state_id=existing_state.id)
+            for existing_state_id, newer_state_id in merge_id_pairs:
+                existing_view = existing_views[existing_state_id]
 
                 # Merge -States and assign new/merged -State to existing -View
-                merged_state = save_state_match(existing_state, newer_state, priorities)
+                merged_state = save_state_match(pair_states[existing_state_id], pair_states[newer_state_id], priorities)
                 existing_view.state = merged_state
                 existing_view.save()
 
                 processed_views.append(existing_view)
                 merged_state_ids.append(merged_state.id)
 
-            for state in promote_states:
-                promoted_ids.append(state.id)
-                created_view = state.promote(cycle)
-                processed_views.append(created_view)
+            processed_views += StateClass.objects.filter(pk__in=promote_state_ids).promote(cycle)
     except IntegrityError as e:
         raise IntegrityError("Could not merge results with error: %s" % (e))
 
-    new_count = len(promoted_ids)
+    new_count = len(promote_state_ids)
     # update merge_state while excluding any states that were a product of a previous, file-inclusive merge
-    StateClass.objects.filter(pk__in=promoted_ids).exclude(merge_state=MERGE_STATE_MERGED).update(
+    StateClass.objects.filter(pk__in=promote_state_ids).exclude(merge_state=MERGE_STATE_MERGED).update(
         merge_state=MERGE_STATE_NEW
     )
     matched_count = StateClass.objects.filter(pk__in=merged_state_ids).update(
@@ -399,28 +401,54 @@ def states_to_views(unmatched_state_ids, org, cycle, StateClass):
     return list(set(processed_views)), duplicate_count, new_count, matched_count, merged_between_existing_count
 
 
+def match_incoming_states(incoming_states, existing_views, column_names, StateClass):
+    """
+    Match incoming -States against the -States of existing -Views in a single
+    query. The incoming and existing -States are grouped together by their
+    matching criteria values, the same way the -States are grouped in
+    inclusive_match_and_merge, so None values match each other.
+
+    Returns a list of (existing_state_ids, incoming_state_ids) tuples, one for
+    each group with an incoming -State. existing_state_ids is an empty list if
+    the incoming -States have no match.
+
+    :param incoming_states: QS of -States that are not attached to a -View
+    :param existing_views: QS of -Views to match against, e.g. the -Views of a Cycle
+    :param column_names: list, matching criteria column names
+    :param StateClass: PropertyState or TaxLotState
+    :return: list of tuples
+    """
+    is_existing = Q(pk__in=Subquery(existing_views.values('state_id')))
+
+    return list(
+        StateClass.objects.
+        filter(is_existing | Q(pk__in=Subquery(incoming_states.values('id')))).
+        values(*column_names).
+        annotate(
+            existing_state_ids=ArrayAgg('id', filter=is_existing),
+            incoming_state_ids=ArrayAgg('id', filter=~is_existing),
+            incoming_count=Count('id', filter=~is_existing),
+        ).
+        filter(incoming_count__gt=0).
+        values_list('existing_state_ids', 'incoming_state_ids')
+    )
+
+
 def link_views(merged_views, ViewClass):
     """
-    Run each of the given -Views through a linking round.
+    Run the given -Views through a linking round.
 
     For details on the actual linking logic, please refer to the the
-    match_merge_link() method.
+    match_merge_link_views() method.
     """
     if ViewClass == PropertyView:
         state_class_name = "PropertyState"
     else:
         state_class_name = "TaxLotState"
 
-    processed_views = []
-    for view in merged_views:
-        _merge_count, _link_count, view_id = match_merge_link(view.id, state_class_name)
-
-        if view_id is not None:
-            processed_views.append(ViewClass.objects.get(pk=view_id))
-        else:
-            processed_views.append(view)
+    view_ids = match_merge_link_views([view.id for view in merged_views], state_class_name)
 
-    return processed_views
+    return list(ViewClass.objects.filter(pk__in=view_ids).select_related('state', 'cycle'))
 
 
 def save_state_match(state1, state2, priorities):
@@ -444,9 +472,9 @@ def save_state_match(state1, state2, priorities):
     assert AuditLogClass.objects.filter(state=state1).count() >= 1
     assert AuditLogClass.objects.filter(state=state2).count() >= 1
 
-    # NJACHECK - is this logic correct?
-    state_1_audit_log = AuditLogClass.objects.filter(state=state1).first()
-    state_2_audit_log = AuditLogClass.objects.filter(state=state2).first()
+    # Use the most recent audit logs, a state merged by save_state_matches has a chain of logs
+    state_1_audit_log = AuditLogClass.objects.filter(state=state1).order_by('-id').first()
+    state_2_audit_log = AuditLogClass.objects.filter(state=state2).order_by('-id').first()
 
     AuditLogClass.objects.create(organization=state1.organization,
                                  parent1=state_1_audit_log,
@@ -459,8 +487,21 @@ def save_state_match(state1, state2, priorities):
                                  import_filename=None,
                                  record_type=AUDIT_IMPORT)
 
-    # If the two states being merged were just imported from the same import file, carry the import_file_id into the new
-    # state. Also merge the lot_number fields so that pairing can work correctly on the resulting merged record
+    _carry_import_file(merged_state, state1, state2)
+
+    # Set the merged_state to merged
+    merged_state.merge_state = MERGE_STATE_MERGED
+    merged_state.save()
+
+    return merged_state
+
+
+def _carry_import_file(merged_state, state1, state2):
+    """
+    If the two states being merged were just imported from the same import file, carry the
+    import_file_id into the merged state. Also merge the lot_number fields so that pairing can
+    work correctly on the resulting merged record.
+    """
     # Possible conditions:
     # state1.data_state = 2, state1.merge_state = 0 and state2.data_state = 2, state2.merge_state = 0
     # state1.data_state = 0, state1.merge_state = 2 and state2.data_state = 2, state2.merge_state = 0
@@ -482,8 +523,123 @@ def save_state_match(state1, state2, priorities):
                 if joined_lots:
                     merged_state.lot_number = ';'.join(joined_lots)
 
+
+def _merge_state_pair_in_memory(state1, state2, priorities, StateClass):
+    """
+    Return a new, unsaved state of merging the contents of state2 into state1, in the same way
+    as save_state_match. state1 may itself be an unsaved merged state, so a group of states can
+    be folded one state at a time.
+
+    :param state1: PropertyState or TaxLotState
+    :param state2: PropertyState or TaxLotState
+    :param priorities: dict, column names and the priorities of the merging of data
+    :param StateClass: PropertyState or TaxLotState
+    :return: PropertyState or TaxLotState
+    """
+    merged_state = StateClass(organization_id=state1.organization_id)
+    merged_state = merging.merge_states(merged_state, [state1, state2], priorities[StateClass.__name__])
+
+    _carry_import_file(merged_state, state1, state2)
+
     # Set the merged_state to merged
     merged_state.merge_state = MERGE_STATE_MERGED
-    merged_state.save()
-
     return merged_state
+
+
+def save_state_matches(state_id_groups, priorities, StateClass):
+    """
+    Merge each group of states into a single new state. This gives the same
+    result as folding a group with save_state_match, oldest state first, but the
+    merges are done in memory and the states and audit logs of all the groups
+    are created in bulk.
+
+    As with save_state_match, a state is created for each step of the fold
+    (i.e. a group of n states creates n - 1 states, the last one being the
+    merged state) and each step has a 'System Match' audit log whose
+    parent_state1 is the state of the previous step (or the oldest state) and
+    whose parent_state2 is the state merged in, so the merged states can be
+    unmerged.
+
+    :param state_id_groups: list of lists, IDs of the states to merge, oldest first
+    :param priorities: dict, column names and the priorities of the merging of data
+    :param StateClass: PropertyState or TaxLotState
+    :return: list, the merged states in the order of state_id_groups
+    """
+    AuditLogClass = PropertyAuditLog if StateClass == PropertyState else TaxLotAuditLog
+
+    all_ids = [state_id for ids in state_id_groups for state_id in ids]
+    states_by_id = StateClass.objects.in_bulk(all_ids)
+
+    # The most recent audit log of each state, as used by save_state_match
+    state_audit_logs = {}
+    for audit_log in AuditLogClass.objects.filter(state_id__in=all_ids).order_by('-id'):
+        state_audit_logs.setdefault(audit_log.state_id, audit_log)
+    assert len(state_audit_logs) == len(states_by_id)
+
+    state_groups = [[states_by_id[state_id] for state_id in ids] for ids in state_id_groups]
+
+    # The states of the steps of each fold, the last one being the merged state. Each step is
+    # built from the previous one, so a group is only folded once.
+    step_state_groups = []
+    for states in state_groups:
+        step_states = []
+        previous_state = states[0]
+        for state in states[1:]:
+            previous_state = _merge_state_pair_in_memory(previous_state, state, priorities, StateClass)
+            step_states.append(previous_state)
+        step_state_groups.append(step_states)
+    merged_states = [step_states[-1] for step_states in step_state_groups]
+
+    with transaction.atomic():
+        StateClass.objects.bulk_create_states(
+            [step_state for step_states in step_state_groups for step_state in step_states]
+        )
+
+        if StateClass == PropertyState:
+            # Pairwise merging keeps the measures, scenarios, etc. of the newest state. Only a few
+            # states have any, so find those first instead of checking each of them.
+            newest_state_ids = [states[-1].id for states in state_groups]
+            with_relationships = set(
+                PropertyState.objects.filter(pk__in=newest_state_ids).filter(
+                    Q(scenarios__isnull=False) |
+                    Q(building_files__isnull=False) |
+                    Q(simulation__isnull=False) |
+                    Q(propertymeasure__isnull=False)
+                ).values_list('id', flat=True)
+            )
+            for merged_state, states in zip(merged_states, state_groups):
+                if states[-1].id in with_relationships:
+                    PropertyState.merge_relationships(merged_state, states[-2], states[-1])
+
+        # Create the audit log chains one link at a time across all of the groups, parent1 of a
+        # link has to be saved before the next link can be created
+        chain_heads = [state_audit_logs[states[0].id] for states in state_groups]
+        link = 1
+        while True:
+            links = []
+            for index, (step_states, states) in enumerate(zip(step_state_groups, state_groups)):
+                if link >= len(states):
+                    continue
+
+                links.append((index, AuditLogClass(
+                    organization_id=states[0].organization_id,
+                    parent1=chain_heads[index],
+                    parent2=state_audit_logs[states[link].id],
+                    parent_state1=states[0] if link == 1 else step_states[link - 2],
+                    parent_state2=states[link],
+                    state=step_states[link - 1],
+                    name='System Match',
+                    description='Automatic Merge',
+                    import_filename=None,
+                    record_type=AUDIT_IMPORT
+                )))
+
+            if not links:
+                break
+
+            AuditLogClass.objects.bulk_create([audit_log for _index, audit_log in links])
+            for index, audit_log in links:
+                chain_heads[index] = audit_log
+            link += 1
+
+    return merged_states
@@ -9,6 +9,7 @@ import hashlib
 import json
 import logging
 import math
+import os
 import tempfile
 
 try:
@@ -731,6 +732,16 @@ class ImportFile(NotDeletableModel, TimeStampedModel):
         self._local_file.seek(0)
         return self._local_file
 
+    def remove_local_file(self):
+        """Close and delete the local copy of the file made by local_file, if there is one"""
+        if hasattr(self, '_local_file'):
+            self._local_file.close()
+            try:
+                os.remove(self._local_file.name)
+            except OSError:
+                pass
+            del self._local_file
+
     @property
     def data_rows(self):
         """Iterable of rows, made of iterable of column values of the raw data"""
@@ -9,7 +9,6 @@ from __future__ import absolute_import
 
 import collections
 import copy
-import hashlib
 import json
 import os
 import traceback
@@ -18,20 +17,18 @@ from builtins import str
 from collections import namedtuple
 from datetime import date, datetime
 from itertools import chain
-from math import ceil
 
 from celery import chord, shared_task
+from celery.exceptions import MaxRetriesExceededError
 from celery.utils.log import get_task_logger
-from django.contrib.gis.geos import GEOSGeometry
 from django.db import IntegrityError, DataError
-from django.db import connection, transaction
-from django.db.utils import ProgrammingError
+from django.db import transaction
 from django.utils import timezone as tz
-from django.utils.timezone import make_naive
 from past.builtins import basestring
 from unidecode import unidecode
 
 from seed.data_importer.equivalence_partitioner import EquivalencePartitioner
+from seed.data_importer.mapping_plan import MappingPlan, build_cleaner_ontology
 from seed.data_importer.match import (
     match_and_link_incoming_properties_and_taxlots,
 )
@@ -46,15 +43,15 @@ from seed.lib.mcm import cleaners, mapper, reader
 from seed.lib.mcm.mapper import expand_rows
 from seed.lib.mcm.utils import batch
 from seed.lib.progress_data.progress_data import ProgressData
-from seed.lib.superperms.orgs.models import Organization
 from seed.models import (
     ASSESSED_BS,
     ASSESSED_RAW,
     PORTFOLIO_BS,
     PORTFOLIO_RAW,
     Column,
-    ColumnMapping,
     Meter,
+    MeterReading,
+    MeterReadingAggregate,
     PropertyState,
     PropertyView,
     TaxLotView,
@@ -74,7 +71,13 @@ from seed.models.data_quality import (
     Rule,
 )
 from seed.utils.buildings import get_source_type
+from seed.utils.cache import (
+    delete_cache_many,
+    get_cache_raw_many,
+    set_cache_raw,
+)
 from seed.utils.geocode import geocode_buildings
+from seed.utils.hashing import hash_state_object
 from seed.utils.ubid import decode_unique_ids
 
 # from seed.utils.cprofile import cprofile
@@ -83,9 +86,15 @@ _log = get_task_logger(__name__)
 
 STR_TO_CLASS = {'TaxLotState': TaxLotState, 'PropertyState': PropertyState}
 
+# How long the results of the batches of a GreenButton import are kept while waiting for the
+# other batches, in seconds
+GREENBUTTON_BATCH_TIMEOUT = 60 * 60 * 24
+# How often _finish_greenbutton_save checks whether all the batches are saved, in seconds
+GREENBUTTON_FINISH_INTERVAL = 15
+
 
 @shared_task(ignore_result=True)
-def check_data_chunk(model, ids, dq_id):
+def check_data_chunk(model, ids, dq_id, chunk=0):
     if model == 'PropertyState':
         qs = PropertyState.objects.filter(id__in=ids)
     elif model == 'TaxLotState':
@@ -96,7 +105,7 @@ def check_data_chunk(model, ids, dq_id):
 
     d = DataQualityCheck.retrieve(super_org.get_parent().id)
     d.check_data(model, qs.iterator())
-    d.save_to_cache(dq_id)
+    d.save_to_cache(dq_id, chunk)
 
 
 @shared_task(ignore_result=True)
@@ -146,6 +155,10 @@ def do_checks(org_id, propertystate_ids, taxlotstate_ids, import_file_id=None):
     )
     progress_data.total = len(tasks)
     progress_data.save()
+
+    # each task saves its results in its own chunk of the cache
+    DataQualityCheck.initialize_cache(dq_id, len(tasks))
+
     if tasks:
         # specify the chord as an immutable with .si
         chord(tasks, interval=15)(finish_checking.si(progress_data.key))
@@ -193,47 +206,9 @@ def _build_cleaner(org):
     :param org: organization instance
     :returns: cleaner instance
 
-    This tells us how to try to cast types during cleaning, based on the Column
-    definition in the database.
-
-    Here we're also dealing with Pint with a tuple 'type' acting as a sort of
-    parameterized type like `Pint(SquareMetres)` ... just using `pint` as the
-    type doesn't tell the whole story of the type ...  eg. the "type" is
-    ('quantity', 'm**2') and the cleaner can dispatch sensibly on this.
-
-    Note that this is generally going to be on the *raw* column. Let's assume
-    an example where incoming data has created raw columns 'Gross Building Area
-    (m2)' and 'Gross Building Area (ft2)' ...  we'll need to disambiguate a
-    mapping to mapped column 'gross_building_area' based on the raw column
-    name.
+    See `build_cleaner_ontology` for how the types are determined from the Columns.
     """
-
-    def _translate_unit_to_type(unit):
-        if unit is None or unit == 'String':
-            return 'string'
-
-        return unit.lower()
-
-    # start with the predefined types
-    ontology = {'types': Column.retrieve_db_types()['types']}
-
-    query_set = Column.objects.filter(organization=org, units_pint__isnull=False)
-    for column in query_set:
-        # DON'T OVERRIDE DEFAULT COLUMNS WITH DATA FROM RAW COLUMNS
-        # THIS CAN HAPPEN IF YOU UPLOAD A FILE WITH A HEADER IDENTICAL TO THE DEFAULT COLUMN_NAME THAT ALSO HAS UNITS
-        # LIKE 'site_eui' OR 'source_eui'
-        # if column.column_name not in ontology['types']:
-        # add available pint types as a tuple type
-        ontology['types'][column.column_name] = ('quantity', column.units_pint)
-
-    # find all the extra data columns with units and add them as well
-    for column in Column.objects.filter(organization=org,
-                                        is_extra_data=True).select_related('unit'):
-        if column.unit:
-            column_type = _translate_unit_to_type(column.unit.get_unit_type_display())
-            ontology['types'][column.column_name] = column_type
-
-    return cleaners.Cleaner(ontology)
+    return cleaners.Cleaner(build_cleaner_ontology(org))
 
 
 @shared_task(ignore_result=True)
@@ -246,66 +221,19 @@ def map_row_chunk(ids, file_pk, source_type, prog_key, **kwargs):
     :param prog_key: string, key of the progress key
     """
     progress_data = ProgressData.from_key(prog_key)
-    import_file = ImportFile.objects.get(pk=file_pk)
+    import_file = ImportFile.objects.select_related('import_record__super_organization').get(pk=file_pk)
     save_type = PORTFOLIO_BS
     if source_type == ASSESSED_RAW:
         save_type = ASSESSED_BS
 
-    org = Organization.objects.get(pk=import_file.import_record.super_organization.pk)
-
-    # get all the table_mappings that exist for the organization
-    table_mappings = ColumnMapping.get_column_mappings_by_table_name(org)
-
-    # Remove any of the mappings that are not in the current list of raw columns because this
-    # can really mess up the mapping of delimited_fields.
-    # Ideally the table_mapping method would be attached to the import_file_id, someday...
-    list_of_raw_columns = import_file.first_row_columns
-    if list_of_raw_columns:
-        for table, mappings in table_mappings.copy().items():
-            for raw_column_name in mappings.copy():
-                if raw_column_name not in list_of_raw_columns:
-                    del table_mappings[table][raw_column_name]
+    org = import_file.import_record.super_organization
 
-        # check that the dictionaries are not empty, if empty, then delete.
-        for table in table_mappings.copy():
-            if not table_mappings[table]:
-                del table_mappings[table]
-
-    map_cleaner = _build_cleaner(org)
-
-    # *** BREAK OUT INTO SEPARATE METHOD ***
-    # figure out which import field is defined as the unique field that may have a delimiter of
-    # individual values (e.g. tax lot ids). The definition of the delimited field is currently
-    # hard coded
-    try:
-        delimited_fields = {}
-        if 'TaxLotState' in table_mappings:
-            tmp = list(table_mappings['TaxLotState'].keys())[
-                list(table_mappings['TaxLotState'].values()).index(ColumnMapping.DELIMITED_FIELD)
-            ]
-            delimited_fields['jurisdiction_tax_lot_id'] = {
-                'from_field': tmp,
-                'to_table': 'TaxLotState',
-                'to_field_name': 'jurisdiction_tax_lot_id',
-            }
-
-    except ValueError:
-        delimited_fields = {}
-        # field does not exist in mapping list, so ignoring
-
-    # _log.debug("my table mappings are {}".format(table_mappings))
-    # _log.debug("delimited_field that will be expanded and normalized: {}".format(delimited_fields))
-
-    # If a single file is being imported into both the tax lot and property table, then add
-    # an extra custom mapping for the cross-related data. If the data are not being imported into
-    # the property table then make sure to skip this so that superfluous property entries are
-    # not created.
-    if 'PropertyState' in table_mappings:
-        if delimited_fields and delimited_fields['jurisdiction_tax_lot_id']:
-            table_mappings['PropertyState'][
-                delimited_fields['jurisdiction_tax_lot_id']['from_field']] = (
-                'PropertyState', 'lot_number', 'Lot Number', False)
-    # *** END BREAK OUT ***
+    # the table mappings, delimited fields and cleaner types are computed once per import file
+    # in map_data, see MappingPlan.
+    mapping_plan = MappingPlan.load(import_file)
+    table_mappings = mapping_plan.table_mappings
+    delimited_fields = mapping_plan.delimited_fields
+    map_cleaner = mapping_plan.cleaner()
 
     try:
         with transaction.atomic():
@@ -338,6 +266,13 @@ def map_row_chunk(ids, file_pk, source_type, prog_key, **kwargs):
                 # methods
                 map_model_obj = None
 
+                # The hash of a state without any data. Mapped rows with this hash are skipped.
+                empty_hash = hash_state_object(STR_TO_CLASS[table](organization=org),
+                                               include_extra_data=False)
+
+                # The mapped states of the whole chunk are inserted together after mapping
+                mapped_states = []
+
                 # Loop over all the rows
                 for original_row in data:
                     # expand the row into multiple rows if needed with the delimited_field replaced
@@ -374,7 +309,7 @@ def map_row_chunk(ids, file_pk, source_type, prog_key, **kwargs):
                         map_model_obj.bounding_box = original_row.bounding_box
                         map_model_obj.import_file = import_file
                         map_model_obj.source_type = save_type
-                        map_model_obj.organization = import_file.import_record.super_organization
+                        map_model_obj.organization = org
                         if hasattr(map_model_obj, 'data_state'):
                             map_model_obj.data_state = DATA_STATE_MAPPING
                         if hasattr(map_model_obj, 'clean'):
@@ -385,10 +320,7 @@ def map_row_chunk(ids, file_pk, source_type, prog_key, **kwargs):
                         # make sure that the object hasn't already been created. For example, in
                         # the test data the tax lot id is the same for many rows. Make sure
                         # to only create/save the object if it hasn't been created before.
-                        if hash_state_object(map_model_obj, include_extra_data=False) == \
-                            hash_state_object(
-                                STR_TO_CLASS[table](organization=map_model_obj.organization),
-                                include_extra_data=False):
+                        if hash_state_object(map_model_obj, include_extra_data=False) == empty_hash:
                             # Skip this object as it has no data...
                             _log.warn(
                                 "Skipping property or taxlot during mapping because it is identical to another row")
@@ -402,21 +334,24 @@ def map_row_chunk(ids, file_pk, source_type, prog_key, **kwargs):
                                 _store_raw_footprint_and_create_rule(footprint_details, table, org, import_file,
                                                                      original_row, map_model_obj)
 
-                        # There was an error with a field being too long [> 255 chars].
-                        map_model_obj.save()
-
-                        # Create an audit log record for the new map_model_obj that was created.
-
-                        AuditLogClass = PropertyAuditLog if isinstance(
-                            map_model_obj, PropertyState) else TaxLotAuditLog
-                        AuditLogClass.objects.create(
-                            organization=org,
-                            state=map_model_obj,
-                            name='Import Creation',
-                            description='Creation from Import file.',
-                            import_filename=import_file,
-                            record_type=AUDIT_IMPORT
-                        )
+                        mapped_states.append(map_model_obj)
+
+                # There was an error with a field being too long [> 255 chars].
+                STR_TO_CLASS[table].objects.bulk_create_states(mapped_states)
+
+                # Create an audit log record for each of the new states that were created.
+                AuditLogClass = PropertyAuditLog if table == 'PropertyState' else TaxLotAuditLog
+                AuditLogClass.objects.bulk_create([
+                    AuditLogClass(
+                        organization=org,
+                        state=mapped_state,
+                        name='Import Creation',
+                        description='Creation from Import file.',
+                        import_filename=import_file,
+                        record_type=AUDIT_IMPORT
+                    )
+                    for mapped_state in mapped_states
+                ])
 
                 # Make sure that we've saved all of the extra_data column names from the first item
                 # in list
@@ -536,12 +471,12 @@ def _data_quality_check_create_tasks(org_id, property_state_ids, taxlot_state_id
     if property_state_ids:
         id_chunks = [[obj for obj in chunk] for chunk in batch(property_state_ids, 100)]
         for ids in id_chunks:
-            tasks.append(check_data_chunk.s("PropertyState", ids, dq_id))
+            tasks.append(check_data_chunk.s("PropertyState", ids, dq_id, len(tasks)))
 
     if taxlot_state_ids:
         id_chunks_tl = [[obj for obj in chunk] for chunk in batch(taxlot_state_ids, 100)]
         for ids in id_chunks_tl:
-            tasks.append(check_data_chunk.s("TaxLotState", ids, dq_id))
+            tasks.append(check_data_chunk.s("TaxLotState", ids, dq_id, len(tasks)))
 
     return tasks
 
@@ -599,6 +534,9 @@ def map_data(import_file_id, remap=False, mark_as_done=True):
     progress_data = ProgressData(func_name='map_data', unique_id=import_file_id)
     progress_data.delete()
 
+    # compute how the file is mapped once, instead of in every map_row_chunk task
+    MappingPlan.build(import_file)
+
     tasks = _map_data_create_tasks(import_file_id, progress_data.key)
     if tasks:
         chord(tasks)(finish_mapping.si(import_file_id, mark_as_done, progress_data.key))
@@ -614,7 +552,7 @@ def _save_raw_data_chunk(chunk, file_pk, progress_key):
     """
     Save the raw data to the database
 
-    :param chunk: list, ids to process
+    :param chunk: list, rows to process
     :param file_pk: ImportFile Primary Key
     :param progress_key: string, Progress Key to append progress
     :return: Bool, Always true
@@ -623,11 +561,12 @@ def _save_raw_data_chunk(chunk, file_pk, progress_key):
 
     # Save our "column headers" and sample rows for F/E.
     source_type = get_source_type(import_file)
+    organization = import_file.import_record.super_organization
     try:
         with transaction.atomic():
+            raw_properties = []
             for c in chunk:
-                raw_property = PropertyState(
-                    organization=import_file.import_record.super_organization)
+                raw_property = PropertyState(organization=organization)
                 raw_property.import_file = import_file
 
                 # sanitize c and remove any diacritics
@@ -648,8 +587,10 @@ def _save_raw_data_chunk(chunk, file_pk, progress_key):
                 raw_property.extra_data = new_chunk
                 raw_property.source_type = source_type
                 raw_property.data_state = DATA_STATE_IMPORT
-                raw_property.organization = import_file.import_record.super_organization
-                raw_property.save()
+                raw_properties.append(raw_property)
+
+            # the whole chunk is inserted at once instead of saving one state at a time
+            PropertyState.objects.bulk_create_states(raw_properties)
     except IntegrityError as e:
         raise IntegrityError("Could not save_raw_data_chunk with error: %s" % (e))
 
@@ -660,6 +601,29 @@ def _save_raw_data_chunk(chunk, file_pk, progress_key):
     return True
 
 
+@shared_task(ignore_result=True)
+def _save_raw_data_csv_chunk(file_pk, offset, num_rows, progress_key):
+    """
+    Save a chunk of the raw data of a CSV file to the database. The rows are not passed in the
+    task message. Instead, the import file is reopened and only the chunk described by `offset`
+    and `num_rows` is read, which keeps the size of the task messages independent of the size of
+    the file.
+
+    :param file_pk: ImportFile Primary Key
+    :param offset: int, start of the chunk, as returned by the parser's `chunk_offsets`
+    :param num_rows: int, number of rows in the chunk
+    :param progress_key: string, Progress Key to append progress
+    :return: Bool, Always true
+    """
+    import_file = ImportFile.objects.get(pk=file_pk)
+    try:
+        chunk = list(reader.CSVParser(import_file.local_file).read_chunk(offset, num_rows))
+    finally:
+        import_file.remove_local_file()
+
+    return _save_raw_data_chunk(chunk, file_pk, progress_key)
+
+
 @shared_task(ignore_result=True)
 def finish_raw_save(results, file_pk, progress_key):
     """
@@ -719,9 +683,10 @@ def _save_greenbutton_data_create_tasks(file_pk, progress_key):
     data for 1 Property and 1 energy type. Subsequently, this means 1
     GreenButton import contains MeterReadings for only 1 Meter.
 
-    By first getting or creating the single Meter for this file's MeterReadings,
-    the ID of this Meter can be passed to the individual tasks that will
-    actually create the readings.
+    The readings are streamed from the file and a task is sent for each batch
+    as soon as it is parsed, so the readings are never all held in memory (as
+    they would be in the signatures of a chord). Once the whole file is parsed,
+    _finish_greenbutton_save is sent with the number of batches.
     """
     progress_data = ProgressData.from_key(progress_key)
 
@@ -733,75 +698,118 @@ def _save_greenbutton_data_create_tasks(file_pk, progress_key):
     import_file.matching_results_data = {}
     import_file.save()
 
-    parser = reader.GreenButtonParser(import_file.local_file)
-    raw_meter_data = list(parser.data)
-
-    meters_parser = MetersParser(org_id, raw_meter_data, source_type=Meter.GREENBUTTON, property_id=property_id)
-    meter_readings = meters_parser.meter_and_reading_objs[0]  # there should only be one meter (1 property, 1 type/unit)
+    chunk_size = 1000
 
-    readings = meter_readings['readings']
-    meter_only_details = {k: v for k, v in meter_readings.items() if k != 'readings'}
-    meter, _created = Meter.objects.get_or_create(**meter_only_details)
-    meter_id = meter.id
+    meter_id = None
+    num_readings = 0
+    num_batches = 0
+    try:
+        parser = reader.GreenButtonParser(import_file.local_file)
+        for raw_readings in batch(parser.iter_readings(), chunk_size):
+            meters_parser = MetersParser(org_id, raw_readings, source_type=Meter.GREENBUTTON, property_id=property_id)
+            meter_readings = meters_parser.meter_and_reading_objs[0]  # there should only be one meter (1 property, 1 type/unit)
+
+            if meter_id is None:
+                meter_only_details = {k: v for k, v in meter_readings.items() if k != 'readings'}
+                meter, _created = Meter.objects.get_or_create(**meter_only_details)
+                meter_id = meter.id
+                meter_usage_point_id = usage_point_id(meter.source_id)
+                proposed_imports = meters_parser.proposed_imports()
+
+            _save_greenbutton_data_task.delay(
+                meter_readings['readings'], meter_id, meter_usage_point_id, progress_data.key, num_batches
+            )
+            num_readings += len(raw_readings)
+            num_batches += 1
+    finally:
+        import_file.remove_local_file()
 
-    meter_usage_point_id = usage_point_id(meter.source_id)
+    if meter_id is None:
+        return finish_raw_save([], file_pk, progress_data.key)
 
-    chunk_size = 1000
+    # The number of batches and readings are only known once the whole file is parsed. Load the
+    # progress first to keep the steps of the batches that are already saved.
+    progress_data.load()
+    progress_data.total = num_batches
 
     # add in the proposed_imports into the progress key to be used later. (This used to be the summary).
-    progress_data.update_summary(meters_parser.proposed_imports())
-    progress_data.total = ceil(len(readings) / chunk_size)
-    progress_data.save()
+    proposed_imports[0]['incoming'] = num_readings
+    progress_data.update_summary(proposed_imports)
 
-    tasks = []
-    # Add in the save raw data chunks to the background tasks
-    for batch_readings in batch(readings, chunk_size):
-        tasks.append(_save_greenbutton_data_task.s(batch_readings, meter_id, meter_usage_point_id, progress_data.key))
+    _finish_greenbutton_save.delay(num_batches, meter_id, file_pk, progress_data.key)
+
+    return progress_data.result()
 
-    return chord(tasks, interval=15)(finish_raw_save.s(file_pk, progress_data.key))
+
+def _greenbutton_result_key(progress_key, batch_index):
+    """Return the cache key of the result of a batch of a GreenButton import"""
+    return '{}:greenbutton_batch:{}'.format(progress_key, batch_index)
+
+
+@shared_task(bind=True, ignore_result=True,
+             max_retries=GREENBUTTON_BATCH_TIMEOUT // GREENBUTTON_FINISH_INTERVAL)
+def _finish_greenbutton_save(self, num_batches, meter_id, file_pk, progress_key):
+    """
+    Wait until all the batches of readings of a GreenButton import are saved, then refresh the
+    monthly and yearly totals of the meter and finish importing the raw file.
+
+    Each batch task keeps its result in the cache under the index of its batch, so a batch
+    that is saved again (e.g. a redelivered task) only replaces its own result. This task is
+    retried until there is a result for each of the `num_batches` batches. If a batch fails, or
+    the batches are not all saved before the results expire, the totals are still refreshed
+    but the import is not finished with success.
+
+    :param num_batches: int, number of batches of readings that were sent
+    :param meter_id: int, ID of the meter of the import
+    :param file_pk: ID of the file that was being imported
+    :param progress_key: string, Progress Key to append progress
+    """
+    progress_data = ProgressData.from_key(progress_key)
+    result_keys = [_greenbutton_result_key(progress_key, index) for index in range(num_batches)]
+    results = get_cache_raw_many(result_keys)
+
+    failed = progress_data.result()['status'] == 'error'
+    if not failed and len(results) < num_batches:
+        try:
+            raise self.retry(countdown=GREENBUTTON_FINISH_INTERVAL)
+        except MaxRetriesExceededError:
+            progress_data.finish_with_error('not all of the readings could be imported')
+            failed = True
+
+    MeterReadingAggregate.refresh([meter_id])
+    delete_cache_many(result_keys)
+
+    if failed:
+        return progress_data.result()
+
+    return finish_raw_save(list(results.values()), file_pk, progress_key)
 
 
 @shared_task
-def _save_greenbutton_data_task(readings, meter_id, meter_usage_point_id, progress_key):
+def _save_greenbutton_data_task(readings, meter_id, meter_usage_point_id, progress_key, batch_index):
     """
     This method defines an individual task to save MeterReadings for a single
     Meter. Each task returns the results of the import.
 
-    The query creates or updates readings while associating them to the meter
-    via raw SQL upsert. Specifically, meter_id, start_time, and end_time must be
-    unique or an update occurs. Otherwise, a new reading entry is created.
+    The readings are created or updated in bulk (see MeterReadingQuerySet.upsert).
+    Specifically, meter_id, start_time, and end_time must be unique or an update
+    occurs. Otherwise, a new reading entry is created.
+
+    If the batch contains duplicate readings, only the last of each is saved and
+    this is noted in the results.
 
-    If the query leads to an error regarding trying to update the same row
-    within the same query, the error is logged in the results and none of the
-    readings for that batch are saved.
+    The result is also kept in the cache under `batch_index` for _finish_greenbutton_save.
     """
     progress_data = ProgressData.from_key(progress_key)
     meter = Meter.objects.get(pk=meter_id)
 
     result = {}
     try:
-        with transaction.atomic():
-            reading_strings = [
-                f"({meter_id}, '{reading['start_time'].isoformat(' ')}', '{reading['end_time'].isoformat(' ')}', {reading['reading']}, '{reading['source_unit']}', {reading['conversion_factor']})"
-                for reading
-                in readings
-            ]
-
-            sql = (
-                'INSERT INTO seed_meterreading(meter_id, start_time, end_time, reading, source_unit, conversion_factor)' +
-                ' VALUES ' + ', '.join(reading_strings) +
-                ' ON CONFLICT (meter_id, start_time, end_time)' +
-                ' DO UPDATE SET reading = EXCLUDED.reading, source_unit = EXCLUDED.source_unit, conversion_factor = EXCLUDED.conversion_factor' +
-                ' RETURNING reading;'
-            )
-            with connection.cursor() as cursor:
-                cursor.execute(sql)
-                key = "{} - {}".format(meter_usage_point_id, meter.get_type_display())
-                result[key] = {'count': len(cursor.fetchall())}
-    except ProgrammingError as e:
-        if 'ON CONFLICT DO UPDATE command cannot affect row a second time' in str(e):
-            key = "{} - {}".format(meter_usage_point_id, meter.get_type_display())
-            result[key] = {'error': 'Overlapping readings.'}
+        counts = MeterReading.objects.upsert(
+            dict(reading, meter_id=meter_id) for reading in readings
+        )
+        key = "{} - {}".format(meter_usage_point_id, meter.get_type_display())
+        result[key] = _meter_import_result(counts.get(meter_id))
     except Exception as e:
         progress_data.finish_with_error('data failed to import')
         raise e
@@ -809,6 +817,8 @@ def _save_greenbutton_data_task(readings, meter_id, meter_usage_point_id, progre
     # Indicate progress
     progress_data.step()
 
+    set_cache_raw(_greenbutton_result_key(progress_key, batch_index), result, GREENBUTTON_BATCH_TIMEOUT)
+
     return result
 
 
@@ -818,15 +828,13 @@ def _save_pm_meter_usage_data_task(meter_readings, file_pk, progress_key):
     This method defines an individual task to get or create a single Meter and its
     corresponding MeterReadings. Each task returns the results of the import.
 
-    Within the query, get or create the meter without it's readings. Then,
-    create or update readings while associating them to the meter via raw SQL upsert.
+    Within the transaction, get or create the meter without it's readings. Then,
+    create or update readings in bulk (see MeterReadingQuerySet.upsert).
     Specifically, meter_id, start_time, and end_time must be unique or an update
     occurs. Otherwise, a new reading entry is created.
 
-    If the query leads to an error regarding trying to update the same row
-    within the same query, the error is logged in the results and all the
-    MeterReadings and their Meter (if that was created in this transaction) are
-    not saved.
+    If the readings contain duplicates, only the last of each is saved and this
+    is noted in the results.
     """
     progress_data = ProgressData.from_key(progress_key)
 
@@ -838,28 +846,13 @@ def _save_pm_meter_usage_data_task(meter_readings, file_pk, progress_key):
 
             meter, _created = Meter.objects.get_or_create(**meter_only_details)
 
-            reading_strings = [
-                f"({meter.id}, '{reading['start_time'].isoformat(' ')}', '{reading['end_time'].isoformat(' ')}', {reading['reading']}, '{reading['source_unit']}', {reading['conversion_factor']})"
-                for reading
-                in readings
-            ]
-
-            sql = (
-                'INSERT INTO seed_meterreading(meter_id, start_time, end_time, reading, source_unit, conversion_factor)' +
-                ' VALUES ' + ', '.join(reading_strings) +
-                ' ON CONFLICT (meter_id, start_time, end_time)' +
-                ' DO UPDATE SET reading = EXCLUDED.reading, source_unit = EXCLUDED.source_unit, conversion_factor = EXCLUDED.conversion_factor' +
-                ' RETURNING reading;'
+            counts = MeterReading.objects.upsert(
+                dict(reading, meter_id=meter.id) for reading in readings
             )
-            with connection.cursor() as cursor:
-                cursor.execute(sql)
-                key = "{} - {}".format(meter.source_id, meter.get_type_display())
-                result[key] = {'count': len(cursor.fetchall())}
-    except ProgrammingError as e:
-        if 'ON CONFLICT DO UPDATE command cannot affect row a second time' in str(e):
-            type_lookup = dict(Meter.ENERGY_TYPES)
-            key = "{} - {}".format(meter_readings.get('source_id'), type_lookup[meter_readings['type']])
-            result[key] = {'error': 'Overlapping readings.'}
+            key = "{} - {}".format(meter.source_id, meter.get_type_display())
+            result[key] = _meter_import_result(counts.get(meter.id))
+
+            MeterReadingAggregate.refresh([meter.id])
     except Exception as e:
         progress_data.finish_with_error('data failed to import')
         raise e
@@ -869,6 +862,22 @@ def _save_pm_meter_usage_data_task(meter_readings, file_pk, progress_key):
     return result
 
 
+def _meter_import_result(counts):
+    """
+    Return the import result of a meter from its counts returned by MeterReadingQuerySet.upsert
+
+    :param counts: dict, {'count': int, 'duplicates': int}, or None if the meter had no readings
+    :return: dict, {'count': int} with an 'error' if duplicate readings were ignored
+    """
+    if counts is None:
+        return {'count': 0}
+
+    result = {'count': counts['count']}
+    if counts['duplicates']:
+        result['error'] = 'Duplicate readings, only the last of each was imported.'
+    return result
+
+
 @shared_task
 def _save_pm_meter_usage_data_create_tasks(file_pk, progress_key):
     """
@@ -915,6 +924,7 @@ def _append_meter_import_results_to_summary(import_results, incoming_summary):
             {'<source_id/usage_point_id> - <type>": {'count': 100}},
             {'<source_id/usage_point_id> - <type>": {'error': "<error_message>"}},
             {'<source_id/usage_point_id> - <type>": {'error': "<error_message>"}},
+            {'<source_id/usage_point_id> - <type>": {'count': 100, 'error': "<error_message>"}},
         ]
     """
     agg_results_summary = collections.defaultdict(lambda: 0)
@@ -928,11 +938,12 @@ def _append_meter_import_results_to_summary(import_results, incoming_summary):
         key = list(result.keys())[0]
 
         success_count = result[key].get('count')
+        error = result[key].get('error')
 
-        if success_count is None:
-            error_comments[key].add(result[key].get('error'))
-        else:
+        if success_count is not None:
             agg_results_summary[key] += success_count
+        if error is not None:
+            error_comments[key].add(error)
 
     # Next update summary of incoming meters imports with aggregated results.
     for import_info in incoming_summary:
@@ -947,43 +958,61 @@ def _append_meter_import_results_to_summary(import_results, incoming_summary):
     return incoming_summary
 
 
+def _get_raw_data_parser(import_file):
+    """
+    Return the parser for the CSV, XLSX, geojson/json file of the import file
+
+    :param import_file: ImportFile instance
+    :return: GeoJSONParser or MCMParser
+    """
+    file_extension = os.path.splitext(import_file.file.name)[1]
+
+    if file_extension == '.json' or file_extension == '.geojson':
+        return reader.GeoJSONParser(import_file.local_file)
+    else:
+        return reader.MCMParser(import_file.local_file)
+
+
 @shared_task
 def _save_raw_data_create_tasks(file_pk, progress_key):
     """
     Worker method for saving raw data. Chunk up the CSV, XLSX, geojson/json file and create the tasks
     to save the raw data into the PropertyState table.
 
+    CSV files can be read from any row, so only the location of each chunk is passed to the
+    tasks and they read their rows from the import file. XLS/XLSX and geojson/json files are
+    parsed as a whole by their libraries, so they are parsed once here and the rows are passed
+    to the tasks.
+
     :param file_pk: int, ID of the file to import
     :return: Dict, result from progress data / cache
     """
     progress_data = ProgressData.from_key(progress_key)
 
     import_file = ImportFile.objects.get(pk=file_pk)
-    file_extension = os.path.splitext(import_file.file.name)[1]
-
-    if file_extension == '.json' or file_extension == '.geojson':
-        parser = reader.GeoJSONParser(import_file.local_file)
-    else:
-        parser = reader.MCMParser(import_file.local_file)
+    try:
+        parser = _get_raw_data_parser(import_file)
 
-    cache_first_rows(import_file, parser)
-    import_file.num_rows = 0
-    import_file.num_columns = parser.num_columns()
+        cache_first_rows(import_file, parser)
+        import_file.num_rows = 0
+        import_file.num_columns = parser.num_columns()
 
-    chunks = []
-    for batch_chunk in batch(parser.data, 100):
-        import_file.num_rows += len(batch_chunk)
-        chunks.append(batch_chunk)
+        tasks = []
+        if isinstance(parser, reader.MCMParser) and isinstance(parser.reader, reader.CSVParser):
+            for offset, num_rows in parser.chunk_offsets(100):
+                import_file.num_rows += num_rows
+                tasks.append(_save_raw_data_csv_chunk.s(file_pk, offset, num_rows, progress_data.key))
+        else:
+            for batch_chunk in batch(parser.data, 100):
+                import_file.num_rows += len(batch_chunk)
+                tasks.append(_save_raw_data_chunk.s(batch_chunk, file_pk, progress_data.key))
+    finally:
+        import_file.remove_local_file()
     import_file.save()
 
-    progress_data.total = len(chunks)
+    progress_data.total = len(tasks)
     progress_data.save()
 
-    # Add in the save raw data chunks to the background tasks
-    tasks = []
-    for chunk in chunks:
-        tasks.append(_save_raw_data_chunk.s(chunk, file_pk, progress_data.key))
-
     return chord(tasks, interval=15)(finish_raw_save.s(file_pk, progress_data.key))
 
 
@@ -1100,47 +1129,6 @@ def finish_matching(result, import_file_id, progress_key):
     return progress_data.finish_with_success()
 
 
-def hash_state_object(obj, include_extra_data=True):
-    def add_dictionary_repr_to_hash(hash_obj, dict_obj):
-        assert isinstance(dict_obj, dict)
-
-        for (key, value) in sorted(dict_obj.items(), key=lambda x_y: x_y[0]):
-            if isinstance(value, dict):
-                add_dictionary_repr_to_hash(hash_obj, value)
-            else:
-                hash_obj.update(str(unidecode(key)).encode('utf-8'))
-                if isinstance(value, basestring):
-                    hash_obj.update(unidecode(value).encode('utf-8'))
-                else:
-                    hash_obj.update(str(value).encode('utf-8'))
-        return hash_obj
-
-    def _get_field_from_obj(field_obj, field):
-        if not hasattr(field_obj, field):
-            return 'FOO'  # Return a random value so we can distinguish between this and None.
-        else:
-            return getattr(field_obj, field)
-
-    m = hashlib.md5()
-    for f in Column.retrieve_db_field_name_for_hash_comparison():
-        obj_val = _get_field_from_obj(obj, f)
-        m.update(f.encode('utf-8'))
-        if isinstance(obj_val, datetime):
-            # if this is a datetime, then make sure to save the string as a naive datetime.
-            # Somehow, somewhere the data are being saved in mapping with a timezone,
-            # then in matching they are removed (but the time is updated correctly)
-            m.update(str(make_naive(obj_val).astimezone(tz.utc).isoformat()).encode('utf-8'))
-        elif isinstance(obj_val, GEOSGeometry):
-            m.update(GEOSGeometry(obj_val, srid=4326).wkt.encode('utf-8'))
-        else:
-            m.update(str(obj_val).encode('utf-8'))
-
-    if include_extra_data:
-        add_dictionary_repr_to_hash(m, obj.extra_data)
-
-    return m.hexdigest()
-
-
 def list_canonical_property_states(org_id):
     """
     Return a QuerySet of the property states that are part of the inventory
@@ -1262,53 +1250,58 @@ def pair_new_states(merged_property_views, merged_taxlot_views):
     # property_comparison_keys = {property_m2m_keygen.calculate_comparison_key_key(p): p.pk for p in property_objects}
     # property_canonical_keys = {property_m2m_keygen.calculate_canonical_key(p): p.pk for p in property_objects}
 
+    # Index the keys by each of their values so that the equivalent keys can be looked up
+    # instead of comparing every property key with every tax lot key.
+    taxlot_key_index = EquivalencePartitioner.make_key_index(taxlot_keys)
+    property_key_index = EquivalencePartitioner.make_key_index(property_keys)
+
     possible_merges = []  # List of prop.id, tl.id merges.
 
     for pv in merged_property_views:
-        # if pv.state.lot_number and ";" in pv.state.lot_number:
-        #     pdb.set_trace()
-
         pv_key = property_m2m_keygen.calculate_comparison_key(pv.state)
-        # TODO: Refactor pronto.  Iterating over the tax lot is bad implementation.
-        for tlk in taxlot_keys:
-            if pv_key[0] and ";" in pv_key[0]:
-                for lotnum in map(lambda x: x.strip(), pv_key[0].split(";")):
-                    pv_key_copy = list(copy.deepcopy(pv_key))
-                    pv_key_copy[0] = lotnum
-                    pv_key_copy = tuple(pv_key_copy)
-                    if property_m2m_keygen.calculate_key_equivalence(pv_key_copy, tlk):
-                        possible_merges.append((property_keys[pv_key_copy], taxlot_keys[tlk]))
-            else:
-                if property_m2m_keygen.calculate_key_equivalence(pv_key, tlk):
-                    possible_merges.append((property_keys[pv_key], taxlot_keys[tlk]))
+        if pv_key[0] and ";" in pv_key[0]:
+            pv_keys = []
+            for lotnum in map(lambda x: x.strip(), pv_key[0].split(";")):
+                pv_key_copy = list(copy.deepcopy(pv_key))
+                pv_key_copy[0] = lotnum
+                pv_keys.append(tuple(pv_key_copy))
+        else:
+            pv_keys = [pv_key]
+
+        for pv_key in pv_keys:
+            for tlk in EquivalencePartitioner.find_equivalent_keys(pv_key, taxlot_key_index):
+                possible_merges.append((property_keys[pv_key], taxlot_keys[tlk]))
 
     for tlv in merged_taxlot_views:
         tlv_key = taxlot_m2m_keygen.calculate_comparison_key(tlv.state)
-        for pv_key in property_keys:
-            if property_m2m_keygen.calculate_key_equivalence(tlv_key, pv_key):
-                possible_merges.append((property_keys[pv_key], taxlot_keys[tlv_key]))
+        for pv_key in EquivalencePartitioner.find_equivalent_keys(tlv_key, property_key_index):
+            possible_merges.append((property_keys[pv_key], taxlot_keys[tlv_key]))
 
-    for m2m in set(possible_merges):
-        pv_pk, tlv_pk = m2m
-
-        # PropertyView.objects.get(pk=pv_pk)
-        # TaxLotView.objects.get(pk=tlv_pk)
+    possible_merges = set(possible_merges)
+    if not possible_merges:
+        return
 
-        count = TaxLotProperty.objects.filter(
-            property_view_id=pv_pk,
-            taxlot_view_id=tlv_pk
-        ).count()
+    # Look up the existing pairs of all the property views at once
+    existing_pairs = set(TaxLotProperty.objects.filter(
+        property_view_id__in={pv_pk for pv_pk, _tlv_pk in possible_merges}
+    ).values_list('property_view_id', 'taxlot_view_id'))
+    paired_property_view_ids = {pv_pk for pv_pk, _tlv_pk in existing_pairs}
 
-        if count:
+    m2m_joins = []
+    for m2m in possible_merges:
+        if m2m in existing_pairs:
             continue
 
-        is_primary = TaxLotProperty.objects.filter(property_view_id=pv_pk).count() == 0
-        m2m_join = TaxLotProperty(
+        pv_pk, tlv_pk = m2m
+        is_primary = pv_pk not in paired_property_view_ids
+        paired_property_view_ids.add(pv_pk)
+        m2m_joins.append(TaxLotProperty(
             property_view_id=pv_pk,
             taxlot_view_id=tlv_pk,
             cycle=cycle,
             primary=is_primary
-        )
-        m2m_join.save()
+        ))
+
+    TaxLotProperty.objects.bulk_create(m2m_joins)
 
     return
@@ -110,3 +110,25 @@ class TestCleaner(TestCase):
             cleaner.clean_value('123,456', 'random'),
             '123,456'
         )
+
+    def test_clean_row(self):
+        cleaner = tasks._build_cleaner(self.org)
+
+        row = {
+            self.float_col: '2,456',
+            self.string_col: '123,456 Nothingness',
+            'random': '123,456',
+        }
+        self.assertEqual(
+            cleaner.clean_row(row),
+            {
+                self.float_col: 2456,
+                self.string_col: '123,456 Nothingness',
+                'random': '123,456',
+            }
+        )
+
+        # pint columns are only cleaned when they are not extra data
+        cleaned = cleaner.clean_row({'site_eui': '12.5'}, is_extra_data=False)
+        self.assertEqual(cleaned['site_eui'].magnitude, 12.5)
+        self.assertEqual(cleaner.clean_row({'site_eui': '12.5'}), {'site_eui': '12.5'})
@@ -82,3 +82,16 @@ class TestEquivalenceClassGenerator(DataMappingBaseTestCase):
         self.assertEqual(tls3.jurisdiction_tax_lot_id, "1")
         self.assertEqual(tls3.custom_id_1, "100")
         self.assertEqual(tls3.normalized_address, "123 fake street")
+
+    def test_find_equivalent_keys(self):
+        keys = [
+            ("1", None, "100", None),
+            ("2", None, None, "123 fake street"),
+            (None, "abc", None, None),
+        ]
+        key_index = EquivalencePartitioner.make_key_index(keys)
+
+        for key in [("1", None, None, None), (None, "abc", "100", None), ("3", None, None, "123 fake street"),
+                    ("3", None, None, None), (None, None, None, None)]:
+            expected = {k for k in keys if EquivalencePartitioner.calculate_key_equivalence(key, k)}
+            self.assertEqual(EquivalencePartitioner.find_equivalent_keys(key, key_index), expected)
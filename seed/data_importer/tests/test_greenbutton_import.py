@@ -225,7 +225,7 @@ class GreenButtonImportTest(DataMappingBaseTestCase):
 
         self.assertEqual(result['message'], expectation)
 
-    def test_error_noted_in_response_if_meter_has_overlapping_readings_in_the_same_batch(self):
+    def test_duplicate_readings_in_the_same_batch_are_deduplicated_and_noted_in_response(self):
         filename = 'example-GreenButton-data-1002-1-dup.xml'
         filepath = os.path.dirname(os.path.abspath(__file__)) + "/data/" + filename
 
@@ -251,8 +251,8 @@ class GreenButtonImportTest(DataMappingBaseTestCase):
                 "source_id": "409483",
                 "type": "Electric - Grid",
                 "incoming": 1002,
-                "successfully_imported": 1000,
-                "errors": 'Overlapping readings.',
+                "successfully_imported": 1001,
+                "errors": 'Duplicate readings, only the last of each was imported.',
             },
         ]
 
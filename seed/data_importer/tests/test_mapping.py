@@ -11,6 +11,7 @@ import logging
 import os.path as osp
 
 from seed.data_importer import tasks
+from seed.data_importer.mapping_plan import MappingPlan
 from seed.data_importer.tests.util import (
     FAKE_MAPPINGS,
 )
@@ -94,6 +95,31 @@ class TestMapping(DataMappingBaseTestCase):
         # for p in props:
         #     pp(p)
 
+    def test_mapping_plan_is_rebuilt_when_mappings_change(self):
+        Column.create_mappings(FAKE_MAPPINGS['portfolio'], self.org, self.user, self.import_file.id)
+
+        plan = MappingPlan.build(self.import_file)
+        self.assertIn('PropertyState', plan.table_mappings)
+
+        # loading the plan returns the cached plan while the mappings have not changed
+        with self.assertNumQueries(0):
+            cached_plan = MappingPlan.load(self.import_file)
+        self.assertEqual(cached_plan.version, plan.version)
+        self.assertEqual(cached_plan.table_mappings, plan.table_mappings)
+
+        # changing the mappings invalidates the plan
+        Column.create_mappings([{
+            'from_field': 'a new raw column',
+            'from_units': None,
+            'to_table_name': 'PropertyState',
+            'to_field': 'a new raw column',
+            'to_field_display_name': 'a new raw column',
+        }], self.org, self.user, self.import_file.id)
+
+        rebuilt_plan = MappingPlan.load(self.import_file)
+        self.assertNotEqual(rebuilt_plan.version, plan.version)
+        self.assertIn('a new raw column', rebuilt_plan.table_mappings['PropertyState'])
+
 
 class TestDuplicateFileHeaders(DataMappingBaseTestCase):
     def setUp(self):
@@ -10,7 +10,10 @@ from seed.data_importer.models import ImportFile
 from seed.data_importer.tasks import match_buildings
 from seed.data_importer.match import (
     filter_duplicate_states,
+    match_incoming_states,
     save_state_match,
+    save_state_matches,
+    states_to_views,
 )
 from seed.models import (
     ASSESSED_RAW,
@@ -35,6 +38,7 @@ from seed.test_helpers.fake import (
     FakeTaxLotStateFactory,
 )
 from seed.tests.util import DataMappingBaseTestCase
+from seed.utils.match import matching_criteria_column_names
 
 
 class TestMatchingInImportFile(DataMappingBaseTestCase):
@@ -1012,6 +1016,98 @@ class TestMatchingHelperMethods(DataMappingBaseTestCase):
         self.assertEqual(pal.parent_state2, ps_2)
         self.assertEqual(pal.description, 'Automatic Merge')
 
+    def test_save_state_matches(self):
+        ps_1 = self.property_state_factory.get_property_state(
+            property_name="oldest", lot_number='1', extra_data={"extra_1": "a"})
+        ps_2 = self.property_state_factory.get_property_state(
+            property_name="newer", lot_number='2;3', extra_data={"extra_2": "b"})
+        ps_3 = self.property_state_factory.get_property_state(
+            property_name=None, lot_number=None, extra_data={"extra_1": "c"})
+
+        priorities = Column.retrieve_priorities(self.org.pk)
+        pairwise_state = save_state_match(save_state_match(ps_1, ps_2, priorities), ps_3, priorities)
+        state_count = PropertyState.objects.count()
+
+        merged_state = save_state_matches([[ps_1.id, ps_2.id, ps_3.id]], priorities, PropertyState)[0]
+
+        # a state was created for each step of the merge and the last one is the same as merging
+        # pairwise
+        self.assertEqual(PropertyState.objects.count(), state_count + 2)
+        self.assertEqual(merged_state.merge_state, MERGE_STATE_MERGED)
+        self.assertEqual(merged_state.property_name, pairwise_state.property_name)
+        self.assertEqual(merged_state.extra_data, pairwise_state.extra_data)
+        self.assertEqual(merged_state.hash_object, pairwise_state.hash_object)
+
+        # the audit log chain goes from the most recent link back to the oldest state, every link
+        # names both of its parent states so that the merge can be unmerged
+        pal = PropertyAuditLog.objects.filter(state=merged_state).order_by('-id').first()
+        self.assertEqual(pal.name, 'System Match')
+        self.assertEqual(pal.parent_state1, pal.parent1.state)
+        self.assertEqual(pal.parent_state1.merge_state, MERGE_STATE_MERGED)
+        self.assertEqual(pal.parent_state2, ps_3)
+        self.assertEqual(pal.parent1.parent_state1, ps_1)
+        self.assertEqual(pal.parent1.parent_state2, ps_2)
+        self.assertEqual(pal.parent1.parent1.state, ps_1)
+        self.assertEqual(pal.parent1.parent2.state, ps_2)
+
+    def test_match_incoming_states(self):
+        existing_1 = self.property_state_factory.get_property_state(no_default_data=True, custom_id_1='1')
+        existing_2 = self.property_state_factory.get_property_state(no_default_data=True, custom_id_1='2')
+        existing_3 = self.property_state_factory.get_property_state(no_default_data=True, custom_id_1='2')
+        for state in [existing_1, existing_2, existing_3]:
+            state.promote(self.cycle)
+
+        incoming_1 = self.property_state_factory.get_property_state(no_default_data=True, custom_id_1='1')
+        incoming_2 = self.property_state_factory.get_property_state(no_default_data=True, custom_id_1='2')
+        incoming_3 = self.property_state_factory.get_property_state(no_default_data=True, custom_id_1='3')
+        incoming_states = PropertyState.objects.filter(pk__in=[incoming_1.id, incoming_2.id, incoming_3.id])
+
+        column_names = matching_criteria_column_names(self.org.id, 'PropertyState')
+        matches = match_incoming_states(
+            incoming_states, PropertyView.objects.filter(cycle=self.cycle), column_names, PropertyState
+        )
+
+        matches = {
+            incoming_state_ids[0]: existing_state_ids and sorted(existing_state_ids)
+            for existing_state_ids, incoming_state_ids in matches
+        }
+        self.assertEqual(matches, {
+            incoming_1.id: [existing_1.id],
+            incoming_2.id: sorted([existing_2.id, existing_3.id]),
+            incoming_3.id: [],
+        })
+
+    def test_states_to_views_with_unmatched_incoming_states(self):
+        existing = self.property_state_factory.get_property_state(
+            no_default_data=True, custom_id_1='1', property_name='existing')
+        existing_view = existing.promote(self.cycle)
+
+        matched = self.property_state_factory.get_property_state(
+            no_default_data=True, custom_id_1='1', property_name='matched')
+        unmatched_1 = self.property_state_factory.get_property_state(
+            no_default_data=True, custom_id_1='2', property_name='unmatched 1')
+        unmatched_2 = self.property_state_factory.get_property_state(
+            no_default_data=True, custom_id_1='3', property_name='unmatched 2')
+
+        processed_views, duplicate_count, new_count, matched_count, merged_between_existing_count = states_to_views(
+            [matched.id, unmatched_1.id, unmatched_2.id], self.org, self.cycle, PropertyState
+        )
+
+        self.assertEqual(duplicate_count, 0)
+        self.assertEqual(new_count, 2)
+        self.assertEqual(matched_count, 1)
+        self.assertEqual(merged_between_existing_count, 0)
+        self.assertEqual(len(processed_views), 3)
+
+        # the unmatched states are promoted to new views and the matched one is merged into the
+        # existing view
+        self.assertEqual(PropertyView.objects.filter(cycle=self.cycle).count(), 3)
+        self.assertTrue(PropertyView.objects.filter(state_id=unmatched_1.id).exists())
+        self.assertTrue(PropertyView.objects.filter(state_id=unmatched_2.id).exists())
+        existing_view.refresh_from_db()
+        self.assertEqual(existing_view.state.property_name, 'matched')
+        self.assertEqual(existing_view.state.merge_state, MERGE_STATE_MERGED)
+
     def test_filter_duplicate_states(self):
         for i in range(10):
             self.property_state_factory.get_property_state(
@@ -523,14 +523,11 @@ class MeterUsageImportTest(TestCase):
 
         self.assertCountEqual(result['message'], expectation)
 
-    def test_error_noted_in_response_if_meter_has_overlapping_readings(self):
+    def test_duplicate_readings_are_deduplicated_and_noted_in_response(self):
         """
-        If a meter has overlapping readings, the process of upserting a reading
-        will encounter the issue of not knowing which reading should take
-        precedence over the other.
-
-        In this case, neither the meter (if applicable) nor any of its readings
-        are created.
+        If a meter has duplicate readings (same start and end times), only the
+        last of each is saved and the rest of the meter's readings are still
+        imported. The duplicates are noted in the response.
         """
         dup_import_record = ImportRecord.objects.create(owner=self.user, last_modified_by=self.user, super_organization=self.org)
         dup_filename = "example-pm-monthly-meter-usage-1-dup.xlsx"
@@ -577,21 +574,26 @@ class MeterUsageImportTest(TestCase):
                 "source_id": "5766975-0",
                 "type": "Electric - Grid",
                 "incoming": 4,
-                "successfully_imported": 0,
-                "errors": "Overlapping readings.",
+                "successfully_imported": 3,
+                "errors": "Duplicate readings, only the last of each was imported.",
             },
             {
                 "pm_property_id": "5766975",
                 "source_id": "5766975-1",
                 "type": "Natural Gas",
                 "incoming": 4,
-                "successfully_imported": 0,
-                "errors": "Overlapping readings.",
+                "successfully_imported": 3,
+                "errors": "Duplicate readings, only the last of each was imported.",
             },
         ]
 
         self.assertCountEqual(result_summary['message'], expected_import_summary)
-        self.assertEqual(total_meters_count, 2)
+        self.assertEqual(total_meters_count, 4)
+
+        # the last of the duplicate readings was saved
+        for source_id in ['5766975-0', '5766975-1']:
+            readings = MeterReading.objects.filter(meter__source_id=source_id).order_by('start_time')
+            self.assertEqual([r.reading for r in readings][-1], 2.0)
 
 
 class MeterUsageImportAdjustedScenarioTest(DataMappingBaseTestCase):
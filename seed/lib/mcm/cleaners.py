@@ -7,6 +7,7 @@
 import re
 import string
 from datetime import datetime, date
+from functools import lru_cache
 
 import dateutil
 import dateutil.parser
@@ -143,6 +144,12 @@ def int_cleaner(value, *args):
     return value
 
 
+@lru_cache(maxsize=None)
+def _parse_units(units):
+    """Parse the units string once, the result is a Quantity of magnitude 1 in the units"""
+    return ureg(units)
+
+
 def pint_cleaner(value, units, *args):
     """Try to convert value to a meaningful (magnitude, units) object."""
 
@@ -156,7 +163,7 @@ def pint_cleaner(value, units, *args):
         return None
 
     try:
-        value = value * ureg(units)
+        value = value * _parse_units(units)
     except ValueError:
         value = None
     except TypeError:
@@ -177,32 +184,70 @@ def geometry_cleaner(value):
             return None
 
 
+# cleaners by the column types of the ontology, pint columns are handled separately
+TYPE_CLEANERS = {
+    'float': float_cleaner,
+    'datetime': date_time_cleaner,
+    'date': date_cleaner,
+    'string': str,
+    'integer': int_cleaner,
+    'geometry': geometry_cleaner,
+}
+
+
 class Cleaner(object):
-    """Cleans values for a given ontology."""
+    """Cleans values for a given ontology.
+
+    The cleaner function of each column is looked up once when the cleaner is constructed, so
+    cleaning a value costs a single dict lookup. Parsed dates are remembered by the cleaner
+    since the same date strings tend to repeat down a column.
+    """
 
     def __init__(self, ontology):
 
         self.ontology = ontology
         self.schema = self.ontology.get('types', {})
-        self.float_columns = list(filter(
-            lambda x: self.schema[x] == 'float', self.schema
-        ))
-        self.date_columns = list(filter(
-            lambda x: self.schema[x] == 'date', self.schema
-        ))
-        self.date_time_columns = list(filter(
-            lambda x: self.schema[x] == 'datetime', self.schema
-        ))
-        self.string_columns = list(filter(
-            lambda x: self.schema[x] == 'string', self.schema
-        ))
-        self.int_columns = list(filter(
-            lambda x: self.schema[x] == 'integer', self.schema
-        ))
-        self.geometry_columns = list(filter(
-            lambda x: self.schema[x] == 'geometry', self.schema
-        ))
         self.pint_column_map = self._build_pint_column_map()
+        self._date_time_values = {}
+
+        # column name -> (cleaner function, whether it applies to extra data columns)
+        self.column_cleaners = {}
+        for column_name, column_type in self.schema.items():
+            if not isinstance(column_type, basestring):
+                continue
+            elif column_type == 'datetime':
+                self.column_cleaners[column_name] = (self._memoized_date_time_cleaner, True)
+            elif column_type == 'date':
+                self.column_cleaners[column_name] = (self._memoized_date_cleaner, True)
+            elif column_type in TYPE_CLEANERS:
+                self.column_cleaners[column_name] = (TYPE_CLEANERS[column_type], True)
+
+        # pint columns are only cleaned when they are not extra data.
+        for column_name, units in self.pint_column_map.items():
+            self.column_cleaners[column_name] = (self._build_pint_cleaner(units), False)
+
+    @staticmethod
+    def _build_pint_cleaner(units):
+        def _pint_cleaner(value):
+            return pint_cleaner(value, units)
+
+        return _pint_cleaner
+
+    def _memoized_date_time_cleaner(self, value):
+        # only strings are parsed, other values are quick to clean
+        if not isinstance(value, basestring):
+            return date_time_cleaner(value)
+
+        if value not in self._date_time_values:
+            self._date_time_values[value] = date_time_cleaner(value)
+        return self._date_time_values[value]
+
+    def _memoized_date_cleaner(self, value):
+        value = self._memoized_date_time_cleaner(value)
+        if value:
+            return value.date()
+        else:
+            return None
 
     def _build_pint_column_map(self):
         """
@@ -232,29 +277,24 @@ class Cleaner(object):
         """Clean the value, based on characteristics of its column_name."""
         value = default_cleaner(value)
         if value is not None:
-            if column_name in self.float_columns:
-                return float_cleaner(value)
-
-            if column_name in self.date_time_columns:
-                return date_time_cleaner(value)
-
-            if column_name in self.date_columns:
-                return date_cleaner(value)
-
-            if column_name in self.string_columns:
-                return str(value)
-
-            if column_name in self.int_columns:
-                return int_cleaner(value)
-
-            if column_name in self.geometry_columns:
-                return geometry_cleaner(value)
-
-            if not is_extra_data:
+            column_cleaner = self.column_cleaners.get(column_name)
+            if column_cleaner is not None:
+                cleaner, applies_to_extra_data = column_cleaner
                 # If the object is not extra data, then check if the data are in the
                 # pint_column_map. This needs to be cleaned up significantly.
-                if column_name in self.pint_column_map:
-                    units = self.pint_column_map[column_name]
-                    return pint_cleaner(value, units)
+                if applies_to_extra_data or not is_extra_data:
+                    return cleaner(value)
 
         return value
+
+    def clean_row(self, row, is_extra_data=True):
+        """Clean all the values of a row
+
+        :param row: dict, column name -> value
+        :param is_extra_data: bool, whether the columns of the row are extra data
+        :return: dict, column name -> cleaned value
+        """
+        return {
+            column_name: self.clean_value(value, column_name, is_extra_data)
+            for column_name, value in row.items()
+        }
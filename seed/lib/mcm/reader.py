@@ -14,10 +14,11 @@ import json
 import mmap
 import operator
 import re
-import xmltodict
 
 from builtins import str
-from csv import DictReader, Sniffer
+from csv import DictReader, Sniffer, reader as csv_reader
+from itertools import islice
+from xml.etree.ElementTree import iterparse
 
 from past.builtins import basestring
 from seed.data_importer.utils import kbtu_thermal_conversion_factors
@@ -102,61 +103,88 @@ class GreenButtonParser(object):
         If a valid type and unit could not be found, an empty list is returned.
         """
         if self._cache_data is None:
-            xml_string = self._xml_file.read()
-            raw_data = xmltodict.parse(xml_string)
+            self._cache_data = list(self.iter_readings())
 
-            readings_entry = raw_data['feed']['entry'][3]
-
-            href = readings_entry['link']['@href']
-            source_id = re.sub(r'/v./', '', href)
-
-            readings = readings_entry['content']['IntervalBlock']['IntervalReading']
+        return self._cache_data
 
-            type, unit, multiplier = self._parse_type_and_unit(raw_data)
+    def iter_readings(self):
+        """
+        Streams the readings of the GreenButton XML file in the format of `data`.
 
-            if type and unit:
-                self._cache_data = [
-                    {
-                        'start_time': int(reading['timePeriod']['start']),
+        The file is parsed incrementally and each IntervalReading is discarded
+        once it has been yielded, so memory use does not grow with the number of
+        readings. The type and unit are parsed from the entries preceding the
+        readings. If a valid type and unit could not be found, nothing is yielded.
+        """
+        self._xml_file.seek(0)
+
+        entry_index = -1
+        kind = uom = power_of_ten_multiplier = source_id = None
+        type_and_unit = None
+        interval_block = None
+
+        for event, element in iterparse(self._xml_file, events=('start', 'end')):
+            # tags are matched without their namespaces
+            tag = element.tag.rsplit('}', 1)[-1]
+
+            if event == 'start':
+                if tag == 'entry':
+                    entry_index += 1
+                elif tag == 'IntervalBlock':
+                    interval_block = element
+                continue
+
+            if entry_index == 0 and tag == 'kind':
+                kind = element.text
+            elif entry_index == 2 and tag == 'uom':
+                uom = element.text
+            elif entry_index == 2 and tag == 'powerOfTenMultiplier':
+                power_of_ten_multiplier = element.text
+            elif entry_index == 3 and tag == 'link' and source_id is None:
+                source_id = re.sub(r'/v./', '', element.get('href'))
+            elif entry_index == 3 and tag == 'IntervalReading':
+                if type_and_unit is None:
+                    type_and_unit = self._parse_type_and_unit(kind, uom, power_of_ten_multiplier)
+                type, unit, multiplier = type_and_unit
+
+                if type and unit:
+                    yield {
+                        'start_time': int(self._find_text(element, 'timePeriod', 'start')),
                         'source_id': source_id,
-                        'duration': int(reading['timePeriod']['duration']),
+                        'duration': int(self._find_text(element, 'timePeriod', 'duration')),
                         'Meter Type': type,
                         'Usage Units': unit,
-                        'Usage/Quantity': float(reading['value']) * multiplier,
+                        'Usage/Quantity': float(self._find_text(element, 'value')) * multiplier,
                     }
-                    for reading
-                    in readings
-                ]
-            else:
-                self._cache_data = []
 
-        return self._cache_data
+                # the readings are the only children of the block that are needed
+                interval_block.clear()
+
+    def _find_text(self, element, *path):
+        """Returns the text of the descendant of element found by following the local tag names of path"""
+        for tag in path:
+            element = next(child for child in element if child.tag.rsplit('}', 1)[-1] == tag)
+        return element.text
 
-    def _parse_type_and_unit(self, raw_data):
+    def _parse_type_and_unit(self, kind, uom, power_of_ten_multiplier):
         """
-        Parses raw XML to read the kind and uom/powerOfTenMultiplier. Using
-        those, an attempt is made to validate the type and unit as a combination
-        that the application accepts.
+        Uses the kind and uom/powerOfTenMultiplier read from the XML in an
+        attempt to validate the type and unit as a combination that the
+        application accepts.
 
         The if the type and unit are parsable and valid, they are returned,
         otherwise, None is returned as applicable.
         """
-        kind_entry = raw_data['feed']['entry'][0]
-        kind = kind_entry['content']['UsagePoint']['ServiceCategory']['kind']
         type = self.kind_codes.get(int(kind), None)
 
         if type is None:
             return None, None, 1
 
-        uom_entry = raw_data['feed']['entry'][2]['content']['ReadingType']
-        uom = uom_entry['uom']
         raw_base_unit = self.uom_codes.get(int(uom), '')
 
-        power_of_ten_multiplier = int(uom_entry['powerOfTenMultiplier'])
-
         resulting_unit, multiplier = self._parse_valid_unit_and_multiplier(
             type,
-            power_of_ten_multiplier,
+            int(power_of_ten_multiplier),
             raw_base_unit
         )
 
@@ -447,6 +475,48 @@ class CSVParser(object):
         # skip header row
         self.csvfile.__next__()
 
+    def chunk_offsets(self, chunk_size):
+        """
+        Yields (offset, num_rows) tuples describing consecutive chunks of the data rows. The
+        offset is the position of the first row of the chunk as returned by `tell()`, which
+        allows `read_chunk` to seek directly to it without reading the preceding rows.
+
+        The file is read with `readline` (and not by iterating over the file) because `tell()`
+        is disabled while the file is being iterated.
+
+        :param chunk_size: int, maximum number of rows per chunk
+        """
+        self.csvfile.seek(0)
+        rows = csv_reader(iter(self.csvfile.readline, ''))
+        # skip the header row, which may span multiple lines
+        next(rows)
+
+        offset = self.csvfile.tell()
+        num_rows = 0
+        for row in rows:
+            # DictReader skips blank rows, so they are not counted here either
+            if not row:
+                continue
+
+            num_rows += 1
+            if num_rows == chunk_size:
+                yield offset, num_rows
+                offset = self.csvfile.tell()
+                num_rows = 0
+
+        if num_rows:
+            yield offset, num_rows
+
+        self.seek_to_beginning()
+
+    def read_chunk(self, offset, num_rows):
+        """Returns an iterator over the row dicts of the chunk starting at `offset`"""
+        self.csvfile.seek(offset)
+        chunk_reader = DictReader(
+            iter(self.csvfile.readline, ''), fieldnames=self.csvreader.fieldnames
+        )
+        return islice(chunk_reader, num_rows)
+
     def num_columns(self):
         """gets the number of columns for the file"""
         return len(self.csvreader.fieldnames)
@@ -522,6 +592,18 @@ class MCMParser(object):
         """returns the number of columns of the file"""
         return self.reader.num_columns()
 
+    def chunk_offsets(self, chunk_size):
+        """
+        Yields (offset, num_rows) tuples that describe the file in chunks of at most
+        `chunk_size` rows. The offsets are only meaningful to `read_chunk` of a parser over the
+        same file. Only CSV files can be read in chunks.
+        """
+        return self.reader.chunk_offsets(chunk_size)
+
+    def read_chunk(self, offset, num_rows):
+        """returns an iterable over the rows of a chunk found with `chunk_offsets`"""
+        return self.reader.read_chunk(offset, num_rows)
+
     @property
     def headers(self):
         """original ordered list of spreadsheet headers that are not cleaned"""
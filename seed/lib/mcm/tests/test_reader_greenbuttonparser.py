@@ -130,3 +130,17 @@ class GreenButtonParserTest(TestCase):
         parser = GreenButtonParser(file)
 
         self.assertEqual(parser.data, [])
+
+    def test_iter_readings_streams_the_readings_each_time_it_is_called(self):
+        file_path = os.path.dirname(os.path.abspath(__file__)) + "/test_data/greenbutton/example-GreenButton-data-electricity-wh.xml"
+        file = open(file_path, "r", encoding="utf-8")
+        parser = GreenButtonParser(file)
+
+        readings = list(parser.iter_readings())
+        self.assertEqual(len(readings), 2)
+        self.assertEqual(readings[0]['start_time'], 1299387600)
+        self.assertEqual(readings[0]['Usage/Quantity'], 1.79)
+
+        # the file is read again from the start
+        self.assertEqual(list(parser.iter_readings()), readings)
+        self.assertEqual(parser.data, readings)
@@ -0,0 +1,45 @@
+# !/usr/bin/env python
+# encoding: utf-8
+
+import os
+
+from django.test import TestCase
+
+from seed.lib.mcm.reader import MCMParser
+
+
+class MCMParserChunkTest(TestCase):
+    def setUp(self):
+        self.data_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'tests', 'data'
+        )
+
+    def _assert_chunks_match_data(self, filename, mode, chunk_size):
+        with open(os.path.join(self.data_path, filename), mode) as f:
+            parser = MCMParser(f)
+            expected = list(parser.data)
+            parser.seek_to_beginning()
+            offsets = list(parser.chunk_offsets(chunk_size))
+
+        self.assertEqual(sum(num_rows for _offset, num_rows in offsets), len(expected))
+        self.assertTrue(all(num_rows <= chunk_size for _offset, num_rows in offsets))
+
+        # every chunk is read by a new parser, the same way that the raw save tasks do
+        chunked_data = []
+        for offset, num_rows in offsets:
+            with open(os.path.join(self.data_path, filename), mode) as f:
+                chunked_data += list(MCMParser(f).read_chunk(offset, num_rows))
+
+        self.assertEqual(chunked_data, expected)
+
+    def test_csv_chunks(self):
+        self._assert_chunks_match_data('portfolio-manager-sample.csv', 'r', 100)
+
+    def test_data_is_unchanged_after_finding_chunks(self):
+        with open(os.path.join(self.data_path, 'portfolio-manager-sample.csv'), 'r') as f:
+            parser = MCMParser(f)
+            expected = list(parser.data)
+            parser.seek_to_beginning()
+            list(parser.chunk_offsets(100))
+
+            self.assertEqual(list(parser.data), expected)
@@ -88,48 +88,100 @@ def get_state_attrs(state_list):
         return get_taxlotstate_attrs(state_list)
 
 
-def _merge_geocoding_results(merged_state, state1, state2, priorities, can_attrs, ignore_merge_protection=False):
+GEOCODING_COLUMNS = [
+    'geocoding_confidence',
+    'longitude',
+    'latitude',
+    'long_lat',  # note this col shouldn't have priority set
+]
+
+
+def get_state_values(state, state_to_state):
+    """
+    Returns a dictionary of the attributes of a single state.
+
+    :param state: PropertyState/TaxLotState model inst., does not need to be saved
+    :param state_to_state: tuple, pairs of state attr and canonical attr names
+    :return: dict, values keyed on attr name
+    """
+    values = {}
+    for state_attr, can_attr in state_to_state:
+        # see get_attrs_with_mapping for why import_file is special
+        if can_attr == 'import_file':
+            values['import_file_id'] = state.import_file_id
+        else:
+            values[can_attr] = getattr(state, state_attr)
+
+    return values
+
+
+def _merge_geocoding_results(values1, values2, priorities, ignore_merge_protection=False):
     """
     Geocoding results need to be handled separately since they should generally
     "stick together". In one sense, all 4 result columns should be treated as
     one column. Specifically, the complete geocoding results of either the new
     state or the existing state is used - not a combination of the geocoding
     results from each.
-    """
-    geocoding_attr_cols = [
-        'geocoding_confidence',
-        'longitude',
-        'latitude',
-        'long_lat',  # note this col shouldn't have priority set
-    ]
 
+    :return: dict, the geocoding results to use keyed on attr name
+    """
     existing_results_empty = True
     new_results_empty = True
     geocoding_favor_new = True
 
-    for geocoding_col in geocoding_attr_cols:
-        existing_results_empty = existing_results_empty and can_attrs[geocoding_col][state1] is None
-        new_results_empty = new_results_empty and can_attrs[geocoding_col][state2] is None
+    for geocoding_col in GEOCODING_COLUMNS:
+        existing_results_empty = existing_results_empty and values1.get(geocoding_col) is None
+        new_results_empty = new_results_empty and values2.get(geocoding_col) is None
 
         geocoding_favor_new = geocoding_favor_new and priorities.get(geocoding_col, 'Favor New') == 'Favor New'
 
-        # Since these are handled here, remove them from canonical attributes
-        del can_attrs[geocoding_col]
-
     # Multiple elif's here is necessary since empty checks should be first, followed by merge protection settings
     if new_results_empty:
-        geo_state = state1
+        geo_values = values1
     elif existing_results_empty:
-        geo_state = state2
+        geo_values = values2
     elif ignore_merge_protection:
-        geo_state = state2
+        geo_values = values2
     elif geocoding_favor_new:
-        geo_state = state2
+        geo_values = values2
     else:   # favor existing
-        geo_state = state1
+        geo_values = values1
+
+    return {geo_attr: geo_values.get(geo_attr) for geo_attr in GEOCODING_COLUMNS}
+
+
+def _merge_values(values1, values2, priorities, ignore_merge_protection=False):
+    """
+    Merge the attributes of two states, return result.
+
+    :param values1: dict, left attributes, see get_state_values
+    :param values2: dict, right attributes
+    :param priorities: dict, column names with favor new or existing
+    :return: dict, merged attributes
+    """
+    merged_values = _merge_geocoding_results(values1, values2, priorities, ignore_merge_protection)
+
+    for attr, value1 in values1.items():
+        # geocoding results were handled above
+        if attr in merged_values:
+            continue
+
+        value2 = values2[attr]
+        # Check if not None instead of if value.
+        if value1 is not None and value2 is not None:
+            # If we have more than one value for this field, choose based on the column priority
+            col_prior = priorities.get(attr, 'Favor New')
+            if ignore_merge_protection or col_prior == 'Favor New':
+                merged_values[attr] = value2
+            else:  # favor the existing field
+                merged_values[attr] = value1
+        elif value1 is not None:
+            merged_values[attr] = value1
+        else:
+            # only the new value is set, or no values are set
+            merged_values[attr] = value2
 
-    for geo_attr in geocoding_attr_cols:
-        setattr(merged_state, geo_attr, getattr(geo_state, geo_attr, None))
+    return merged_values
 
 
 def _merge_extra_data(ed1, ed2, priorities, ignore_merge_protection=False):
@@ -169,40 +221,17 @@ def merge_state(merged_state, state1, state2, priorities, ignore_merge_protectio
     :param priorities: dict, column names with favor new or existing
     :return: inst(``merged_state``), updated.
     """
-    # Calculate the difference between the two states and save into a dictionary
-    can_attrs = get_state_attrs([state1, state2])
-
-    _merge_geocoding_results(merged_state, state1, state2, priorities, can_attrs, ignore_merge_protection)
+    state_to_state = get_state_to_state_tuple(type(state1).__name__)
 
-    default = state2
-    for attr in can_attrs:
-        # Do we have any differences between these fields? - Check if not None instead of if value.
-        attr_values = [value for value in list(can_attrs[attr].values()) if value is not None]
-        attr_values = [v for v in attr_values if v is not None]
-
-        attr_value = None
-        # Two, differing values are set.
-        if len(attr_values) > 1:
-            # If we have more than one value for this field, choose based on the column priority
-            col_prior = priorities.get(attr, 'Favor New')
-            if ignore_merge_protection or col_prior == 'Favor New':
-                attr_value = can_attrs[attr][state2]
-            else:  # favor the existing field
-                attr_value = can_attrs[attr][state1]
-
-        # No values are set
-        elif len(attr_values) < 1:
-            attr_value = None
-
-        # There is only one value set.
-        else:
-            attr_value = attr_values.pop()
-
-        if callable(attr):
-            # This callable will be responsible for setting the attribute value, not just returning it.
-            attr(merged_state, default)
-        else:
-            setattr(merged_state, attr, attr_value)
+    # Calculate the difference between the two states and save into a dictionary
+    merged_values = _merge_values(
+        get_state_values(state1, state_to_state),
+        get_state_values(state2, state_to_state),
+        priorities,
+        ignore_merge_protection
+    )
+    for attr, value in merged_values.items():
+        setattr(merged_state, attr, value)
 
     merged_state.extra_data = _merge_extra_data(
         state1.extra_data,
@@ -216,3 +245,41 @@ def merge_state(merged_state, state1, state2, priorities, ignore_merge_protectio
         PropertyState.merge_relationships(merged_state, state1, state2)
 
     return merged_state
+
+
+def merge_states(merged_state, states, priorities, ignore_merge_protection=False):
+    """
+    Set the attributes of merging a list of states on our Canonical model. The
+    result is the same as merging the states pairwise with merge_state, oldest
+    first, but the intermediate merged states are only kept in memory.
+
+    The relationships (measures, scenarios, simulations) are not merged since
+    they require a saved merged_state. Pairwise merging only keeps the
+    relationships of the last state, so call PropertyState.merge_relationships
+    with the last state once the merged_state is saved.
+
+    :param merged_state: PropertyState/TaxLotState model inst.
+    :param states: list, PropertyState/TaxLotState model inst. ordered from oldest to newest.
+    :param priorities: dict, column names with favor new or existing
+    :return: inst(``merged_state``), updated.
+    """
+    state_to_state = get_state_to_state_tuple(type(states[0]).__name__)
+
+    merged_values = get_state_values(states[0], state_to_state)
+    extra_data = states[0].extra_data
+    for state in states[1:]:
+        merged_values = _merge_values(
+            merged_values,
+            get_state_values(state, state_to_state),
+            priorities,
+            ignore_merge_protection
+        )
+        extra_data = _merge_extra_data(
+            extra_data, state.extra_data, priorities['extra_data'], ignore_merge_protection
+        )
+
+    for attr, value in merged_values.items():
+        setattr(merged_state, attr, value)
+    merged_state.extra_data = extra_data
+
+    return merged_state
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+:copyright (c) 2014 - 2020, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+import timeit
+from datetime import datetime
+
+from django.contrib.gis.geos import GEOSGeometry
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from seed.models import PropertyState, TaxLotState
+from seed.utils.hashing import StateHasher, get_state_hasher
+
+
+class Command(BaseCommand):
+    help = 'Times the hash of representative property and tax lot states'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count',
+                            default=1000,
+                            type=int,
+                            help='Number of states to hash',
+                            action='store')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        footprint = GEOSGeometry(
+            'POLYGON ((-104.98 39.74, -104.97 39.74, -104.97 39.75, -104.98 39.75, -104.98 39.74))',
+            srid=4326
+        )
+
+        states = []
+        for i in range(count):
+            extra_data = {'Extra Column {}'.format(c): 'Value {}'.format(i * c) for c in range(20)}
+            extra_data['Nom de la propriété'] = 'École {}'.format(i)
+            if i % 2:
+                states.append(PropertyState(
+                    address_line_1='{} Main Street'.format(i),
+                    pm_property_id=str(i),
+                    gross_floor_area=i * 100.5,
+                    site_eui=i / 10.0,
+                    recent_sale_date=datetime(2019, 1, 1, tzinfo=timezone.utc),
+                    property_footprint=footprint,
+                    extra_data=extra_data,
+                ))
+            else:
+                states.append(TaxLotState(
+                    address_line_1='{} Main Street'.format(i),
+                    jurisdiction_tax_lot_id=str(i),
+                    taxlot_footprint=footprint,
+                    extra_data=extra_data,
+                ))
+
+        hasher = get_state_hasher()
+        self._report('hash with extra data', count, lambda: [hasher.hash(s) for s in states])
+        self._report('hash without extra data', count,
+                     lambda: [hasher.hash(s, include_extra_data=False) for s in states])
+        self._report('create hasher for each hash', count,
+                     lambda: [StateHasher().hash(s) for s in states])
+
+    def _report(self, name, count, func):
+        seconds = min(timeit.repeat(func, number=1, repeat=3))
+        self.stdout.write('{}: {:.1f} us per state'.format(name, seconds / count * 1e6))
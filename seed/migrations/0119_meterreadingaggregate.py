@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 2.0.13 on 2020-02-04 18:21
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.timezone import get_default_timezone
+
+from seed.utils.reading_totals import end_of_month, end_of_year, max_reading_totals_by_interval
+
+MONTH = 1
+YEAR = 2
+
+
+def compute_aggregates(apps, schema_editor):
+    Meter = apps.get_model('seed', 'Meter')
+    MeterReading = apps.get_model('seed', 'MeterReading')
+    MeterReadingAggregate = apps.get_model('seed', 'MeterReadingAggregate')
+
+    tz = get_default_timezone()
+    for meter_id in Meter.objects.values_list('id', flat=True).iterator():
+        readings = list(
+            MeterReading.objects.filter(meter_id=meter_id).order_by('end_time').values_list(
+                'start_time', 'end_time', 'reading'
+            )
+        )
+        aggregates = []
+        for interval, end_of_interval in ((MONTH, end_of_month), (YEAR, end_of_year)):
+            for start_time, total in max_reading_totals_by_interval(readings, end_of_interval, tz):
+                aggregates.append(MeterReadingAggregate(
+                    meter_id=meter_id, interval=interval, start_time=start_time, total=total
+                ))
+        MeterReadingAggregate.objects.bulk_create(aggregates)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seed', '0118_match_merge_link_all_orgs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeterReadingAggregate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('interval', models.IntegerField(choices=[(1, 'Month'), (2, 'Year')])),
+                ('start_time', models.DateTimeField()),
+                ('total', models.FloatField()),
+                ('meter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reading_aggregates', to='seed.Meter')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='meterreadingaggregate',
+            unique_together={('meter', 'interval', 'start_time')},
+        ),
+        migrations.RunPython(compute_aggregates, migrations.RunPython.noop),
+    ]
@@ -23,6 +23,7 @@ from seed.models import (
     Scenario,
     Meter,
     MeterReading,
+    MeterReadingAggregate,
     MERGE_STATE_MERGED,
 )
 
@@ -278,6 +279,7 @@ class BuildingFile(models.Model):
                 }
 
                 MeterReading.objects.bulk_create(readings)
+                MeterReadingAggregate.refresh([meter.id])
 
         if property_view:
             # create a new blank state to merge the two together
@@ -8,6 +8,8 @@
 import logging
 
 from django.db import models
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
 from seed.landing.models import SEEDUser as User
@@ -15,6 +17,7 @@ from seed.lib.superperms.orgs.models import Organization as SuperOrganization
 from seed.models.models import (
     SEED_DATA_SOURCES,
 )
+from seed.utils.cache import get_cache_version, increment_cache_version
 
 # This is the inverse mapping of the property and tax lots that are prepended to the fields
 # for the other table.
@@ -38,6 +41,25 @@ INVENTORY_DISPLAY = {
 }
 _log = logging.getLogger(__name__)
 
+COLUMN_VERSION_KEY = 'SEED:column_version:{}'
+
+
+def get_column_version(organization_id):
+    """
+    Return the version of the Columns and ColumnMappings of an organization. The version changes
+    every time one of them is saved or deleted, so anything derived from the columns (e.g. the
+    mapping plan of an import file) can be cached along with the version it was built from.
+
+    :param organization_id: int, Organization ID
+    :return: str
+    """
+    return get_cache_version(COLUMN_VERSION_KEY.format(organization_id))
+
+
+def invalidate_column_version(organization_id):
+    """Change the version of the Columns and ColumnMappings of an organization"""
+    return increment_cache_version(COLUMN_VERSION_KEY.format(organization_id))
+
 
 def get_table_and_column_names(column_mapping, attr_name='column_raw'):
     """Turns the Column.column_names into a serializable list of str."""
@@ -279,3 +301,22 @@ class ColumnMapping(models.Model):
         """
         count, _ = ColumnMapping.objects.filter(super_organization=organization).delete()
         return count
+
+
+@receiver(post_save, sender=ColumnMapping)
+@receiver(post_delete, sender=ColumnMapping)
+def invalidate_column_version_on_mapping_change(sender, instance, **kwargs):
+    if instance.super_organization_id:
+        invalidate_column_version(instance.super_organization_id)
+
+
+@receiver(m2m_changed, sender=ColumnMapping.column_raw.through)
+@receiver(m2m_changed, sender=ColumnMapping.column_mapped.through)
+def invalidate_column_version_on_mapping_columns_change(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    # instance is a Column when the change is made from the reverse side of the relation
+    organization_id = instance.organization_id if reverse else instance.super_organization_id
+    if organization_id:
+        invalidate_column_version(organization_id)
@@ -9,7 +9,7 @@ import copy
 import csv
 import logging
 import os.path
-from collections import OrderedDict
+from collections import Counter, OrderedDict
 
 from django.apps import apps
 from django.db import IntegrityError
@@ -18,13 +18,18 @@ from django.db import (
     models,
     transaction,
 )
-from django.db.models import Q
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.utils.translation import ugettext_lazy as _
 
 from seed.lib.superperms.orgs.models import Organization as SuperOrganization
-from seed.models.column_mappings import ColumnMapping
+from seed.models.column_mappings import (
+    COLUMN_VERSION_KEY,
+    ColumnMapping,
+    get_column_version,
+    invalidate_column_version,
+)
 from seed.models.models import Unit
+from seed.utils.cache import get_cache_raw_many, set_cache_raw
 
 INVENTORY_DISPLAY = {
     'PropertyState': 'Property',
@@ -34,6 +39,62 @@ INVENTORY_DISPLAY = {
 }
 _log = logging.getLogger(__name__)
 
+# cache key of the columns that are known to exist for an organization
+KNOWN_COLUMNS_KEY = 'SEED:known_columns:{}'
+
+# cache key of the metadata derived from the columns of an organization, see
+# get_cached_column_metadata
+COLUMN_METADATA_KEY = 'SEED:column_metadata:{}:{}'
+
+# hits and misses of the column metadata cache in this process
+column_metadata_cache_stats = Counter()
+
+
+def get_cached_column_metadata(organization_id, name, build):
+    """
+    Return metadata derived from the columns of an organization (e.g. the serialized columns)
+    from the cache. The metadata are cached along with the version of the organization's columns,
+    which changes every time a Column or ColumnMapping of the organization is saved or deleted.
+    On a miss, or if the columns changed, the metadata are built and cached again.
+
+    :param organization_id: int, Organization ID
+    :param name: str, name of the metadata, including any arguments that they depend on
+    :param build: callable, returns the metadata
+    :return: the metadata. Every call returns a new copy, so callers may change it.
+    """
+    organization_id = getattr(organization_id, 'pk', organization_id)
+    key = COLUMN_METADATA_KEY.format(organization_id, name)
+    version_key = COLUMN_VERSION_KEY.format(organization_id)
+
+    cached = get_cache_raw_many([key, version_key])
+    data = cached.get(key)
+    if data is not None and version_key in cached and data['version'] == cached[version_key]:
+        column_metadata_cache_stats['hits'] += 1
+        return data['value']
+
+    column_metadata_cache_stats['misses'] += 1
+
+    # read the version before building so that a change made while building invalidates the metadata
+    version = get_column_version(organization_id)
+    value = build()
+    set_cache_raw(key, {'version': version, 'value': value})
+    return value
+
+
+def get_column_metadata_cache_hit_rate():
+    """
+    Return the hits, misses and hit rate of the column metadata cache in this process.
+
+    :return: dict
+    """
+    hits = column_metadata_cache_stats['hits']
+    misses = column_metadata_cache_stats['misses']
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else None,
+    }
+
 
 class Column(models.Model):
     """The name of a column for a given organization."""
@@ -50,6 +111,9 @@ class Column(models.Model):
         ('TaxLotState', 'jurisdiction_tax_lot_id')
     ]
 
+    # data types of the database columns, set by retrieve_db_types
+    _db_types = None
+
     # Do not return these columns to the front end -- when using the tax_lot_properties
     # get_related method.
     EXCLUDED_COLUMN_RETURN_FIELDS = [
@@ -1015,51 +1079,74 @@ class Column(models.Model):
 
         :param model_obj: model_obj instance (either PropertyState or TaxLotState).
         """
+        Column.register_column_names(
+            model_obj.organization_id, model_obj.__class__.__name__, model_obj.extra_data
+        )
+
+    @staticmethod
+    def register_column_names(organization_id, table_name, column_names):
+        """
+        Create the columns of an organization that do not exist yet, in bulk. The columns of the
+        organization are read with a single query and the missing ones are inserted with another.
+
+        The set of known columns is cached along with the version of the organization's columns,
+        so when importing a file, only the first chunk with new column names reads the columns of
+        the organization again. Every other chunk is checked against the cache.
+
+        The columns are read and inserted while holding a lock on the organization, so that
+        concurrent calls do not create the same columns twice.
+
+        :param organization_id: int, id of the organization
+        :param table_name: str, PropertyState or TaxLotState
+        :param column_names: iterable, names of the columns (e.g. the keys of the extra_data)
+        :return: list, the Columns that were created
+        """
         db_columns = Column.retrieve_db_field_table_and_names_from_db_tables()
-        for key in model_obj.extra_data:
-            # Check if the extra_data field in the model object is a database column
-            is_extra_data = (model_obj.__class__.__name__, key[:511]) not in db_columns
-
-            # handle the special edge-case where an old organization may have duplicate columns
-            # in the database. We should make this a migration in the future and put a validation
-            # in the db.
-            for i in range(0, 5):
-                while True:
-                    try:
-                        Column.objects.get_or_create(
-                            table_name=model_obj.__class__.__name__,
-                            column_name=key[:511],
-                            is_extra_data=is_extra_data,
-                            organization=model_obj.organization,
-                        )
-                    except Column.MultipleObjectsReturned:
-                        _log.debug(
-                            "Column.MultipleObjectsReturned for {} in save_column_names".format(
-                                key[:511]))
-
-                        columns = Column.objects.filter(table_name=model_obj.__class__.__name__,
-                                                        column_name=key[:511],
-                                                        is_extra_data=is_extra_data,
-                                                        organization=model_obj.organization)
-                        for c in columns:
-                            if not ColumnMapping.objects.filter(
-                                    Q(column_raw=c) | Q(column_mapped=c)).exists():
-                                _log.debug("Deleting column object {}".format(c.column_name))
-                                c.delete()
-
-                        # Check if there are more than one column still
-                        if Column.objects.filter(
-                                table_name=model_obj.__class__.__name__,
-                                column_name=key[:511],
-                                is_extra_data=is_extra_data,
-                                organization=model_obj.organization).count() > 1:
-                            raise Exception(
-                                "Could not fix duplicate columns for {}. Contact dev team").format(
-                                key)
-
-                        continue
+        columns = set()
+        for column_name in column_names:
+            # Check if the field in the model object is a database column
+            column_name = column_name[:511]
+            columns.add((table_name, column_name, (table_name, column_name) not in db_columns))
+
+        if not columns:
+            return []
+
+        known_key = KNOWN_COLUMNS_KEY.format(organization_id)
+        version_key = COLUMN_VERSION_KEY.format(organization_id)
+        cached = get_cache_raw_many([known_key, version_key])
+        known = cached.get(known_key)
+        if known is not None and known['version'] == cached.get(version_key) and columns <= known['columns']:
+            return []
+
+        with transaction.atomic():
+            # Parallel map_row_chunk tasks may register the same new names at the same time. Lock
+            # the organization so that the columns are read and inserted by one task at a time,
+            # the other tasks then read the inserted columns and do not insert them again.
+            SuperOrganization.objects.select_for_update().get(pk=organization_id)
+
+            # read the version before the columns so that a change made in the meantime
+            # invalidates the known columns
+            version = get_column_version(organization_id)
+            existing_columns = set(Column.objects.filter(organization_id=organization_id).values_list(
+                'table_name', 'column_name', 'is_extra_data'))
+
+            new_columns = Column.objects.bulk_create([
+                Column(
+                    organization_id=organization_id,
+                    table_name=column[0],
+                    column_name=column[1],
+                    is_extra_data=column[2],
+                )
+                for column in sorted(columns - existing_columns)
+            ])
 
-                    break
+        if new_columns:
+            # bulk_create does not send the post_save signals of the columns
+            invalidate_column_version(organization_id)
+        else:
+            set_cache_raw(known_key, {'version': version, 'columns': existing_columns})
+
+        return new_columns
 
     @staticmethod
     def delete_all(organization):
@@ -1089,6 +1176,14 @@ class Column(models.Model):
 
         :return: dict
         """
+        # the types only depend on the database columns, so they are only computed once
+        if Column._db_types is None:
+            Column._db_types = Column._build_db_types()
+
+        return {'types': copy.copy(Column._db_types)}
+
+    @staticmethod
+    def _build_db_types():
         columns = copy.deepcopy(Column.DATABASE_COLUMNS)
 
         MAP_TYPES = {
@@ -1112,7 +1207,7 @@ class Column(models.Model):
                 _log.error("could not find data_type for %s" % c)
                 types[c['column_name']] = ''
 
-        return {'types': types}
+        return types
 
     @staticmethod
     def retrieve_db_fields(org_id):
@@ -1213,6 +1308,13 @@ class Column(models.Model):
         :param inventory_type: Inventory Type (property|taxlot) from the requester. This sets the related columns if requested.
         :return: list, list of dict
         """
+        return get_cached_column_metadata(
+            org_id, 'mapping_columns:{}'.format(inventory_type),
+            lambda: Column._retrieve_mapping_columns(org_id, inventory_type)
+        )
+
+    @staticmethod
+    def _retrieve_mapping_columns(org_id, inventory_type):
         from seed.serializers.columns import ColumnSerializer
 
         columns_db = Column.objects.filter(organization_id=org_id).exclude(table_name='').exclude(
@@ -1265,6 +1367,13 @@ class Column(models.Model):
 
         :return: dict
         """
+        return get_cached_column_metadata(
+            org_id, 'all:{}:{}'.format(inventory_type, only_used),
+            lambda: Column._retrieve_all(org_id, inventory_type, only_used)
+        )
+
+    @staticmethod
+    def _retrieve_all(org_id, inventory_type, only_used):
         from seed.serializers.columns import ColumnSerializer
 
         # Grab all the columns out of the database for the organization that are assigned to a
@@ -1345,6 +1454,12 @@ class Column(models.Model):
         :param org_id: organization with the columns
         :return: dict
         """
+        return get_cached_column_metadata(
+            org_id, 'priorities', lambda: Column._retrieve_priorities(org_id)
+        )
+
+    @staticmethod
+    def _retrieve_priorities(org_id):
         columns = Column.retrieve_all(org_id, 'property', False)
         # The TaxLot and Property are not used in merging, they are just here to prevent errors
         priorities = {
@@ -1401,4 +1516,11 @@ def validate_model(sender, **kwargs):
         instance.full_clean()
 
 
+def invalidate_column_version_on_column_change(sender, instance, **kwargs):
+    if instance.organization_id:
+        invalidate_column_version(instance.organization_id)
+
+
 pre_save.connect(validate_model, sender=Column)
+post_save.connect(invalidate_column_version_on_column_change, sender=Column)
+post_delete.connect(invalidate_column_version_on_column_change, sender=Column)
@@ -4,6 +4,8 @@
 :copyright (c) 2014 - 2020, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
 :author
 """
+import collections
+import heapq
 import json
 import logging
 import re
@@ -29,7 +31,7 @@ from seed.models import (
 from seed.models import obj_to_dict
 from seed.serializers.pint import pretty_units
 from seed.utils.cache import (
-    set_cache_raw, get_cache_raw
+    set_cache_raw, get_cache_raw, get_cache_raw_many, delete_cache_many
 )
 from seed.utils.time import convert_datestr
 
@@ -511,6 +513,9 @@ class DataQualityCheck(models.Model):
         'TaxLotState': ['address_line_1', 'custom_id_1', 'jurisdiction_tax_lot_id'],
     }
 
+    # results are kept in the cache for 24 hours
+    CACHE_TIMEOUT = 86400
+
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
     name = models.CharField(max_length=255, default='Default Data Quality Check')
 
@@ -555,10 +560,13 @@ class DataQualityCheck(models.Model):
         # set in check_data
         self.column_lookup = {}
 
+        # views, labels and parent organizations of the rows being checked, set in check_data
+        self.reset_label_context()
+
         super().__init__(*args, **kwargs)
 
     @staticmethod
-    def initialize_cache(identifier=None):
+    def initialize_cache(identifier=None, chunk_count=0):
         """
         Initialize the cache for storing the results. This is called before the
         celery tasks are chunked up.
@@ -567,13 +575,26 @@ class DataQualityCheck(models.Model):
         to be stored for the data quality checks, the identifier, is the random number (or specified
         value that is used to identifier both the progress and the data storage
 
+        Each chunk saves its results in its own cache key (see chunk_cache_key), so that chunks
+        that are checked in parallel do not overwrite each other. The cache_key only holds the
+        number of chunks. The results of a previous check with the same identifier are removed.
+
         :param identifier: Identifier for cache, if None, then creates a random one
+        :param chunk_count: int, number of chunks that will save their results
         :return: list, [cache_key and the identifier]
         """
         if identifier is None:
             identifier = randint(100, 100000)
         cache_key = DataQualityCheck.cache_key(identifier)
-        set_cache_raw(cache_key, [])
+
+        previous = get_cache_raw(cache_key)
+        if isinstance(previous, dict):
+            delete_cache_many([
+                DataQualityCheck.chunk_cache_key(identifier, chunk)
+                for chunk in range(previous['chunk_count'])
+            ])
+
+        set_cache_raw(cache_key, {'chunk_count': chunk_count}, DataQualityCheck.CACHE_TIMEOUT)
         return cache_key, identifier
 
     @staticmethod
@@ -586,6 +607,41 @@ class DataQualityCheck(models.Model):
         """
         return "data_quality_results__%s" % identifier
 
+    @staticmethod
+    def chunk_cache_key(identifier, chunk):
+        """
+        Static method to return the location of the data_quality results of one chunk from redis.
+
+        :param identifier: Import file primary key
+        :param chunk: int, index of the chunk
+        :return:
+        """
+        return "data_quality_results__%s__%s" % (identifier, chunk)
+
+    @staticmethod
+    def get_results(identifier):
+        """
+        Return the results of all the chunks of the data quality check as a list of dictionaries
+        sorted by id. The results of each chunk are already sorted when they are saved, so they
+        only need to be merged.
+
+        :param identifier: Import file primary key
+        :return: list, or None if there are no results for the identifier
+        """
+        cache = get_cache_raw(DataQualityCheck.cache_key(identifier))
+        if cache is None:
+            return None
+
+        chunk_keys = [
+            DataQualityCheck.chunk_cache_key(identifier, chunk)
+            for chunk in range(cache['chunk_count'])
+        ]
+        chunk_results = get_cache_raw_many(chunk_keys)
+        return list(heapq.merge(
+            *[chunk_results[key] for key in chunk_keys if key in chunk_results],
+            key=lambda k: k['id']
+        ))
+
     def check_data(self, record_type, rows):
         """
         Send in data as a queryset from the Property/Taxlot ids.
@@ -599,9 +655,12 @@ class DataQualityCheck(models.Model):
         for c in Column.retrieve_all(self.organization, record_type, False):
             self.column_lookup[(c['table_name'], c['column_name'])] = c['display_name']
 
-        # grab all the rules once, save query time
-        rules = self.rules.filter(enabled=True, table_name=record_type).order_by('field',
-                                                                                 'severity')
+        # grab all the rules once, save query time. The status label of a rule is needed for every
+        # violation, so grab those at the same time
+        rules = self.rules.filter(enabled=True, table_name=record_type).select_related(
+            'status_label').order_by('field', 'severity')
+
+        rows = list(rows)
 
         # Get the list of the field names that will show in every result
         fields = self.get_fieldnames(record_type)
@@ -614,8 +673,11 @@ class DataQualityCheck(models.Model):
                     self.results[row.id][field] = getattr(row, field)
                 self.results[row.id]['data_quality_results'] = []
 
-            # Run the checks
-            self._check(rules, row)
+        # Run the checks, one rule at a time across all of the rows
+        self.load_label_context(record_type, rows)
+        for rule in rules:
+            self._check(rule, rows)
+        self.apply_status_labels()
 
         # Prune the results will remove any entries that have zero data_quality_results
         for k, v in self.results.copy().items():
@@ -631,38 +693,70 @@ class DataQualityCheck(models.Model):
     def reset_results(self):
         self.results = {}
 
-    def _check(self, rules, row):
+    def reset_label_context(self):
+        self.label_class = None
+        self.label_view_field = None
+        self.linked_ids = {}
+        self.linked_label_ids = {}
+        self.linked_parent_org_ids = {}
+        self.label_changes = {}
+
+    def load_label_context(self, record_type, rows):
         """
-        Check for errors in the min/max of the values.
+        Load the views, the labels of the views and the parent organizations of the rows in a few
+        queries, instead of looking them up for each row and rule.
 
-        :param rules: list, rules to run from database objects
-        :param row: PropertyState or TaxLotState, row of data to check
+        :param record_type: one of PropertyState | TaxLotState
+        :param rows: list, PropertyState or TaxLotState rows to check
         :return: None
         """
-        # check if the row has any rules applied to it
-        model_labels = {'linked_id': None, 'label_ids': []}
-        if row.__class__.__name__ == 'PropertyState':
-            label = apps.get_model('seed', 'PropertyView_labels')
-            if PropertyView.objects.filter(state=row).exists():
-                model_labels['linked_id'] = PropertyView.objects.get(state=row).id
-                model_labels['label_ids'] = list(
-                    label.objects.filter(propertyview_id=model_labels['linked_id']).values_list(
-                        'statuslabel_id', flat=True)
-                )
-                # _log.debug("Property {} has {} labels".format(model_labels['linked_id'],
-                #                                               len(model_labels['label_ids'])))
-        elif row.__class__.__name__ == 'TaxLotState':
-            label = apps.get_model('seed', 'TaxLotView_labels')
-            if TaxLotView.objects.filter(state=row).exists():
-                model_labels['linked_id'] = TaxLotView.objects.get(state=row).id
-                model_labels['label_ids'] = list(
-                    label.objects.filter(taxlotview_id=model_labels['linked_id']).values_list(
-                        'statuslabel_id', flat=True)
-                )
-                # _log.debug("TaxLot {} has {} labels".format(model_labels['linked_id'],
-                #                                             len(model_labels['label_ids'])))
+        self.reset_label_context()
+        if record_type == 'PropertyState':
+            self.label_class = apps.get_model('seed', 'PropertyView_labels')
+            self.label_view_field = 'propertyview_id'
+            views = PropertyView.objects.filter(state_id__in=[row.id for row in rows]).values_list(
+                'id', 'state_id', 'property__organization_id', 'property__organization__parent_org_id')
+        else:
+            self.label_class = apps.get_model('seed', 'TaxLotView_labels')
+            self.label_view_field = 'taxlotview_id'
+            views = TaxLotView.objects.filter(state_id__in=[row.id for row in rows]).values_list(
+                'id', 'state_id', 'taxlot__organization_id', 'taxlot__organization__parent_org_id')
+
+        for view_id, state_id, organization_id, parent_org_id in views:
+            self.linked_ids[state_id] = view_id
+            self.linked_label_ids[view_id] = set()
+            self.linked_parent_org_ids[view_id] = parent_org_id or organization_id
+
+        view_labels = self.label_class.objects.filter(
+            **{self.label_view_field + '__in': list(self.linked_label_ids)}
+        ).values_list(self.label_view_field, 'statuslabel_id')
+        for view_id, label_id in view_labels:
+            self.linked_label_ids[view_id].add(label_id)
+
+    def _check(self, rule, rows):
+        """
+        Check the rows for errors in the min/max of the values of a rule.
+
+        :param rule: Rule, rule to run
+        :param rows: list, PropertyState or TaxLotState rows of data to check
+        :return: None
+        """
+        label = self.label_class
+
+        # get the display name of the rule
+        in_column_lookup = (rule.table_name, rule.field) in self.column_lookup
+        if in_column_lookup:
+            rule_display_name = self.column_lookup[(rule.table_name, rule.field)]
+        else:
+            rule_display_name = rule.field
+
+        for row in rows:
+            # check if the row has any rules applied to it
+            model_labels = {
+                'linked_id': self.linked_ids.get(row.id),
+                'label_ids': self.linked_label_ids.get(self.linked_ids.get(row.id), ()),
+            }
 
-        for rule in rules:
             # create an extra data flag for the rule
             is_extra_data = rule.field in row.extra_data
 
@@ -693,13 +787,12 @@ class DataQualityCheck(models.Model):
                         continue
 
                 # get the display name of the rule
-                if (rule.table_name, rule.field) in self.column_lookup:
-                    display_name = self.column_lookup[(rule.table_name, rule.field)]
+                display_name = rule_display_name
 
                 # get the status_labels for the linked properties and tax lots
                 linked_id = model_labels['linked_id']
 
-                if (rule.table_name, rule.field) not in self.column_lookup:
+                if not in_column_lookup:
                     # If the rule is not in the column lookup, then it may have been a required
                     # field that wasn't mapped
                     if rule.required:
@@ -780,29 +873,26 @@ class DataQualityCheck(models.Model):
                 if not label_applied and rule.status_label_id in model_labels['label_ids']:
                     self.remove_status_label(label, rule, linked_id)
 
-    def save_to_cache(self, identifier):
+    def save_to_cache(self, identifier, chunk=0):
         """
         Save the results to the cache database. The data in the cache are
         stored as a list of dictionaries. The data in this class are stored as
         a dict of dict. This is important to remember because the data from the
         cache cannot be simply loaded into the above structure.
 
+        Each chunk is saved in its own key with a single write, the results of all of the chunks
+        are put together by get_results.
+
         :param identifier: Import file primary key
+        :param chunk: int, index of the chunk that was checked
         :return: None
         """
 
         # change the format of the data in the cache. Make this a list of
         # objects instead of object of objects.
-        existing_results = get_cache_raw(DataQualityCheck.cache_key(identifier)) or []
-
-        results = []
-        for key, value in self.results.items():
-            results.append(value)
-
-        existing_results += results
-
-        z = sorted(existing_results, key=lambda k: k['id'])
-        set_cache_raw(DataQualityCheck.cache_key(identifier), z, 86400)  # 24 hours
+        results = sorted(self.results.values(), key=lambda k: k['id'])
+        set_cache_raw(DataQualityCheck.chunk_cache_key(identifier, chunk), results,
+                      DataQualityCheck.CACHE_TIMEOUT)
 
     def initialize_rules(self):
         """
@@ -1011,41 +1101,35 @@ class DataQualityCheck(models.Model):
 
     def update_status_label(self, label_class, rule, linked_id, row_id):
         """
+        Record that the status label of the rule is to be applied to the view. The labels are
+        added in bulk by apply_status_labels.
 
         :param label_class: statuslabel object, either propertyview label or taxlotview label
         :param rule: rule object
-        :param linked_id: id of propertystate or taxlotstate object
+        :param linked_id: id of propertyview or taxlotview object
         :return: boolean, if labeled was applied
         """
         if rule.status_label_id is not None and linked_id is not None:
             label_org_id = rule.status_label.super_organization_id
 
-            if rule.table_name == 'PropertyState':
-                property_parent_org_id = PropertyView.objects.get(pk=linked_id).property.organization.get_parent().id
-                if property_parent_org_id == label_org_id:
-                    label_class.objects.get_or_create(propertyview_id=linked_id,
-                                                      statuslabel_id=rule.status_label_id)
+            parent_org_id = self.linked_parent_org_ids.get(linked_id)
+            if parent_org_id is None:
+                # the view was not loaded by load_label_context
+                if rule.table_name == 'PropertyState':
+                    parent_org_id = PropertyView.objects.get(pk=linked_id).property.organization.get_parent().id
                 else:
-                    raise IntegrityError(
-                        'Label with super_organization_id={} cannot be applied to a record with parent '
-                        'organization_id={}.'.format(
-                            label_org_id,
-                            property_parent_org_id
-                        )
-                    )
-            else:
-                taxlot_parent_org_id = TaxLotView.objects.get(pk=linked_id).taxlot.organization.get_parent().id
-                if taxlot_parent_org_id == label_org_id:
-                    label_class.objects.get_or_create(taxlotview_id=linked_id,
-                                                      statuslabel_id=rule.status_label_id)
-                else:
-                    raise IntegrityError(
-                        'Label with super_organization_id={} cannot be applied to a record with parent '
-                        'organization_id={}.'.format(
-                            label_org_id,
-                            taxlot_parent_org_id
-                        )
+                    parent_org_id = TaxLotView.objects.get(pk=linked_id).taxlot.organization.get_parent().id
+
+            if parent_org_id != label_org_id:
+                raise IntegrityError(
+                    'Label with super_organization_id={} cannot be applied to a record with parent '
+                    'organization_id={}.'.format(
+                        label_org_id,
+                        parent_org_id
                     )
+                )
+
+            self.label_changes[(linked_id, rule.status_label_id)] = True
 
             self.results[row_id]['data_quality_results'][-1]['label'] = rule.status_label.name
 
@@ -1053,20 +1137,44 @@ class DataQualityCheck(models.Model):
 
     def remove_status_label(self, label_class, rule, linked_id):
         """
-        Remove label because it did not match any of the range exceptions
+        Record that the status label of the rule is to be removed from the view because it did
+        not match any of the range exceptions. The labels are removed in bulk by
+        apply_status_labels.
 
         :param label_class: statuslabel object, either property label or taxlot label
         :param rule: rule object
-        :param linked_id: id of propertystate or taxlotstate object
-        :return: boolean, if labeled was applied
+        :param linked_id: id of propertyview or taxlotview object
+        :return: None
         """
+        self.label_changes[(linked_id, rule.status_label_id)] = False
 
-        if rule.table_name == 'PropertyState':
-            label_class.objects.filter(propertyview_id=linked_id,
-                                       statuslabel_id=rule.status_label_id).delete()
-        else:
-            label_class.objects.filter(taxlotview_id=linked_id,
-                                       statuslabel_id=rule.status_label_id).delete()
+    def apply_status_labels(self):
+        """
+        Add and remove the status labels that were recorded while checking the rows. The last
+        change of a label on a view wins, which is the same as applying the changes one at a time.
+
+        :return: None
+        """
+        labels_to_add = []
+        view_ids_to_remove = collections.defaultdict(list)
+        for (view_id, label_id), applied in self.label_changes.items():
+            view_label_ids = self.linked_label_ids.setdefault(view_id, set())
+            if applied and label_id not in view_label_ids:
+                labels_to_add.append(
+                    self.label_class(**{self.label_view_field: view_id, 'statuslabel_id': label_id})
+                )
+                view_label_ids.add(label_id)
+            elif not applied and label_id in view_label_ids:
+                view_ids_to_remove[label_id].append(view_id)
+                view_label_ids.remove(label_id)
+
+        self.label_class.objects.bulk_create(labels_to_add)
+        for label_id, view_ids in view_ids_to_remove.items():
+            self.label_class.objects.filter(
+                **{self.label_view_field + '__in': view_ids, 'statuslabel_id': label_id}
+            ).delete()
+
+        self.label_changes = {}
 
     def retrieve_result_by_address(self, address):
         """
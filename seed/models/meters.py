@@ -3,11 +3,25 @@
 :copyright (c) 2014 - 2020, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
 """
 
+import csv
+import io
+from collections import defaultdict
+
 from django.db import (
     connection,
     models,
+    transaction,
 )
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils.timezone import get_default_timezone
+
 from seed.models import Property, Scenario
+from seed.utils.reading_totals import (
+    end_of_month,
+    end_of_year,
+    max_reading_totals_by_interval,
+)
 
 
 class Meter(models.Model):
@@ -99,27 +113,18 @@ class Meter(models.Model):
     def copy_readings(self, source_meter, overlaps_possible=True):
         """
         Copies MeterReadings of another Meter. By default, overlapping readings
-        are considered possible so a SQL bulk upsert is used. But if overlapping
+        are considered possible so a bulk upsert is used. But if overlapping
         readings are explicitly specified as not possible, a more efficient
         bulk_create is used.
         """
         if overlaps_possible:
-            reading_strings = [
-                f"({self.id}, '{reading.start_time}', '{reading.end_time}', {reading.reading}, '{reading.source_unit}', {reading.conversion_factor})"
+            MeterReading.objects.upsert(
+                dict(reading, meter_id=self.id)
                 for reading
-                in source_meter.meter_readings.all()
-            ]
-
-            sql = (
-                "INSERT INTO seed_meterreading(meter_id, start_time, end_time, reading, source_unit, conversion_factor)" +
-                " VALUES " + ", ".join(reading_strings) +
-                " ON CONFLICT (meter_id, start_time, end_time)" +
-                " DO UPDATE SET reading = EXCLUDED.reading, source_unit = EXCLUDED.source_unit, conversion_factor = EXCLUDED.conversion_factor" +
-                " RETURNING reading;"
+                in source_meter.meter_readings.values(
+                    'start_time', 'end_time', 'reading', 'source_unit', 'conversion_factor'
+                ).iterator()
             )
-
-            with connection.cursor() as cursor:
-                cursor.execute(sql)
         else:
             readings = {
                 MeterReading(
@@ -136,6 +141,83 @@ class Meter(models.Model):
 
             MeterReading.objects.bulk_create(readings)
 
+        MeterReadingAggregate.refresh([self.id])
+
+
+class MeterReadingQuerySet(models.QuerySet):
+    """
+    QuerySet of the MeterReading model, with the set based operations used to save readings
+    in bulk.
+    """
+
+    UPSERT_FIELDS = ('meter_id', 'start_time', 'end_time', 'reading', 'source_unit', 'conversion_factor')
+
+    def upsert(self, readings):
+        """
+        Create or update readings in bulk. The readings are streamed with COPY into a temporary
+        table and merged into the readings in a single statement. A reading is updated if a
+        reading of its meter with the same start_time and end_time exists.
+
+        Readings of the same meter with the same start_time and end_time are duplicates, of which
+        only the last one is saved. Unlike a plain upsert, duplicates don't make the batch fail.
+
+        :param readings: iterable, dicts with the meter_id, start_time, end_time, reading,
+            source_unit and conversion_factor of the readings
+        :return: dict, {meter_id: {'count': number of readings saved, 'duplicates': number of
+            duplicate readings that were ignored}}
+        """
+        incoming_counts = defaultdict(int)
+        copy_data = io.StringIO()
+        writer = csv.writer(copy_data)
+        for ordinal, reading in enumerate(readings):
+            incoming_counts[reading['meter_id']] += 1
+            writer.writerow([ordinal] + [
+                '\\N' if reading.get(field) is None else reading.get(field)
+                for field in self.UPSERT_FIELDS
+            ])
+
+        if not incoming_counts:
+            return {}
+        copy_data.seek(0)
+
+        fields = ', '.join(self.UPSERT_FIELDS)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'DROP TABLE IF EXISTS seed_meterreading_upsert;'
+                ' CREATE TEMPORARY TABLE seed_meterreading_upsert ('
+                ' ordinal integer, meter_id integer, start_time timestamp with time zone,'
+                ' end_time timestamp with time zone, reading double precision,'
+                ' source_unit varchar(255), conversion_factor double precision'
+                ' ) ON COMMIT DROP;'
+            )
+            cursor.copy_expert(
+                f"COPY seed_meterreading_upsert (ordinal, {fields}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                copy_data
+            )
+            cursor.execute(
+                # keep only the last of the duplicate readings
+                'WITH batch AS ('
+                f' SELECT DISTINCT ON (meter_id, start_time, end_time) {fields}'
+                ' FROM seed_meterreading_upsert'
+                ' ORDER BY meter_id, start_time, end_time, ordinal DESC'
+                '), upserted AS ('
+                f' INSERT INTO seed_meterreading ({fields})'
+                f' SELECT {fields} FROM batch'
+                ' ON CONFLICT (meter_id, start_time, end_time)'
+                ' DO UPDATE SET reading = EXCLUDED.reading, source_unit = EXCLUDED.source_unit, conversion_factor = EXCLUDED.conversion_factor'
+                ' RETURNING meter_id'
+                ') SELECT meter_id, count(*) FROM upserted GROUP BY meter_id;'
+            )
+            saved_counts = dict(cursor.fetchall())
+
+        return {
+            meter_id: {
+                'count': saved_counts.get(meter_id, 0),
+                'duplicates': incoming_count - saved_counts.get(meter_id, 0),
+            }
+            for meter_id, incoming_count in incoming_counts.items()
+        }
+
 
 class MeterReading(models.Model):
     meter = models.ForeignKey(
@@ -155,5 +237,77 @@ class MeterReading(models.Model):
     source_unit = models.CharField(max_length=255, null=True, blank=True)
     conversion_factor = models.FloatField(null=True, blank=True)
 
+    objects = MeterReadingQuerySet.as_manager()
+
     class Meta:
         unique_together = ('meter', 'start_time', 'end_time')
+
+
+class MeterReadingAggregate(models.Model):
+    """
+    Monthly and yearly totals of the readings of a meter, so that usages can be read without
+    aggregating the readings. The totals are refreshed with MeterReadingAggregate.refresh
+    whenever readings are saved in bulk.
+    """
+    MONTH = 1
+    YEAR = 2
+
+    INTERVALS = (
+        (MONTH, 'Month'),
+        (YEAR, 'Year'),
+    )
+
+    meter = models.ForeignKey(
+        Meter,
+        on_delete=models.CASCADE,
+        related_name='reading_aggregates',
+    )
+    interval = models.IntegerField(choices=INTERVALS)
+
+    # The first interval of a meter starts at its first reading, the others at the start of
+    # the month or year in the timezone of the settings.
+    start_time = models.DateTimeField()
+
+    # Highest possible total (kBtu) of the readings that do not overlap within the interval
+    total = models.FloatField()
+
+    class Meta:
+        unique_together = ('meter', 'interval', 'start_time')
+
+    @classmethod
+    def refresh(cls, meter_ids):
+        """
+        Recompute the monthly and yearly totals of the meters from their readings. The readings
+        of each meter are read with a single query.
+
+        :param meter_ids: list, ids of the meters
+        :return: list, the new MeterReadingAggregates
+        """
+        tz = get_default_timezone()
+        aggregates = []
+        for meter_id in meter_ids:
+            readings = list(
+                MeterReading.objects.filter(meter_id=meter_id).order_by('end_time').values_list(
+                    'start_time', 'end_time', 'reading'
+                )
+            )
+            for interval, end_of_interval in ((cls.MONTH, end_of_month), (cls.YEAR, end_of_year)):
+                for start_time, total in max_reading_totals_by_interval(readings, end_of_interval, tz):
+                    aggregates.append(
+                        cls(meter_id=meter_id, interval=interval, start_time=start_time, total=total)
+                    )
+
+        with transaction.atomic():
+            cls.objects.filter(meter_id__in=meter_ids).delete()
+            cls.objects.bulk_create(aggregates)
+
+        return aggregates
+
+
+@receiver(post_save, sender=MeterReading)
+def post_save_meter_reading(sender, instance, **kwargs):
+    """
+    Readings saved one at a time make the totals of their meter stale. The totals are removed
+    and are computed again when they are next read.
+    """
+    MeterReadingAggregate.objects.filter(meter_id=instance.meter_id).delete()
@@ -15,11 +15,12 @@ from os import path
 from django.contrib.gis.db import models as geomodels
 from django.contrib.postgres.fields import JSONField
 from django.db import (
+    connection,
     models,
     transaction,
     IntegrityError,
 )
-from django.db.models.signals import pre_delete, pre_save, post_save, m2m_changed
+from django.db.models.signals import pre_delete, pre_save, post_delete, post_save, m2m_changed
 from django.dispatch import receiver
 from django.forms.models import model_to_dict
 from past.builtins import basestring
@@ -39,12 +40,16 @@ from seed.models import (
     MERGE_STATE_UNKNOWN,
     TaxLotProperty
 )
+from seed.models.state_querysets import StateQuerySet
+from seed.models.tracked_fields import TrackedGeocodingFieldsMixin
 from seed.utils.address import normalize_address_str
 from seed.utils.generic import (
     compare_orgs_between_label_and_target,
     split_model_fields,
     obj_to_dict,
 )
+from seed.utils.hashing import hash_state_object
+from seed.utils.pagination import invalidate_inventory_count
 from seed.utils.time import convert_datestr
 from seed.utils.time import convert_to_js_timestamp
 from .auditlog import AUDIT_IMPORT
@@ -86,45 +91,130 @@ class Property(models.Model):
         Copies meters from a source Property to the current Property.
 
         It's most efficient if the persistence of the source Property's readings
-        aren't needed as bulk reassignments can then be used.
+        aren't needed as the meters can then be reassigned instead of copied.
+        See copy_meters_in_bulk.
+        """
+        Property.copy_meters_in_bulk([(self.id, [source_property_id])], source_persists=source_persists)
 
-        The cases and logic are described in comments throughout.
+    @classmethod
+    def copy_meters_in_bulk(cls, meter_copies, source_persists=True):
         """
-        source_property = Property.objects.get(pk=source_property_id)
+        Copies the meters of source Properties to target Properties with a few
+        INSERT ... SELECT statements for the whole batch. For each target, the
+        result is the same as copying the meters of its sources one source at a
+        time, in order.
+
+        A source meter is copied into the target's meter with the same
+        is_virtual, source, source_id and type, which is created if the target
+        doesn't have one yet. Readings of later sources take precedence over
+        readings of earlier sources (and of the target) with the same start and
+        end times.
+
+        If the sources don't need to persist, a source meter without a similar
+        meter on the target is reassigned to the target instead of being copied.
+        A source meter is only reassigned to the first target it's copied to.
+
+        The targets are not expected to be sources of the same batch.
+
+        :param meter_copies: list, (target_property_id, [source_property_id, ...]) tuples
+        :param source_persists: bool, whether the meters of the sources need to persist
+        :return: None
+        """
+        # meters depend on this module
+        from seed.models.meters import MeterReadingAggregate
 
-        # If the source property has no meters to copy, there's nothing to do.
-        if not source_property.meters.exists():
-            return
+        target_ids, source_ids = [], []
+        for target_id, target_source_ids in meter_copies:
+            for source_id in target_source_ids:
+                if source_id != target_id:
+                    target_ids.append(target_id)
+                    source_ids.append(source_id)
 
-        if self.meters.exists() is False and source_persists is False:
-            # In this case, simply copy over the meters and readings from source in bulk.
-            source_property.meters.update(property_id=self.id)
-        else:
-            # In any other case, copy over the readings from source one meter at
-            # a time, checking to see if self has a similar meter each time.
-            for source_meter in source_property.meters.all():
-                with transaction.atomic():
-                    target_meter, created = self.meters.get_or_create(
-                        is_virtual=source_meter.is_virtual,
-                        source=source_meter.source,
-                        source_id=source_meter.source_id,
-                        type=source_meter.type
-                    )
-
-                    if created:
-                        # If self didn't have a similar meter and a new one was created,
-                        # decide what to do depending on whether source meters need to persist.
-                        if source_persists:
-                            # Note, overlaps aren't possible since a new meter was created.
-                            target_meter.copy_readings(source_meter, overlaps_possible=False)
-                        else:
-                            source_meter.meter_readings.update(meter=target_meter)
-                    else:
-                        # If self did have a similar meter, copy readings assuming overlaps are possible.
-                        target_meter.copy_readings(source_meter, overlaps_possible=True)
+        if not target_ids:
+            return
 
+        # The ordinal of a (target, source) pair is its position in the batch
+        mapping = (
+            'WITH mapping AS ('
+            ' SELECT * FROM unnest(%s::integer[], %s::integer[])'
+            ' WITH ORDINALITY AS mapping(target_property_id, source_property_id, ordinal)'
+            ')'
+        )
+        params = [target_ids, source_ids]
+
+        def similar_meters(meter_1, meter_2):
+            return ' AND '.join(
+                f'{meter_1}.{field} IS NOT DISTINCT FROM {meter_2}.{field}'
+                for field in ['is_virtual', 'source', 'source_id', 'type']
+            )
+
+        def similar_target_meter_exists(target_property_id, meter):
+            return (
+                'EXISTS (SELECT 1 FROM seed_meter target_meter'
+                f' WHERE target_meter.property_id = {target_property_id} AND {similar_meters("target_meter", meter)})'
+            )
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if not source_persists:
+                # Reassign each source meter without a similar meter on the first target it's
+                # copied to. Only the first of similar source meters is reassigned.
+                cursor.execute(
+                    f'{mapping}, claimed AS ('
+                    ' SELECT DISTINCT ON (source_meter.id)'
+                    ' source_meter.*, mapping.target_property_id, mapping.ordinal'
+                    ' FROM mapping'
+                    ' JOIN seed_meter source_meter ON source_meter.property_id = mapping.source_property_id'
+                    ' ORDER BY source_meter.id, mapping.ordinal'
+                    '), moved AS ('
+                    ' SELECT DISTINCT ON (target_property_id, is_virtual, source, source_id, type)'
+                    ' id, target_property_id'
+                    ' FROM claimed'
+                    f' WHERE NOT {similar_target_meter_exists("claimed.target_property_id", "claimed")}'
+                    ' ORDER BY target_property_id, is_virtual, source, source_id, type, ordinal, id'
+                    ')'
+                    ' UPDATE seed_meter SET property_id = moved.target_property_id'
+                    ' FROM moved WHERE seed_meter.id = moved.id',
+                    params
+                )
 
-class PropertyState(models.Model):
+            # Create the meters the targets don't have yet
+            cursor.execute(
+                f'{mapping}'
+                ' INSERT INTO seed_meter (property_id, is_virtual, source, source_id, type)'
+                ' SELECT DISTINCT mapping.target_property_id,'
+                ' source_meter.is_virtual, source_meter.source, source_meter.source_id, source_meter.type'
+                ' FROM mapping'
+                ' JOIN seed_meter source_meter ON source_meter.property_id = mapping.source_property_id'
+                f' WHERE NOT {similar_target_meter_exists("mapping.target_property_id", "source_meter")}',
+                params
+            )
+
+            # Copy the readings, the reading of the last source taking precedence
+            cursor.execute(
+                f'{mapping}, copied AS ('
+                ' INSERT INTO seed_meterreading (meter_id, start_time, end_time, reading, source_unit, conversion_factor)'
+                ' SELECT DISTINCT ON (target_meter.id, source_reading.start_time, source_reading.end_time)'
+                ' target_meter.id, source_reading.start_time, source_reading.end_time,'
+                ' source_reading.reading, source_reading.source_unit, source_reading.conversion_factor'
+                ' FROM mapping'
+                ' JOIN seed_meter source_meter ON source_meter.property_id = mapping.source_property_id'
+                ' JOIN seed_meter target_meter ON target_meter.property_id = mapping.target_property_id'
+                f' AND {similar_meters("target_meter", "source_meter")}'
+                ' JOIN seed_meterreading source_reading ON source_reading.meter_id = source_meter.id'
+                ' ORDER BY target_meter.id, source_reading.start_time, source_reading.end_time,'
+                ' mapping.ordinal DESC, source_meter.id DESC'
+                ' ON CONFLICT (meter_id, start_time, end_time)'
+                ' DO UPDATE SET reading = EXCLUDED.reading, source_unit = EXCLUDED.source_unit, conversion_factor = EXCLUDED.conversion_factor'
+                ' RETURNING meter_id'
+                ') SELECT DISTINCT meter_id FROM copied',
+                params
+            )
+            copied_meter_ids = [meter_id for meter_id, in cursor.fetchall()]
+
+            MeterReadingAggregate.refresh(copied_meter_ids)
+
+
+class PropertyState(TrackedGeocodingFieldsMixin, models.Model):
     """Store a single property. This contains all the state information about the property"""
     ANALYSIS_STATE_NOT_STARTED = 0
     ANALYSIS_STATE_STARTED = 1
@@ -271,6 +361,8 @@ class PropertyState(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    objects = StateQuerySet.as_manager()
+
     class Meta:
         index_together = [
             ['hash_object'],
@@ -387,7 +479,6 @@ class PropertyState(models.Model):
             self.normalized_address = None
 
         # save a hash of the object to the database for quick lookup
-        from seed.data_importer.tasks import hash_state_object
         self.hash_object = hash_state_object(self)
 
         return super().save(*args, **kwargs)
@@ -804,6 +895,17 @@ def post_save_property_view(sender, **kwargs):
         kwargs['instance'].property.save()
 
 
+@receiver(post_save, sender=PropertyView)
+@receiver(post_delete, sender=PropertyView)
+def invalidate_property_view_count(sender, instance, **kwargs):
+    """
+    When a PropertyView is created or deleted, invalidate the cached count of the views of its cycle
+    """
+    # post_delete does not send created
+    if kwargs.get('created', True):
+        invalidate_inventory_count(instance.cycle_id)
+
+
 class PropertyAuditLog(models.Model):
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
     parent1 = models.ForeignKey('PropertyAuditLog', on_delete=models.CASCADE, blank=True, null=True,
@@ -835,24 +937,7 @@ class PropertyAuditLog(models.Model):
 
 @receiver(pre_save, sender=PropertyState)
 def sync_latitude_longitude_and_long_lat(sender, instance, **kwargs):
-    try:
-        original_obj = sender.objects.get(pk=instance.pk)
-    except sender.DoesNotExist:
-        pass  # Occurs on object creation
-    else:
-        # Sync Latitude, Longitude, and long_lat fields if applicable
-        latitude_change = original_obj.latitude != instance.latitude
-        longitude_change = original_obj.longitude != instance.longitude
-        long_lat_change = original_obj.long_lat != instance.long_lat
-        lat_and_long_both_populated = instance.latitude is not None and instance.longitude is not None
-
-        # The 'not long_lat_change' condition removes the case when long_lat is changed by an external API
-        if (latitude_change or longitude_change) and lat_and_long_both_populated and not long_lat_change:
-            instance.long_lat = f"POINT ({instance.longitude} {instance.latitude})"
-            instance.geocoding_confidence = "Manually geocoded (N/A)"
-        elif (latitude_change or longitude_change) and not lat_and_long_both_populated:
-            instance.long_lat = None
-            instance.geocoding_confidence = None
+    instance.sync_latitude_longitude_and_long_lat()
 
 
 m2m_changed.connect(compare_orgs_between_label_and_target, sender=PropertyView.labels.through)
@@ -0,0 +1,98 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2020, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+from django.db import models
+from django.db.models import Subquery
+
+from seed.utils.address import normalize_address_str
+from seed.utils.hashing import hash_state_object
+from seed.utils.pagination import invalidate_inventory_count
+
+
+class StateQuerySet(models.QuerySet):
+    """
+    QuerySet of the PropertyState and TaxLotState models. This holds the set based versions of
+    the operations that are otherwise run one state at a time (e.g. in the model's `save`).
+    """
+
+    def bulk_create_states(self, states, batch_size=None):
+        """
+        Insert new states in bulk. Since `bulk_create` does not call the model's `save`, the
+        normalized address and the hash of each state are calculated here. Each distinct
+        address is only normalized once.
+
+        The pre_save signals are not sent. This is fine for new states because the lat/long sync
+        only applies to states that already exist in the database.
+
+        :param states: list, unsaved PropertyState or TaxLotState objects
+        :param batch_size: int, optional number of rows per INSERT statement
+        :return: list, the states with their primary keys set
+        """
+        normalized_addresses = {}
+        for state in states:
+            address = state.address_line_1
+            if address is None:
+                state.normalized_address = None
+            else:
+                if address not in normalized_addresses:
+                    normalized_addresses[address] = normalize_address_str(address)
+                state.normalized_address = normalized_addresses[address]
+
+            state.hash_object = hash_state_object(state)
+
+        return self.bulk_create(states, batch_size=batch_size)
+
+    def promote(self, cycle):
+        """
+        Promote the states to the view table for the given cycle in bulk. This is the set based
+        version of the model's `promote`. A canonical record (Property or TaxLot) and a view are
+        created for each state that does not have a view in the cycle yet, and the data_state of
+        the states is updated with a single query.
+
+        Since the views are created with `bulk_create`, the post_save signals of the views are not
+        sent. These only touch the `updated` field of the canonical records, which are new anyway.
+
+        :param cycle: Cycle to assign the views
+        :return: list, the resulting views, including the views that already existed
+        """
+        from seed.models import (
+            DATA_STATE_MATCHING,
+            Property,
+            PropertyState,
+            PropertyView,
+            TaxLot,
+            TaxLotView,
+        )
+
+        if self.model == PropertyState:
+            ViewClass, CanonicalClass, canonical_field = PropertyView, Property, 'property'
+        else:
+            ViewClass, CanonicalClass, canonical_field = TaxLotView, TaxLot, 'taxlot'
+
+        cycle_views = ViewClass.objects.filter(cycle=cycle)
+        existing_views = list(cycle_views.filter(state_id__in=Subquery(self.values('id'))))
+        states = list(self.exclude(pk__in=Subquery(cycle_views.values('state_id'))))
+        if not states:
+            return existing_views
+
+        canonical_records = CanonicalClass.objects.bulk_create([
+            CanonicalClass(organization_id=state.organization_id) for state in states
+        ])
+        views = ViewClass.objects.bulk_create([
+            ViewClass(cycle=cycle, state=state, **{canonical_field: canonical_record})
+            for state, canonical_record in zip(states, canonical_records)
+        ])
+
+        # bulk_create does not send the post_save signal that invalidates the count of the views
+        invalidate_inventory_count(cycle.id)
+
+        self.model.objects.filter(pk__in=[state.pk for state in states]).update(
+            data_state=DATA_STATE_MATCHING
+        )
+        for state in states:
+            state.data_state = DATA_STATE_MATCHING
+
+        return existing_views + views
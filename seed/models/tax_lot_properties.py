@@ -7,25 +7,160 @@
 from __future__ import unicode_literals
 
 import logging
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 from itertools import chain
 
 from django.apps import apps
 from django.contrib.gis.db.models import GeometryField
 from django.contrib.gis.geos import GEOSGeometry
+from django.contrib.postgres.fields import JSONField
 from django.db import models
-from django.db.models import Count
+from django.db.models import Count, Func
 from django.utils.timezone import make_naive
 
 from seed.models.columns import Column
-from seed.utils.geocode import (
-    bounding_box_wkt,
-    long_lat_wkt,
-)
-from seed.utils.ubid import centroid_wkt
 
 logger = logging.getLogger(__name__)
 
+# these time stamps are returned as naive iso formatted strings
+NAIVE_TIMESTAMP_FIELDS = ['recent_sale_date', 'release_date', 'generation_date', 'analysis_start_time',
+                          'analysis_end_time']
+
+
+def to_wkt(value):
+    """Convert (non-JSON serializable) geometry to string (wkt)"""
+    if value:
+        return GEOSGeometry(value, srid=4326).wkt
+
+
+def to_naive_isoformat(value):
+    if value:
+        return make_naive(value).isoformat()
+    return value
+
+
+class JSONKey(Func):
+    """The value of a key of a JSONField, the key is passed to the database as a parameter"""
+    template = '(%(expressions)s -> %%s)'
+
+    def __init__(self, expression, key, **extra):
+        super().__init__(expression, output_field=JSONField(), **extra)
+        self.key = key
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = super().as_sql(compiler, connection, **extra_context)
+        return sql, list(params) + [self.key]
+
+
+class StateDictBuilder(object):
+    """
+    Builds the dictionaries of the states that are returned by TaxLotProperty.get_related, which
+    are the same as the ones of model_to_dict_with_mapping and extra_data_to_dict_with_mapping.
+
+    The fields to return, their names and how to convert them are worked out once for all the
+    states of a page instead of for each state. The dictionaries can be built from states or
+    from the rows of a values() query that only selects the fields that are returned.
+    """
+
+    def __init__(self, state_class, mappings, fields=None, extra_data_fields=None, exclude=None):
+        """
+        :param state_class: PropertyState or TaxLotState
+        :param mappings: dict, mapping names { "from_name": "to_name", ...}
+        :param fields: list, names of the fields to include, all fields if None
+        :param extra_data_fields: list, extra data fields to include. Use the original column names
+            (the ones in the database)
+        :param exclude: list, names of the fields to exclude
+        """
+        opts = state_class._meta
+        self.fields = []
+        for f in chain(opts.concrete_fields, opts.private_fields):
+            if not getattr(f, 'editable', False):
+                continue
+            if fields is not None and f.name not in fields:
+                continue
+            if exclude and f.name in exclude:
+                continue
+            if f.name in Column.EXCLUDED_COLUMN_RETURN_FIELDS:
+                continue
+
+            # fix specific time stamps
+            if f.name in NAIVE_TIMESTAMP_FIELDS:
+                convert = to_naive_isoformat
+            elif isinstance(f, GeometryField):
+                convert = to_wkt
+            else:
+                convert = None
+
+            self.fields.append((f.attname, mappings.get(f.name, f.name), convert))
+
+        self.extra_data_fields = [
+            (field, mappings.get(field, field), '_extra_data_{}'.format(i))
+            for i, field in enumerate(extra_data_fields or [])
+        ]
+
+    def values_fields(self, fields, prefix, extra_state_fields=None):
+        """
+        Return the names of the fields to select with values() to build the dictionaries with
+        row_to_dict.
+
+        :param fields: list, other fields to select
+        :param prefix: str, path to the state from the queried model, e.g. 'state__'
+        :param extra_state_fields: list, other fields of the state to select
+        :return: list
+        """
+        values_fields = list(fields)
+        values_fields += [prefix + attname for attname, _, _ in self.fields]
+        values_fields += [prefix + field for field in extra_state_fields or []]
+        values_fields += [alias for _, _, alias in self.extra_data_fields]
+        # remove duplicates, keeping the order
+        return list(OrderedDict.fromkeys(values_fields))
+
+    def extra_data_annotations(self, extra_data_path):
+        """
+        Return the annotations that select only the returned keys of the extra data.
+
+        :param extra_data_path: str, path to the extra_data of the state, e.g. 'state__extra_data'
+        :return: dict
+        """
+        return {alias: JSONKey(extra_data_path, field) for field, _, alias in self.extra_data_fields}
+
+    def row_to_dict(self, row, prefix):
+        """
+        Return the dictionary of a state from a row of a values() query that selected the
+        values_fields and extra_data_annotations.
+
+        :param row: dict
+        :param prefix: str, path to the state from the queried model, e.g. 'state__'
+        :return: dict
+        """
+        data = {}
+        for attname, name, convert in self.fields:
+            value = row[prefix + attname]
+            data[name] = convert(value) if convert else value
+
+        for _, name, alias in self.extra_data_fields:
+            data[name] = row[alias]
+
+        return data
+
+    def state_to_dict(self, state):
+        """
+        Return the dictionary of a state.
+
+        :param state: PropertyState or TaxLotState
+        :return: dict
+        """
+        data = {}
+        for attname, name, convert in self.fields:
+            value = getattr(state, attname)
+            data[name] = convert(value) if convert else value
+
+        extra_data = state.extra_data
+        for field, name, _ in self.extra_data_fields:
+            data[name] = extra_data.get(field, None)
+
+        return data
+
 
 class TaxLotProperty(models.Model):
     property_view = models.ForeignKey('PropertyView', on_delete=models.CASCADE)
@@ -114,6 +249,24 @@ class TaxLotProperty(models.Model):
                 data[f.name] = list(data[f.name])
         return data
 
+    @staticmethod
+    def jurisdiction_tax_lot_ids_by_property_view(property_view_ids):
+        """
+        Return the jurisdiction tax lot ids of the tax lots that are related to each of the
+        property views. Only the TaxLotProperty rows of the given property views are read.
+
+        :param property_view_ids: list, ids of PropertyViews
+        :return: defaultdict, {property_view_id: [jurisdiction_tax_lot_id, ...]}, which defaults to
+            an empty list
+        """
+        prop_to_jurisdiction_tl = defaultdict(list)
+        for property_view_id, jurisdiction_tax_lot_id in TaxLotProperty.objects.filter(
+            property_view_id__in=property_view_ids
+        ).values_list('property_view_id', 'taxlot_view__state__jurisdiction_tax_lot_id'):
+            prop_to_jurisdiction_tl[property_view_id].append(jurisdiction_tax_lot_id)
+
+        return prop_to_jurisdiction_tl
+
     @classmethod
     def get_related(cls, object_list, show_columns, columns_from_database):
         """
@@ -160,6 +313,8 @@ class TaxLotProperty(models.Model):
                 'related_view_class': apps.get_model('seed', 'TaxLotView'),
                 'related_view_id': 'taxlot_view_id',
                 'related_state_id': 'taxlot_state_id',
+                'state_class': apps.get_model('seed', 'PropertyState'),
+                'related_state_class': apps.get_model('seed', 'TaxLotState'),
             }
         else:
             lookups = {
@@ -181,6 +336,8 @@ class TaxLotProperty(models.Model):
                 'related_view_class': apps.get_model('seed', 'PropertyView'),
                 'related_view_id': 'property_view_id',
                 'related_state_id': 'property_state_id',
+                'state_class': apps.get_model('seed', 'TaxLotState'),
+                'related_state_class': apps.get_model('seed', 'PropertyState'),
             }
 
         # Ids of views to look up in m2m
@@ -190,10 +347,6 @@ class TaxLotProperty(models.Model):
         # Get all ids of related views on these joins
         related_ids = [getattr(j, lookups['related_view_id']) for j in joins]
 
-        # Get all related views from the related_class
-        related_views = apps.get_model('seed', lookups['related_class']).objects.select_related(
-            lookups['select_related'], 'state', 'cycle').filter(pk__in=related_ids)
-
         # bunch of work to get only the column names that are requested in the show_columns field
         related_columns = []
         related_column_name_mapping = {}
@@ -217,70 +370,78 @@ class TaxLotProperty(models.Model):
             filtered_extra_data_fields = set([col['column_name'] for col in related_columns if col['is_extra_data']
                                               and col['id'] in show_columns])
 
+        related_builder = StateDictBuilder(
+            lookups['related_state_class'],
+            related_column_name_mapping,
+            fields=filtered_fields,
+            # Only add extra data columns if a settings profile was used
+            extra_data_fields=filtered_extra_data_fields if show_columns is not None else None,
+            exclude=['extra_data']
+        )
+
+        # Get the related views with only the requested fields of their states
+        canonical = lookups['select_related']
+        canonical_fields = [canonical + '_id', canonical + '__created', canonical + '__updated']
+        if canonical == 'property':
+            canonical_fields.append('property__campus')
+        related_views = apps.get_model('seed', lookups['related_class']).objects.filter(
+            pk__in=related_ids
+        ).annotate(
+            **related_builder.extra_data_annotations('state__extra_data')
+        ).values(*related_builder.values_fields(
+            ['id', 'state_id'] + canonical_fields,
+            'state__',
+            ['bounding_box', 'long_lat', 'centroid']
+        ))
+
+        analysis_state_choices = dict(
+            apps.get_model('seed', 'PropertyState')._meta.get_field('analysis_state').flatchoices
+        )
+
         for related_view in related_views:
-            related_dict = TaxLotProperty.model_to_dict_with_mapping(
-                related_view.state,
-                related_column_name_mapping,
-                fields=filtered_fields,
-                exclude=['extra_data']
-            )
+            related_dict = related_builder.row_to_dict(related_view, 'state__')
 
-            related_dict[lookups['related_state_id']] = related_view.state.id
+            related_dict[lookups['related_state_id']] = related_view['state_id']
 
             # Add GIS stuff to the related dict
             # (I guess these are special fields not in columns and not directly JSON serializable...)
-            related_dict[lookups['bounding_box']] = bounding_box_wkt(related_view.state)
-            related_dict[lookups['long_lat']] = long_lat_wkt(related_view.state)
-            related_dict[lookups['centroid']] = centroid_wkt(related_view.state)
+            related_dict[lookups['bounding_box']] = to_wkt(related_view['state__bounding_box'])
+            related_dict[lookups['long_lat']] = to_wkt(related_view['state__long_lat'])
+            related_dict[lookups['centroid']] = to_wkt(related_view['state__centroid'])
 
             # custom handling for when it is TaxLotView
             if lookups['obj_class'] == 'TaxLotView':
                 if 'campus' in filtered_fields:
-                    related_dict[related_column_name_mapping['campus']] = related_view.property.campus
+                    related_dict[related_column_name_mapping['campus']] = related_view['property__campus']
                 # Do not make these timestamps naive. They persist correctly.
                 if 'updated' in filtered_fields:
-                    related_dict[related_column_name_mapping['updated']] = related_view.property.updated
+                    related_dict[related_column_name_mapping['updated']] = related_view['property__updated']
                 if 'created' in filtered_fields:
-                    related_dict[related_column_name_mapping['created']] = related_view.property.created
+                    related_dict[related_column_name_mapping['created']] = related_view['property__created']
                 # Replace the enumerations
                 if 'analysis_state' in filtered_fields:
-                    related_dict[
-                        related_column_name_mapping['analysis_state']] = related_view.state.get_analysis_state_display()
+                    analysis_state = related_view['state__analysis_state']
+                    related_dict[related_column_name_mapping['analysis_state']] = analysis_state_choices.get(
+                        analysis_state, analysis_state)
             elif lookups['obj_class'] == 'PropertyView':
                 # Do not make these timestamps naive. They persist correctly.
                 if 'updated' in filtered_fields:
-                    related_dict[related_column_name_mapping['updated']] = related_view.taxlot.updated
+                    related_dict[related_column_name_mapping['updated']] = related_view['taxlot__updated']
                 if 'created' in filtered_fields:
-                    related_dict[related_column_name_mapping['created']] = related_view.taxlot.created
+                    related_dict[related_column_name_mapping['created']] = related_view['taxlot__created']
 
-            # Only add extra data columns if a settings profile was used
-            if show_columns is not None:
-                related_dict.update(
-                    TaxLotProperty.extra_data_to_dict_with_mapping(
-                        related_view.state.extra_data,
-                        related_column_name_mapping,
-                        fields=filtered_extra_data_fields
-                    ).items()
-                )
-            related_map[related_view.pk] = related_dict
+            related_map[related_view['id']] = related_dict
 
             # Replace taxlot_view id with taxlot id
-            related_map[related_view.pk]['id'] = getattr(related_view, lookups['select_related']).id
+            related_map[related_view['id']]['id'] = related_view[canonical + '_id']
 
         # Not sure what this code is really doing, but it only exists for TaxLotViews
         if lookups['obj_class'] == 'TaxLotView':
-            # Get whole taxlotstate table:
-            tuple_prop_to_jurisdiction_tl = tuple(
-                TaxLotProperty.objects.values_list('property_view_id', 'taxlot_view__state__jurisdiction_tax_lot_id')
+            # Get the tax lot ids of the properties that are related to the page
+            prop_to_jurisdiction_tl = TaxLotProperty.jurisdiction_tax_lot_ids_by_property_view(
+                [join.property_view_id for join in joins]
             )
 
-            # create a mapping that defaults to an empty list
-            prop_to_jurisdiction_tl = defaultdict(list)
-
-            # populate the mapping
-            for name, pth in tuple_prop_to_jurisdiction_tl:
-                prop_to_jurisdiction_tl[name].append(pth)
-
         join_note_counts = {x[0]: x[1] for x in Note.objects.filter(**{lookups['related_query_in']: related_ids})
                             .values_list(lookups['related_view_id']).order_by().annotate(Count(lookups['related_view_id']))}
 
@@ -348,24 +509,18 @@ class TaxLotProperty(models.Model):
             state_id__in=models.Subquery(states_qs.values('state_id'))
         ).values_list('state_id', flat=True)
 
+        obj_builder = StateDictBuilder(
+            lookups['state_class'],
+            obj_column_name_mapping,
+            fields=filtered_fields,
+            # Only add extra data columns if a settings profile was used
+            extra_data_fields=filtered_extra_data_fields if show_columns is not None else None,
+            exclude=['extra_data']
+        )
+
         for obj in object_list:
             # Each object in the response is built from the state data, with related data added on.
-            obj_dict = TaxLotProperty.model_to_dict_with_mapping(
-                obj.state,
-                obj_column_name_mapping,
-                fields=filtered_fields,
-                exclude=['extra_data']
-            )
-
-            # Only add extra data columns if a settings profile was used
-            if show_columns is not None:
-                obj_dict.update(
-                    TaxLotProperty.extra_data_to_dict_with_mapping(
-                        obj.state.extra_data,
-                        obj_column_name_mapping,
-                        fields=filtered_extra_data_fields
-                    ).items()
-                )
+            obj_dict = obj_builder.state_to_dict(obj.state)
 
             # Use property_id instead of default (state_id)
             obj_dict['id'] = getattr(obj, lookups['obj_id'])
@@ -377,13 +532,13 @@ class TaxLotProperty(models.Model):
             obj_dict['merged_indicator'] = obj.state_id in merged_state_ids
 
             # bring in GIS data
-            obj_dict[lookups['bounding_box']] = bounding_box_wkt(obj.state)
-            obj_dict[lookups['long_lat']] = long_lat_wkt(obj.state)
+            obj_dict[lookups['bounding_box']] = to_wkt(obj.state.bounding_box)
+            obj_dict[lookups['long_lat']] = to_wkt(obj.state.long_lat)
 
             # store the property / taxlot data to the object dictionary as well. This is hacky.
             if lookups['obj_class'] == 'PropertyView':
                 # bring in property-specific GIS data
-                obj_dict[lookups['centroid']] = centroid_wkt(obj.state)
+                obj_dict[lookups['centroid']] = to_wkt(obj.state.centroid)
 
                 if 'campus' in filtered_fields:
                     obj_dict[obj_column_name_mapping['campus']] = obj.property.campus
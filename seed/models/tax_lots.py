@@ -14,7 +14,7 @@ from os import path
 from django.contrib.gis.db import models as geomodels
 from django.contrib.postgres.fields import JSONField
 from django.db import models
-from django.db.models.signals import post_save, pre_save, m2m_changed
+from django.db.models.signals import post_delete, post_save, pre_save, m2m_changed
 from django.dispatch import receiver
 
 from seed.data_importer.models import ImportFile
@@ -29,12 +29,16 @@ from seed.models import (
     MERGE_STATE,
     MERGE_STATE_UNKNOWN,
 )
+from seed.models.state_querysets import StateQuerySet
+from seed.models.tracked_fields import TrackedGeocodingFieldsMixin
 from seed.utils.address import normalize_address_str
 from seed.utils.generic import (
     compare_orgs_between_label_and_target,
     split_model_fields,
     obj_to_dict,
 )
+from seed.utils.hashing import hash_state_object
+from seed.utils.pagination import invalidate_inventory_count
 from seed.utils.time import convert_to_js_timestamp
 from .auditlog import AUDIT_IMPORT
 from .auditlog import DATA_UPDATE_TYPE
@@ -55,7 +59,7 @@ class TaxLot(models.Model):
         return 'TaxLot - %s' % self.pk
 
 
-class TaxLotState(models.Model):
+class TaxLotState(TrackedGeocodingFieldsMixin, models.Model):
     # The state field names should match pretty close to the pdf, just
     # because these are the most 'public' fields in terms of
     # communicating with the cities.
@@ -102,6 +106,8 @@ class TaxLotState(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    objects = StateQuerySet.as_manager()
+
     class Meta:
         index_together = [
             ['hash_object'],
@@ -194,7 +200,6 @@ class TaxLotState(models.Model):
             self.normalized_address = None
 
         # save a hash of the object to the database for quick lookup
-        from seed.data_importer.tasks import hash_state_object
         self.hash_object = hash_state_object(self)
         return super().save(*args, **kwargs)
 
@@ -456,6 +461,17 @@ def post_save_taxlot_view(sender, **kwargs):
         kwargs['instance'].taxlot.save()
 
 
+@receiver(post_save, sender=TaxLotView)
+@receiver(post_delete, sender=TaxLotView)
+def invalidate_taxlot_view_count(sender, instance, **kwargs):
+    """
+    When a TaxLotView is created or deleted, invalidate the cached count of the views of its cycle
+    """
+    # post_delete does not send created
+    if kwargs.get('created', True):
+        invalidate_inventory_count(instance.cycle_id)
+
+
 class TaxLotAuditLog(models.Model):
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
     parent1 = models.ForeignKey('TaxLotAuditLog', on_delete=models.CASCADE, blank=True, null=True,
@@ -489,24 +505,7 @@ class TaxLotAuditLog(models.Model):
 
 @receiver(pre_save, sender=TaxLotState)
 def sync_latitude_longitude_and_long_lat(sender, instance, **kwargs):
-    try:
-        original_obj = sender.objects.get(pk=instance.pk)
-    except sender.DoesNotExist:
-        pass  # Occurs on object creation
-    else:
-        # Sync Latitude, Longitude, and long_lat fields if applicable
-        latitude_change = original_obj.latitude != instance.latitude
-        longitude_change = original_obj.longitude != instance.longitude
-        long_lat_change = original_obj.long_lat != instance.long_lat
-        lat_and_long_both_populated = instance.latitude is not None and instance.longitude is not None
-
-        # The 'not long_lat_change' condition removes the case when long_lat is changed by an external API
-        if (latitude_change or longitude_change) and lat_and_long_both_populated and not long_lat_change:
-            instance.long_lat = f"POINT ({instance.longitude} {instance.latitude})"
-            instance.geocoding_confidence = "Manually geocoded (N/A)"
-        elif (latitude_change or longitude_change) and not lat_and_long_both_populated:
-            instance.long_lat = None
-            instance.geocoding_confidence = None
+    instance.sync_latitude_longitude_and_long_lat()
 
 
 m2m_changed.connect(compare_orgs_between_label_and_target, sender=TaxLotView.labels.through)
@@ -0,0 +1,87 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2020, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+
+GEOCODING_TRACKED_FIELDS = ('latitude', 'longitude', 'long_lat')
+
+
+class TrackedGeocodingFieldsMixin(object):
+    """
+    Mixin of the PropertyState and TaxLotState models that remembers the latitude, longitude and
+    long_lat of a state as they were loaded from, or last saved to, the database. This allows the
+    changes of these fields to be found on save without reading the state from the database again.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.track_geocoding_fields()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.track_geocoding_fields(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self.track_geocoding_fields(fields)
+
+    def track_geocoding_fields(self, fields=None):
+        """
+        Remember the current values of the tracked fields as the values in the database.
+
+        :param fields: list, optional names of the fields that were loaded or saved, defaults to all
+        :return: None
+        """
+        if not hasattr(self, '_original_geocoding_fields'):
+            self._original_geocoding_fields = {}
+
+        for field in GEOCODING_TRACKED_FIELDS:
+            # deferred fields are not in the __dict__ and are not tracked
+            if (fields is None or field in fields) and field in self.__dict__:
+                self._original_geocoding_fields[field] = self.__dict__[field]
+
+    def original_geocoding_fields(self):
+        """
+        Return the values of the tracked fields in the database. The database is only queried if
+        the values are not tracked, e.g. if the state was created with the primary key of an existing
+        state or if one of the fields was deferred.
+
+        :return: dict, or None if the state is not in the database
+        """
+        if self.pk is None:
+            return None
+
+        original = getattr(self, '_original_geocoding_fields', {})
+        if len(original) == len(GEOCODING_TRACKED_FIELDS):
+            return original
+
+        return self.__class__.objects.filter(pk=self.pk).values(*GEOCODING_TRACKED_FIELDS).first()
+
+    def sync_latitude_longitude_and_long_lat(self):
+        """
+        Sync the latitude, longitude and long_lat fields if the latitude or longitude were changed.
+        This is called before every save of a state. Code that writes states in bulk (which does
+        not call save) can call it on each state to opt in.
+
+        :return: None
+        """
+        original = self.original_geocoding_fields()
+        if original is None:
+            return  # Occurs on object creation
+
+        latitude_change = original['latitude'] != self.latitude
+        longitude_change = original['longitude'] != self.longitude
+        long_lat_change = original['long_lat'] != self.long_lat
+        lat_and_long_both_populated = self.latitude is not None and self.longitude is not None
+
+        # The 'not long_lat_change' condition removes the case when long_lat is changed by an external API
+        if (latitude_change or longitude_change) and lat_and_long_both_populated and not long_lat_change:
+            self.long_lat = f"POINT ({self.longitude} {self.latitude})"
+            self.geocoding_confidence = "Manually geocoded (N/A)"
+        elif (latitude_change or longitude_change) and not lat_and_long_both_populated:
+            self.long_lat = None
+            self.geocoding_confidence = None
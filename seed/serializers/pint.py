@@ -27,21 +27,28 @@ def get_dimensionality(quantity_object):
     return str(quantity_object.dimensionality)
 
 
-def collapse_unit(org, x):
+def get_pint_specs(org):
+    """Return the display units of the organization by dimensionality"""
+    return {
+        EUI_DIMENSIONALITY: org.display_units_eui or EUI_DEFAULT_UNITS,
+        AREA_DIMENSIONALITY: org.display_units_area or AREA_DEFAULT_UNITS
+    }
+
+
+def collapse_unit(org, x, pint_specs=None):
     """
     Collapse a Quantity object present down to a straight Float, per the
     preferences of the organization supplied (or the base units). Generally
     used to hide the fact of Quantities from Angular.
-    """
-    # make extensible / field name agnostic by just branching on the dimensionality
-    # and not the field name (eg. 'gross_floor_area') ... the dimensionality gets
-    # enforced separately by the django pint column type
-    pint_specs = {
-        EUI_DIMENSIONALITY: org.display_units_eui or EUI_DEFAULT_UNITS,
-        AREA_DIMENSIONALITY: org.display_units_area or AREA_DEFAULT_UNITS
-    }
 
+    :param pint_specs: dict, optional display units of the organization, see get_pint_specs
+    """
     if isinstance(x, ureg.Quantity):
+        # make extensible / field name agnostic by just branching on the dimensionality
+        # and not the field name (eg. 'gross_floor_area') ... the dimensionality gets
+        # enforced separately by the django pint column type
+        if pint_specs is None:
+            pint_specs = get_pint_specs(org)
         dimensionality = get_dimensionality(x)
         pint_spec = pint_specs[dimensionality]
         converted_value = x.to(pint_spec).magnitude
@@ -49,22 +56,35 @@ def collapse_unit(org, x):
     elif isinstance(x, list):
         # recurse out to collapse a dict for eg. the `related` key that
         # contains properties when the pt_dict is for a taxlot and vice-versa
-        return [apply_display_unit_preferences(org, y) for y in x]
+        return [apply_display_unit_preferences(org, y, pint_specs) for y in x]
     else:
         return x
 
 
-def apply_display_unit_preferences(org, pt_dict):
+def apply_display_unit_preferences(org, pt_dict, pint_specs=None):
     """
     take a dict of property/taxlot data just before it gets sent off across the
     API and collapse any Quantity objects present down to a straight float, per
     the organization preferences.
+
+    :param pint_specs: dict, optional display units of the organization, see get_pint_specs
     """
-    converted_dict = {k: collapse_unit(org, v) for k, v in pt_dict.items()}
+    if pint_specs is None:
+        pint_specs = get_pint_specs(org)
+    converted_dict = {k: collapse_unit(org, v, pint_specs) for k, v in pt_dict.items()}
 
     return converted_dict
 
 
+def apply_display_unit_preferences_to_list(org, pt_dicts):
+    """
+    Collapse the Quantity objects of a list of property/taxlot dicts in one pass, looking up the
+    display units of the organization only once.
+    """
+    pint_specs = get_pint_specs(org)
+    return [apply_display_unit_preferences(org, pt_dict, pint_specs) for pt_dict in pt_dicts]
+
+
 def pretty_units(quantity):
     """
     hack; can lose it when Pint gets something like a "{:~U}" format code
@@ -21,6 +21,7 @@ from seed.models import (
     ColumnMapping,
 
 )
+from seed.models.columns import get_column_metadata_cache_hit_rate
 from seed.test_helpers.fake import (
     FakePropertyStateFactory,
     FakeTaxLotStateFactory,
@@ -198,6 +199,48 @@ class TestColumns(TestCase):
         self.assertEqual(c.table_name, 'PropertyState')
         self.assertEqual(ps.extra_data['lab'], 'hawkins national laboratory')
 
+    def test_register_column_names(self):
+        new_columns = Column.register_column_names(
+            self.fake_org.id, 'TaxLotState', ['Ewok', 'Hattin', 'address_line_1']
+        )
+        self.assertCountEqual(
+            [(c.column_name, c.is_extra_data) for c in new_columns],
+            [('Ewok', True), ('Hattin', True)]
+        )
+
+        # the columns now exist, and are known from the cache without any queries
+        self.assertEqual(Column.register_column_names(self.fake_org.id, 'TaxLotState', ['Ewok']), [])
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                Column.register_column_names(self.fake_org.id, 'TaxLotState', ['Ewok', 'Hattin']), []
+            )
+
+        new_columns = Column.register_column_names(self.fake_org.id, 'TaxLotState', ['Ewok', 'Endor'])
+        self.assertEqual([c.column_name for c in new_columns], ['Endor'])
+        self.assertEqual(
+            Column.objects.filter(organization=self.fake_org, table_name='TaxLotState',
+                                  column_name__in=['Ewok', 'Hattin', 'Endor']).count(),
+            3
+        )
+
+    def test_column_metadata_is_cached_until_a_column_changes(self):
+        columns = Column.retrieve_all(self.fake_org.id, 'property', False)
+        hits = get_column_metadata_cache_hit_rate()['hits']
+
+        with self.assertNumQueries(0):
+            self.assertEqual(Column.retrieve_all(self.fake_org.id, 'property', False), columns)
+            Column.retrieve_priorities(self.fake_org.id)
+            Column.retrieve_priorities(self.fake_org.id)
+        self.assertEqual(get_column_metadata_cache_hit_rate()['hits'], hits + 3)
+
+        column = Column.objects.get(organization=self.fake_org, table_name='PropertyState',
+                                    column_name='pm_property_id')
+        column.display_name = 'Portfolio Manager ID'
+        column.save()
+
+        columns = Column.retrieve_all(self.fake_org.id, 'property', False)
+        self.assertIn('Portfolio Manager ID', [c['display_name'] for c in columns])
+
     def test_save_column_mapping_by_file_exception(self):
         self.mapping_import_file = os.path.abspath("./no-file.csv")
         with self.assertRaisesRegexp(Exception, "Mapping file does not exist: .*/no-file.csv"):
@@ -165,6 +165,32 @@ class DataQualityCheckTests(DataMappingBaseTestCase):
 
         self.assertCountEqual(['Check Site EUI', 'Check Year Built'], labels)
 
+    def test_check_data_applies_status_labels_to_all_views(self):
+        dq = DataQualityCheck.retrieve(self.org.id)
+
+        site_eui_label = StatusLabel.objects.create(name='Check Site EUI', super_organization=self.org)
+        site_eui_rule = dq.rules.get(table_name='PropertyState', field='site_eui', max='1000')
+        site_eui_rule.status_label = site_eui_label
+        site_eui_rule.save()
+
+        states = []
+        for site_eui in [525600, 525601, 50]:
+            ps = self.property_state_factory.get_property_state(
+                None, no_default_data=True, site_eui=site_eui
+            )
+            PropertyView.objects.create(
+                property=self.property_factory.get_property(), cycle=self.cycle, state=ps
+            )
+            states.append(ps)
+
+        # the view of the last state was labeled before, but no longer violates the rule
+        PropertyView.objects.get(state=states[2]).labels.add(site_eui_label)
+
+        dq.check_data('PropertyState', states)
+
+        labeled_states = PropertyView.objects.filter(labels=site_eui_label).values_list('state_id', flat=True)
+        self.assertCountEqual(labeled_states, [states[0].id, states[1].id])
+
     def test_text_match(self):
         dq = DataQualityCheck.retrieve(self.org.id)
         dq.remove_all_rules()
@@ -11,6 +11,7 @@ from django.urls import reverse
 from django.test import TestCase
 
 from seed.landing.models import SEEDUser as User
+from seed.models.data_quality import DataQualityCheck
 from seed.utils.organizations import create_organization
 
 
@@ -33,3 +34,35 @@ class DataQualityViewTests(TestCase):
         self.assertEqual(jdata['status'], 'success')
         self.assertEqual(len(jdata['rules']['taxlots']), 2)
         self.assertEqual(len(jdata['rules']['properties']), 20)
+
+    def test_results_are_merged_from_chunks_and_paginated(self):
+        cache_key, dq_id = DataQualityCheck.initialize_cache(chunk_count=2)
+        dq = DataQualityCheck.retrieve(self.org.id)
+        dq.results = {3: {'id': 3}, 1: {'id': 1}}
+        dq.save_to_cache(dq_id, 1)
+        dq.results = {2: {'id': 2}}
+        dq.save_to_cache(dq_id, 0)
+
+        url = reverse('api:v2:data_quality_checks-results')
+        response = self.client.get(url, {'organization_id': self.org.pk, 'data_quality_id': dq_id})
+        self.assertEqual(json.loads(response.content)['data'], [{'id': 1}, {'id': 2}, {'id': 3}])
+
+        response = self.client.get(url, {
+            'organization_id': self.org.pk, 'data_quality_id': dq_id, 'page': 2, 'per_page': 2
+        })
+        jdata = json.loads(response.content)
+        self.assertEqual(jdata['data'], [{'id': 3}])
+        self.assertEqual(jdata['pagination']['total'], 3)
+        self.assertFalse(jdata['pagination']['has_next'])
+
+        # per_page must be a positive integer
+        for per_page in ['a', 0, -1]:
+            response = self.client.get(url, {
+                'organization_id': self.org.pk, 'data_quality_id': dq_id, 'page': 1, 'per_page': per_page
+            })
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(json.loads(response.content)['status'], 'error')
+
+        # initializing the cache again removes the results of the chunks
+        DataQualityCheck.initialize_cache(dq_id)
+        self.assertEqual(DataQualityCheck.get_results(dq_id), [])
@@ -0,0 +1,48 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2020, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+import hashlib
+
+from django.contrib.gis.geos import GEOSGeometry
+from django.test import TestCase
+
+from seed.models import PropertyState, TaxLotState
+from seed.utils.hashing import StateHasher, hash_state_object
+
+
+class TestStateHasher(TestCase):
+
+    def test_hash(self):
+        hasher = StateHasher(['address_line_1', 'does_not_exist', 'site_eui'])
+        state = PropertyState(address_line_1='123 Main St', extra_data={'Nom': 'École', 'b': {'c': 1}})
+
+        expected = hashlib.md5(
+            b'address_line_1123 Main St' + b'does_not_existFOO' + b'site_euiNone' + b'NomEcole' + b'c1'
+        ).hexdigest()
+        self.assertEqual(hasher.hash(state), expected)
+
+        expected = hashlib.md5(
+            b'address_line_1123 Main St' + b'does_not_existFOO' + b'site_euiNone'
+        ).hexdigest()
+        self.assertEqual(hasher.hash(state, include_extra_data=False), expected)
+
+    def test_hash_geometry(self):
+        hasher = StateHasher(['taxlot_footprint'])
+        wkt = 'POLYGON ((0 0, 0 1, 1 1, 1 0, 0 0))'
+        state = TaxLotState(taxlot_footprint=GEOSGeometry(wkt, srid=4326), extra_data={})
+
+        expected = hashlib.md5(
+            b'taxlot_footprint' + GEOSGeometry(wkt).wkt.encode('utf-8')
+        ).hexdigest()
+        self.assertEqual(hasher.hash(state), expected)
+
+    def test_hash_state_object(self):
+        state_1 = PropertyState(address_line_1='123 Main St', extra_data={'a': 'b'})
+        state_2 = PropertyState(address_line_1='123 Main St', extra_data={'a': 'b'})
+        self.assertEqual(hash_state_object(state_1), hash_state_object(state_2))
+
+        state_2.extra_data['a'] = 'c'
+        self.assertNotEqual(hash_state_object(state_1), hash_state_object(state_2))
@@ -39,6 +39,7 @@ from seed.models import (
 )
 from seed.utils.match import (
     match_merge_link,
+    match_merge_link_views,
     whole_org_match_merge_link,
 )
 from seed.test_helpers.fake import (
@@ -825,6 +826,59 @@ class TestMatchMergeLink(DataMappingBaseTestCase):
             )
             self.assertCountEqual(view_ids, matching_view_ids)
 
+    def test_match_merge_link_views_links_all_given_views(self):
+        base_property_details = {
+            'data_state': DATA_STATE_MAPPING,
+            'no_default_data': False,
+        }
+        import_files = [self.import_file_1, self.import_file_2, self.import_file_3]
+        states = {}
+        for import_file in import_files:
+            base_property_details['import_file_id'] = import_file.id
+            for name in ['A', 'B']:
+                base_property_details['pm_property_id'] = 'Unmatched {} {}'.format(name, import_file.id)
+                states[(name, import_file.id)] = self.property_state_factory.get_property_state(
+                    **base_property_details
+                )
+
+            import_file.mapping_done = True
+            import_file.save()
+            match_buildings(import_file.id)
+
+        self.assertEqual(6, Property.objects.count())
+
+        # (Unrealistically) Make the 'A' properties of each Cycle match
+        PropertyState.objects.filter(
+            id__in=[states[('A', import_file.id)].id for import_file in import_files]
+        ).update(pm_property_id='A Match Set')
+
+        cycle_3_view_ids = list(
+            PropertyView.objects.filter(cycle_id=self.cycle_3.id).order_by('id').values_list('id', flat=True)
+        )
+        view_ids = match_merge_link_views(cycle_3_view_ids, 'PropertyState')
+
+        # No merges, so the -Views are returned as is
+        self.assertEqual(cycle_3_view_ids, view_ids)
+
+        # The 'A' -Views are linked and the others are not
+        a_views = PropertyView.objects.filter(state__pm_property_id='A Match Set')
+        self.assertEqual(3, a_views.count())
+        self.assertEqual(1, a_views.values('property_id').distinct().count())
+        self.assertEqual(
+            3,
+            PropertyView.objects.exclude(state__pm_property_id='A Match Set').values('property_id').distinct().count()
+        )
+
+        # When the Cycle 3 'A' -State no longer matches, its -View is disassociated
+        PropertyState.objects.filter(id=states[('A', self.import_file_3.id)].id).update(pm_property_id='Unmatched')
+        match_merge_link_views(cycle_3_view_ids, 'PropertyState')
+
+        self.assertEqual(2, a_views.count())
+        self.assertEqual(1, a_views.values('property_id').distinct().count())
+        cycle_3_a_view = PropertyView.objects.get(state_id=states[('A', self.import_file_3.id)].id)
+        self.assertFalse(PropertyView.objects.filter(property_id=cycle_3_a_view.property_id).exclude(
+            id=cycle_3_a_view.id).exists())
+
     def test_match_merge_link_for_taxlots(self):
         """
         In this context, a "set" includes a -State, -View, and canonical record.
@@ -5,6 +5,8 @@ import ast
 import os
 import json
 
+import mock
+
 from config.settings.common import TIME_ZONE
 
 from datetime import datetime
@@ -26,6 +28,8 @@ from seed.lib.superperms.orgs.models import Organization
 from seed.models import (
     Meter,
     MeterReading,
+    MeterReadingAggregate,
+    Property,
     PropertyState,
     PropertyView,
 )
@@ -613,6 +617,93 @@ class TestMeterViewSet(DataMappingBaseTestCase):
 
         self.assertCountEqual(result_dict['readings'], display_readings)
 
+    def test_meter_reading_aggregates_are_refreshed_on_import_and_removed_when_a_reading_is_saved(self):
+        save_raw_data(self.import_file.id)
+
+        meter = Meter.objects.get(property_id=self.property_1.id, type=Meter.NATURAL_GAS)
+        monthly_totals = list(
+            meter.reading_aggregates.filter(interval=MeterReadingAggregate.MONTH).order_by('start_time').values_list('total', flat=True)
+        )
+        self.assertEqual(monthly_totals, [576000.2, 488000.1])
+        yearly_totals = list(
+            meter.reading_aggregates.filter(interval=MeterReadingAggregate.YEAR).values_list('total', flat=True)
+        )
+        self.assertEqual(yearly_totals, [576000.2 + 488000.1])
+
+        tz_obj = timezone(TIME_ZONE)
+        MeterReading.objects.create(
+            meter=meter,
+            start_time=make_aware(datetime(2016, 3, 1, 0, 0, 0), timezone=tz_obj),
+            end_time=make_aware(datetime(2016, 4, 1, 0, 0, 0), timezone=tz_obj),
+            reading=100,
+            source_unit='kBtu (thousand Btu)',
+            conversion_factor=1
+        )
+        self.assertFalse(meter.reading_aggregates.exists())
+
+        aggregates = MeterReadingAggregate.refresh([meter.id])
+        self.assertEqual(
+            [a.total for a in aggregates if a.interval == MeterReadingAggregate.MONTH],
+            [576000.2, 488000.1, 100]
+        )
+
+    def test_meter_usage_does_not_refresh_the_aggregates_of_meters_without_readings(self):
+        save_raw_data(self.import_file.id)
+        Meter.objects.create(
+            property=self.property_1, type=Meter.WOOD, source=Meter.PORTFOLIO_MANAGER, source_id='789fakeID'
+        )
+
+        url = reverse('api:v2:meters-property-meter-usage')
+        post_params = json.dumps({
+            'property_view_id': self.property_view_1.id,
+            'interval': 'Month',
+            'excluded_meter_ids': [],
+        })
+        with mock.patch.object(MeterReadingAggregate, 'refresh') as refresh:
+            result = self.client.post(url, post_params, content_type="application/json")
+
+        self.assertEqual(result.status_code, 200)
+        refresh.assert_not_called()
+
+    def test_copy_meters_in_bulk_copies_meters_and_readings_or_reassigns_meters(self):
+        save_raw_data(self.import_file.id)
+
+        # give property_2's gas meter the same source ID as property_1's to overlap their readings
+        gas_meter_1 = Meter.objects.get(property_id=self.property_1.id, type=Meter.NATURAL_GAS)
+        gas_meter_2 = Meter.objects.get(property_id=self.property_2.id, type=Meter.NATURAL_GAS)
+        gas_meter_2.source_id = gas_meter_1.source_id
+        gas_meter_2.save()
+
+        target_1 = self.property_factory.get_property()
+        target_2 = self.property_factory.get_property()
+        Property.copy_meters_in_bulk([
+            (target_1.id, [self.property_1.id, self.property_2.id]),
+            (target_2.id, [self.property_2.id]),
+        ])
+
+        # similar meters are combined and the readings of the last source take precedence
+        target_gas_meter = target_1.meters.get(type=Meter.NATURAL_GAS)
+        self.assertEqual(
+            list(target_gas_meter.meter_readings.order_by('start_time').values_list('reading', flat=True)),
+            list(gas_meter_2.meter_readings.order_by('start_time').values_list('reading', flat=True))
+        )
+        self.assertEqual(target_1.meters.count(), 3)
+        self.assertEqual(target_2.meters.count(), 2)
+        self.assertTrue(target_gas_meter.reading_aggregates.exists())
+
+        # the sources persist
+        self.assertEqual(self.property_1.meters.count(), 2)
+        self.assertEqual(self.property_2.meters.count(), 2)
+        self.assertEqual(gas_meter_1.meter_readings.count(), 2)
+
+        # if the source doesn't persist, its meters are reassigned
+        target_3 = self.property_factory.get_property()
+        meter_ids = set(self.property_1.meters.values_list('id', flat=True))
+        Property.copy_meters_in_bulk([(target_3.id, [self.property_1.id])], source_persists=False)
+
+        self.assertEqual(set(target_3.meters.values_list('id', flat=True)), meter_ids)
+        self.assertFalse(self.property_1.meters.exists())
+
     def test_property_meter_usage_can_return_monthly_meter_readings_and_column_defs_with_nondefault_display_setting(self):
         # Update settings for display meter units to change it from the default values.
         self.org.display_meter_units['Electric - Grid'] = 'kWh (thousand Watt-hours)'
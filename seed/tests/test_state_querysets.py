@@ -0,0 +1,89 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2020, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+from django.test import TestCase
+
+from seed.data_importer.tasks import hash_state_object
+from seed.landing.models import SEEDUser as User
+from seed.models import (
+    DATA_STATE_MATCHING,
+    Cycle,
+    PropertyState,
+    PropertyView,
+    TaxLotState,
+    TaxLotView,
+)
+from seed.utils.address import normalize_address_str
+from seed.utils.organizations import create_organization
+
+
+class TestStateQuerySet(TestCase):
+
+    def setUp(self):
+        user_details = {
+            'username': 'test_user@demo.com',
+            'password': 'test_pass',
+        }
+        self.user = User.objects.create_superuser(email='test_user@demo.com', **user_details)
+        self.org, _, _ = create_organization(self.user)
+
+    def test_bulk_create_states_matches_save(self):
+        bulk_states = [
+            PropertyState(organization=self.org, address_line_1='123 Main Street',
+                          extra_data={'a': 'b'}),
+            PropertyState(organization=self.org, address_line_1='123 Main Street'),
+            PropertyState(organization=self.org, extra_data={'c': 1}),
+        ]
+        PropertyState.objects.bulk_create_states(bulk_states)
+
+        for bulk_state in bulk_states:
+            self.assertIsNotNone(bulk_state.pk)
+
+            saved_state = PropertyState.objects.get(pk=bulk_state.pk)
+            if saved_state.address_line_1 is None:
+                self.assertIsNone(saved_state.normalized_address)
+            else:
+                self.assertEqual(saved_state.normalized_address,
+                                 normalize_address_str(saved_state.address_line_1))
+            self.assertEqual(saved_state.hash_object, hash_state_object(saved_state))
+
+            # saving the state through the model results in the same derived fields
+            hash_object = saved_state.hash_object
+            saved_state.save()
+            self.assertEqual(saved_state.hash_object, hash_object)
+
+    def test_bulk_create_tax_lot_states(self):
+        bulk_states = [
+            TaxLotState(organization=self.org, jurisdiction_tax_lot_id=str(i))
+            for i in range(5)
+        ]
+        TaxLotState.objects.bulk_create_states(bulk_states, batch_size=2)
+
+        self.assertEqual(TaxLotState.objects.filter(organization=self.org).count(), 5)
+        self.assertEqual(len(set(s.hash_object for s in bulk_states)), 5)
+
+    def test_promote(self):
+        cycle = Cycle.get_or_create_default(self.org)
+        states = [
+            PropertyState.objects.create(organization=self.org, address_line_1='{} Main Street'.format(i))
+            for i in range(3)
+        ]
+        existing_view = states[0].promote(cycle)
+
+        views = PropertyState.objects.filter(pk__in=[s.pk for s in states]).promote(cycle)
+
+        self.assertEqual(len(views), 3)
+        self.assertIn(existing_view, views)
+        self.assertEqual(PropertyView.objects.filter(cycle=cycle).count(), 3)
+        self.assertEqual(len(set(view.property_id for view in views)), 3)
+        for state in PropertyState.objects.filter(pk__in=[s.pk for s in states]):
+            self.assertEqual(state.data_state, DATA_STATE_MATCHING)
+
+        # promoting again does not create more views
+        TaxLotState.objects.create(organization=self.org).promote(cycle)
+        views = TaxLotState.objects.filter(organization=self.org).promote(cycle)
+        self.assertEqual(len(views), 1)
+        self.assertEqual(TaxLotView.objects.filter(cycle=cycle).count(), 1)
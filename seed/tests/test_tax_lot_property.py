@@ -6,11 +6,13 @@
 """
 import json
 
+import mock
 from django.urls import reverse_lazy
 
 from seed.landing.models import SEEDUser as User
 from seed.models import (
     Cycle,
+    PropertyState,
     PropertyView,
     TaxLotProperty,
     Column,
@@ -20,10 +22,13 @@ from seed.test_helpers.fake import (
     FakePropertyFactory,
     FakePropertyStateFactory,
     FakePropertyViewFactory,
-    FakeStatusLabelFactory
+    FakeStatusLabelFactory,
+    FakeTaxLotViewFactory,
 )
+from seed.models.tax_lot_properties import StateDictBuilder
 from seed.tests.util import DataMappingBaseTestCase
 from seed.utils.organizations import create_organization
+from seed.views.tax_lot_properties import TaxLotPropertyViewSet
 from xlrd import open_workbook
 
 
@@ -80,6 +85,47 @@ class TestTaxLotProperty(DataMappingBaseTestCase):
         self.assertEqual(len(data), 50)
         self.assertEqual(len(data[0]['related']), 0)
 
+    def test_jurisdiction_tax_lot_ids_by_property_view(self):
+        taxlot_view_factory = FakeTaxLotViewFactory(organization=self.org, user=self.user)
+        other_property_view = self.property_view_factory.get_property_view()
+        for property_view, tax_lot_id in [(self.property_view, '1'), (self.property_view, '2'),
+                                          (other_property_view, '3')]:
+            taxlot_view = taxlot_view_factory.get_taxlot_view(
+                cycle=property_view.cycle, jurisdiction_tax_lot_id=tax_lot_id
+            )
+            TaxLotProperty.objects.create(
+                property_view=property_view, taxlot_view=taxlot_view, cycle=property_view.cycle
+            )
+
+        result = TaxLotProperty.jurisdiction_tax_lot_ids_by_property_view([self.property_view.id])
+        self.assertEqual(list(result), [self.property_view.id])
+        self.assertCountEqual(result[self.property_view.id], ['1', '2'])
+        self.assertEqual(result[other_property_view.id], [])
+
+    def test_state_dict_builder(self):
+        state = self.property_view.state
+        state.extra_data = {'Extra 1': 'a', 'Extra 2': 'b'}
+        state.save()
+        mappings = {'address_line_1': 'address_line_1_1', 'Extra 1': 'Extra 1_2'}
+        fields = ['address_line_1', 'recent_sale_date', 'site_eui', 'long_lat']
+        extra_data_fields = ['Extra 1', 'Missing']
+
+        expected = TaxLotProperty.model_to_dict_with_mapping(
+            state, mappings, fields=fields, exclude=['extra_data']
+        )
+        expected.update(TaxLotProperty.extra_data_to_dict_with_mapping(
+            state.extra_data, mappings, fields=extra_data_fields
+        ))
+
+        builder = StateDictBuilder(PropertyState, mappings, fields=fields,
+                                   extra_data_fields=extra_data_fields, exclude=['extra_data'])
+        self.assertEqual(builder.state_to_dict(state), expected)
+
+        row = PropertyView.objects.filter(pk=self.property_view.pk).annotate(
+            **builder.extra_data_annotations('state__extra_data')
+        ).values(*builder.values_fields(['id'], 'state__')).get()
+        self.assertEqual(builder.row_to_dict(row, 'state__'), expected)
+
     def test_csv_export(self):
         """Test to make sure get_related returns the fields"""
         for i in range(50):
@@ -103,7 +149,7 @@ class TestTaxLotProperty(DataMappingBaseTestCase):
         )
 
         # parse the content as array
-        data = response.content.decode('utf-8').split('\n')
+        data = b''.join(response.streaming_content).decode('utf-8').split('\n')
 
         self.assertTrue('Address Line 1' in data[0].split(','))
         self.assertTrue('Property Labels\r' in data[0].split(','))
@@ -112,6 +158,29 @@ class TestTaxLotProperty(DataMappingBaseTestCase):
         # last row should be blank
         self.assertEqual(data[52], '')
 
+    def test_csv_export_in_order_of_ids_across_chunks(self):
+        property_views = [self.property_view_factory.get_property_view() for i in range(5)]
+        ids = [property_view.property_id for property_view in reversed(property_views)]
+
+        # call the API
+        url = reverse_lazy('api:v2.1:tax_lot_properties-export')
+        with mock.patch.object(TaxLotPropertyViewSet, 'EXPORT_CHUNK_SIZE', 2):
+            response = self.client.post(
+                url + '?{}={}&{}={}&{}={}'.format(
+                    'organization_id', self.org.pk,
+                    'cycle_id', self.cycle,
+                    'inventory_type', 'properties'
+                ),
+                data=json.dumps({'columns': [], 'ids': ids, 'export_type': 'csv'}),
+                content_type='application/json'
+            )
+
+        # parse the content as array
+        data = b''.join(response.streaming_content).decode('utf-8').split('\r\n')
+
+        self.assertEqual(len(data), 7)
+        self.assertEqual([int(row.split(',')[0]) for row in data[1:6]], ids)
+
     def test_csv_export_with_notes(self):
         multi_line_note = self.property_view.notes.create(name='Manually Created', note_type=Note.NOTE, text='multi\nline\nnote')
         single_line_note = self.property_view.notes.create(name='Manually Created', note_type=Note.NOTE, text='single line')
@@ -135,7 +204,7 @@ class TestTaxLotProperty(DataMappingBaseTestCase):
         )
 
         # parse the content as array
-        data = response.content.decode('utf-8').split('\r\n')
+        data = b''.join(response.streaming_content).decode('utf-8').split('\r\n')
         notes_string = (
             multi_line_note.created.astimezone().strftime("%Y-%m-%d %I:%M:%S %p") + "\n" +
             multi_line_note.text +
@@ -171,7 +240,7 @@ class TestTaxLotProperty(DataMappingBaseTestCase):
         )
 
         # parse the content as array
-        wb = open_workbook(file_contents=response.content)
+        wb = open_workbook(file_contents=b''.join(response.streaming_content))
 
         data = [row.value for row in wb.sheet_by_index(0).row(0)]
 
@@ -203,7 +272,7 @@ class TestTaxLotProperty(DataMappingBaseTestCase):
         )
 
         # parse the content as dictionary
-        data = json.loads(response.content)
+        data = json.loads(b''.join(response.streaming_content).decode('utf-8'))
 
         first_level_keys = list(data.keys())
 
@@ -699,3 +699,26 @@ class GeocodeAddresses(TestCase):
         self.assertIsNone(refreshed_property.latitude)
         self.assertIsNone(long_lat_wkt(refreshed_property))
         self.assertIsNone(refreshed_property.geocoding_confidence)
+
+    def test_geocoded_fields_are_synced_without_reading_the_state_again(self):
+        property_details = self.property_state_factory.get_details()
+        property_details['organization_id'] = self.org.id
+        property = PropertyState(**property_details)
+        property.save()
+
+        refreshed_property = PropertyState.objects.get(pk=property.id)
+        refreshed_property.latitude = 39.765251
+        refreshed_property.longitude = -104.986138
+
+        # only the update of the state is run
+        with self.assertNumQueries(1):
+            refreshed_property.save()
+
+        self.assertEqual('POINT (-104.986138 39.765251)', long_lat_wkt(PropertyState.objects.get(pk=property.id)))
+
+        # the values that were saved are tracked, so changing them again is synced as well
+        refreshed_property.latitude = None
+        with self.assertNumQueries(1):
+            refreshed_property.save()
+
+        self.assertIsNone(long_lat_wkt(PropertyState.objects.get(pk=property.id)))
@@ -834,6 +834,68 @@ class InventoryViewTests(DeleteModelsTestCase):
         self.assertEquals(pagination['has_previous'], False)
         self.assertEquals(pagination['total'], 0)
 
+    def test_get_properties_with_cursor(self):
+        views = []
+        for i in range(3):
+            views.append(PropertyView.objects.create(
+                property=self.property_factory.get_property(), cycle=self.cycle,
+                state=self.property_state_factory.get_property_state()
+            ))
+
+        filter_properties_url = '/api/v2/properties/filter/?{}={}&{}={}&{}={}&{}={}'
+        response = self.client.post(filter_properties_url.format(
+            'organization_id', self.org.pk,
+            'cycle', self.cycle.pk,
+            'per_page', 2,
+            'cursor', ''
+        ), data={'profile_id': None})
+        result = response.json()
+        self.assertEqual(len(result['results']), 2)
+        pagination = result['pagination']
+        self.assertEqual(pagination['next_cursor'], views[1].id)
+        self.assertTrue(pagination['has_next'])
+        self.assertEqual(pagination['total'], 3)
+
+        response = self.client.post(filter_properties_url.format(
+            'organization_id', self.org.pk,
+            'cycle', self.cycle.pk,
+            'per_page', 2,
+            'cursor', pagination['next_cursor']
+        ), data={'profile_id': None})
+        result = response.json()
+        self.assertEqual(len(result['results']), 1)
+        self.assertEqual(result['results'][0]['property_view_id'], views[2].id)
+        pagination = result['pagination']
+        self.assertIsNone(pagination['next_cursor'])
+        self.assertFalse(pagination['has_next'])
+
+        response = self.client.post(filter_properties_url.format(
+            'organization_id', self.org.pk,
+            'cycle', self.cycle.pk,
+            'per_page', 2,
+            'cursor', 'one'
+        ), data={'profile_id': None})
+        self.assertEqual(response.status_code, 400)
+
+        # per_page must be a positive integer
+        for per_page in [0, -1]:
+            response = self.client.post(filter_properties_url.format(
+                'organization_id', self.org.pk,
+                'cycle', self.cycle.pk,
+                'per_page', per_page,
+                'cursor', views[0].id
+            ), data={'profile_id': None})
+            self.assertEqual(response.status_code, 400)
+
+        # the cached count is invalidated when a view is deleted
+        views[0].delete()
+        response = self.client.post('/api/v2/properties/filter/?{}={}&{}={}&{}={}'.format(
+            'organization_id', self.org.pk,
+            'cycle', self.cycle.pk,
+            'per_page', 2
+        ), data={'profile_id': None})
+        self.assertEqual(response.json()['pagination']['total'], 2)
+
     def test_get_property(self):
         property_state = self.property_state_factory.get_property_state()
         property_property = self.property_factory.get_property()
@@ -4,6 +4,8 @@
 :copyright (c) 2014 - 2020, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
 :author
 """
+from uuid import uuid4
+
 from django.core.cache import cache as django_cache
 from django.core.cache.backends.base import DEFAULT_TIMEOUT
 
@@ -20,6 +22,32 @@ def get_cache_raw(key, default=None):
     return django_cache.get(key, default)
 
 
+def get_cache_raw_many(keys):
+    """Return a dict of the keys that are in the cache and their values, in a single read"""
+    return django_cache.get_many(keys)
+
+
+def get_cache_version(key):
+    """
+    Return the version stored in the cache key, creating one if it does not exist. Versions
+    are random tokens, not counters, so data tagged with a version from before the key was
+    evicted from the cache will never match the new version.
+    """
+    version = get_cache_raw(key)
+    if version is None:
+        # add does not overwrite a version that was created concurrently
+        django_cache.add(key, uuid4().hex, None)
+        version = get_cache_raw(key)
+    return version
+
+
+def increment_cache_version(key):
+    """Replace the version stored in the cache key, which invalidates the data tagged with it"""
+    version = uuid4().hex
+    set_cache_raw(key, version, None)
+    return version
+
+
 def set_cache(progress_key, status, data):
     """
     Sets the cache key to a pickled dictionary containing at least status and progress.
@@ -79,6 +107,11 @@ def delete_cache(progress_key):
     django_cache.delete(progress_key)
 
 
+def delete_cache_many(keys):
+    """Delete the cache associated with each of the keys"""
+    django_cache.delete_many(keys)
+
+
 def lock_cache(progress_key, timeout=60):
     """Set the lock with a default timeout of 1 minute"""
     set_cache_raw(progress_key, 1, timeout)
@@ -0,0 +1,109 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2020, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+import hashlib
+from datetime import datetime
+
+from django.contrib.gis.geos import GEOSGeometry
+from django.utils import timezone as tz
+from django.utils.timezone import make_naive
+from unidecode import unidecode
+
+
+def _to_ascii(value):
+    """Return the value transliterated to ASCII, without calling unidecode if it already is"""
+    try:
+        value.encode('ascii')
+        return value
+    except UnicodeEncodeError:
+        return unidecode(value)
+
+
+class StateHasher(object):
+    """
+    Hash of the PropertyState and TaxLotState objects, which is used to quickly find states
+    with the same data.
+
+    The names of the fields that are part of the hash only depend on the models, so they are
+    looked up and encoded once when the hasher is created instead of on every hash. The
+    digest is still MD5 so that the hashes are the same as the hash_object of the states that
+    are already in the database.
+    """
+
+    def __init__(self, fields=None):
+        """
+        :param fields: list, names of the fields to hash. Defaults to the fields of the states
+            that are used for the hash comparison.
+        """
+        if fields is None:
+            from seed.models import Column
+            fields = Column.retrieve_db_field_name_for_hash_comparison()
+
+        self.fields = [(field, field.encode('utf-8')) for field in fields]
+
+    def hash(self, obj, include_extra_data=True):
+        """
+        Return the hash of the state.
+
+        :param obj: PropertyState or TaxLotState, saved or not
+        :param include_extra_data: bool, add the extra_data of the state to the hash
+        :return: str, hex digest of the hash
+        """
+        parts = []
+        for field, encoded_field in self.fields:
+            # Return a random value for missing fields so we can distinguish between this and None.
+            obj_val = getattr(obj, field, 'FOO')
+            parts.append(encoded_field)
+            if isinstance(obj_val, datetime):
+                # if this is a datetime, then make sure to save the string as a naive datetime.
+                # Somehow, somewhere the data are being saved in mapping with a timezone,
+                # then in matching they are removed (but the time is updated correctly)
+                parts.append(make_naive(obj_val).astimezone(tz.utc).isoformat().encode('utf-8'))
+            elif isinstance(obj_val, GEOSGeometry):
+                # the WKT does not depend on the SRID, so the geometry does not need to be copied
+                parts.append(obj_val.wkt.encode('utf-8'))
+            else:
+                parts.append(str(obj_val).encode('utf-8'))
+
+        if include_extra_data:
+            self._add_dictionary_parts(parts, obj.extra_data)
+
+        return hashlib.md5(b''.join(parts)).hexdigest()
+
+    def _add_dictionary_parts(self, parts, dict_obj):
+        assert isinstance(dict_obj, dict)
+
+        for key, value in sorted(dict_obj.items(), key=lambda x_y: x_y[0]):
+            if isinstance(value, dict):
+                self._add_dictionary_parts(parts, value)
+            else:
+                parts.append(_to_ascii(str(key)).encode('utf-8'))
+                if isinstance(value, str):
+                    parts.append(_to_ascii(value).encode('utf-8'))
+                else:
+                    parts.append(str(value).encode('utf-8'))
+
+
+_state_hasher = None
+
+
+def get_state_hasher():
+    """Return the StateHasher of the state fields, creating it on first use"""
+    global _state_hasher
+    if _state_hasher is None:
+        _state_hasher = StateHasher()
+    return _state_hasher
+
+
+def hash_state_object(obj, include_extra_data=True):
+    """
+    Return the hash of a PropertyState or TaxLotState.
+
+    :param obj: PropertyState or TaxLotState
+    :param include_extra_data: bool, add the extra_data of the state to the hash
+    :return: str, hex digest of the hash
+    """
+    return get_state_hasher().hash(obj, include_extra_data)
@@ -9,12 +9,13 @@ from celery import shared_task
 
 from django.contrib.postgres.aggregates.general import ArrayAgg
 from django.db import transaction
-from django.db.models import Subquery
+from django.db.models import Case, IntegerField, Q, Subquery, Value, When
 from django.db.models.aggregates import Count
 
 from seed.models import (
     Column,
     Cycle,
+    Meter,
     Property,
     PropertyState,
     PropertyView,
@@ -22,6 +23,7 @@ from seed.models import (
     TaxLotState,
     TaxLotView,
 )
+from seed.models.columns import get_cached_column_metadata
 from seed.utils.merge import merge_states_with_views
 from seed.utils.properties import properties_across_cycles
 from seed.utils.taxlots import taxlots_across_cycles
@@ -56,15 +58,18 @@ def matching_criteria_column_names(organization_id, table_name):
     case where normalized_address might show up twice, which shouldn't really
     happen anyway.
     """
-    return {
-        'normalized_address' if c.column_name == "address_line_1" else c.column_name
-        for c
-        in Column.objects.filter(
-            organization_id=organization_id,
-            is_matching_criteria=True,
-            table_name=table_name
-        )
-    }
+    return get_cached_column_metadata(
+        organization_id, 'matching_criteria:{}'.format(table_name),
+        lambda: {
+            'normalized_address' if c.column_name == "address_line_1" else c.column_name
+            for c
+            in Column.objects.filter(
+                organization_id=organization_id,
+                is_matching_criteria=True,
+                table_name=table_name
+            )
+        }
+    )
 
 
 def _merge_matches_across_cycles(matching_views, org_id, given_state_id, StateClass):
@@ -175,8 +180,7 @@ def _link_matches(matching_views, org_id, view, ViewClass):
             # Copy meters by highest ID order and lastly for the given Property
             sorted_canonical_ids = sorted(list(unique_canonical_ids))
             sorted_canonical_ids.append(view.property_id)
-            for id in sorted_canonical_ids:
-                new_record.copy_meters(id)
+            Property.copy_meters_in_bulk([(new_record.id, sorted_canonical_ids)])
 
         canonical_id_dict = {canonical_id_col: new_record.id}
 
@@ -243,6 +247,142 @@ def match_merge_link(view_id, StateClassName):
         return 0, link_count, None
 
 
+def match_merge_link_views(view_ids, StateClassName):
+    """
+    Batch version of match_merge_link() for many -Views of an organization,
+    e.g. all of the -Views that were created or merged by an import.
+
+    The -Views of the organization are grouped by the matching criteria values
+    of their -States in a single query, the same way whole_org_match_merge_link()
+    groups them, and only the groups that include one of the given -Views are
+    linked. The links are then applied to all groups at once. Groups that have
+    more than one -View in a Cycle need to be merged first, so the given -Views
+    of those groups are passed through match_merge_link() one at a time.
+
+    This method returns the IDs of the resulting -Views in the order of the
+    given IDs. A -View is replaced by the target -View if merges did occur.
+    """
+    if StateClassName == 'PropertyState':
+        StateClass = PropertyState
+        ViewClass = PropertyView
+        CanonicalClass = Property
+        canonical_id_col = 'property_id'
+    elif StateClassName == 'TaxLotState':
+        StateClass = TaxLotState
+        ViewClass = TaxLotView
+        CanonicalClass = TaxLot
+        canonical_id_col = 'taxlot_id'
+
+    if not view_ids:
+        return []
+
+    org_id = ViewClass.objects.filter(pk=view_ids[0]).values_list('state__organization_id', flat=True).get()
+
+    column_names = matching_criteria_column_names(org_id, StateClassName)
+
+    # 'state__' is appended to be able to query from the related -View Class
+    state_appended_col_names = {'state__' + col_name for col_name in column_names}
+    state_appended_empty_matching_criteria = {
+        'state__' + col_name: v
+        for col_name, v
+        in empty_criteria_filter(StateClass, column_names).items()
+    }
+
+    # -Views with empty matching criteria are not linked, so they are left out of the groups
+    link_groups = ViewClass.objects.\
+        filter(state__organization_id=org_id).\
+        exclude(**state_appended_empty_matching_criteria).\
+        values(*state_appended_col_names).\
+        annotate(
+            view_ids=ArrayAgg('id'),
+            cycle_ids=ArrayAgg('cycle_id'),
+            canonical_ids=ArrayAgg(canonical_id_col),
+            given_count=Count('id', filter=Q(id__in=view_ids)),
+        ).\
+        filter(given_count__gt=0).\
+        values_list('view_ids', 'cycle_ids', 'canonical_ids')
+
+    given_view_ids = set(view_ids)
+    merge_view_ids = []
+    unmatched_views = {}  # view_id: canonical_id
+    canonical_updates = {}  # view_id: canonical_id
+    new_record_links = []  # (view_ids, canonical_ids to copy meters from)
+    meter_copies = []  # (target canonical_id, source canonical_ids)
+    for group_view_ids, cycle_ids, canonical_ids in link_groups:
+        if len(set(cycle_ids)) < len(cycle_ids):
+            merge_view_ids += [view_id for view_id in group_view_ids if view_id in given_view_ids]
+            continue
+
+        group_canonical_ids = dict(zip(group_view_ids, canonical_ids))
+        view_id = next(view_id for view_id in group_view_ids if view_id in given_view_ids)
+        view_canonical_id = group_canonical_ids.pop(view_id)
+        unique_canonical_ids = set(group_canonical_ids.values())
+
+        if not unique_canonical_ids:
+            # If no matches found - check for past links and diassociate if necessary
+            unmatched_views[view_id] = view_canonical_id
+        elif len(unique_canonical_ids) == 1:
+            # If all matches are linked already - use the linking ID
+            linking_id = unique_canonical_ids.pop()
+            if linking_id != view_canonical_id:
+                canonical_updates[view_id] = linking_id
+                meter_copies.append((linking_id, [view_canonical_id]))
+        else:
+            # In this case, all matches are NOT linked already - use new canonical record to link
+            # Copy meters by highest ID order and lastly for the given canonical record
+            new_record_links.append((group_view_ids, sorted(unique_canonical_ids) + [view_canonical_id]))
+
+    # Unmatched -Views that were previously linked get a new canonical record
+    previously_linked_ids = set(
+        ViewClass.objects.
+        filter(**{canonical_id_col + '__in': list(unmatched_views.values())}).
+        values(canonical_id_col).
+        annotate(use_count=Count('id')).
+        filter(use_count__gt=1).
+        values_list(canonical_id_col, flat=True)
+    )
+    for view_id, canonical_id in unmatched_views.items():
+        if canonical_id in previously_linked_ids:
+            new_record_links.append(([view_id], [canonical_id]))
+
+    with transaction.atomic():
+        new_records = CanonicalClass.objects.bulk_create([
+            CanonicalClass(organization_id=org_id) for _link in new_record_links
+        ])
+        for new_record, (link_view_ids, source_canonical_ids) in zip(new_records, new_record_links):
+            for view_id in link_view_ids:
+                canonical_updates[view_id] = new_record.id
+            meter_copies.append((new_record.id, source_canonical_ids))
+
+        if canonical_updates:
+            ViewClass.objects.filter(id__in=list(canonical_updates)).update(**{
+                canonical_id_col: Case(
+                    *[When(id=view_id, then=Value(canonical_id)) for view_id, canonical_id in canonical_updates.items()],
+                    output_field=IntegerField()
+                )
+            })
+
+        if CanonicalClass == Property and meter_copies:
+            # Only the canonical records that have meters need to be copied
+            source_ids_with_meters = set(
+                Meter.objects.
+                filter(property_id__in=[source_id for _target_id, source_ids in meter_copies for source_id in source_ids]).
+                values_list('property_id', flat=True)
+            )
+            Property.copy_meters_in_bulk([
+                (target_id, [source_id for source_id in source_ids if source_id in source_ids_with_meters])
+                for target_id, source_ids in meter_copies
+            ])
+
+    target_view_ids = {}
+    for view_id in merge_view_ids:
+        _merge_count, _link_count, target_view_id = match_merge_link(view_id, StateClassName)
+        if target_view_id is not None:
+            target_view_ids[view_id] = target_view_id
+
+    return [target_view_ids.get(view_id, view_id) for view_id in view_ids]
+
+
 @shared_task(serializer='pickle', ignore_result=True)
 def whole_org_match_merge_link(org_id, state_class_name, proposed_columns=[]):
     """
@@ -378,6 +518,7 @@ def whole_org_match_merge_link(org_id, state_class_name, proposed_columns=[]):
             values_list('canonical_ids', 'view_ids', 'link_count')
 
         unused_canonical_ids = []
+        meter_copies = []
         for canonical_ids, view_ids, link_count in link_groups:
             # If the canonical record was unlinked and is still unlinked, do nothing
             if link_count == 1 and canonical_ids[0] in reusable_canonical_ids:
@@ -388,8 +529,7 @@ def whole_org_match_merge_link(org_id, state_class_name, proposed_columns=[]):
 
             if CanonicalClass == Property:
                 canonical_ids.sort(reverse=True)  # Ensures priority given by most recently created canonical record
-                for canonical_id in canonical_ids:
-                    new_record.copy_meters(canonical_id, source_persists=True)
+                meter_copies.append((new_record.id, canonical_ids))
 
             ViewClass.objects.filter(id__in=view_ids).update(**{canonical_id_col: new_record.id})
 
@@ -397,22 +537,30 @@ def whole_org_match_merge_link(org_id, state_class_name, proposed_columns=[]):
 
             unused_canonical_ids += canonical_ids
 
+        # The meters of all the link groups are copied at once
+        if meter_copies:
+            Property.copy_meters_in_bulk(meter_copies, source_persists=True)
+
         # For records with empty criteria and without reusable canonical IDs, apply a new ID.
         empty_criteria_views = ViewClass.objects.\
             select_related('state').\
             filter(cycle_id__in=cycle_ids, **state_appended_empty_matching_criteria).\
             exclude(**{canonical_id_col + "__in": reusable_canonical_ids})
 
+        meter_copies = []
         for view in empty_criteria_views:
             # Create a new canonical record, copy meters if applicable, and apply the new record to old -Views
             new_record = CanonicalClass.objects.create(organization_id=org_id)
 
             if CanonicalClass == Property:
-                new_record.copy_meters(getattr(view, canonical_id_col), source_persists=False)
+                meter_copies.append((new_record.id, [getattr(view, canonical_id_col)]))
 
             setattr(view, canonical_id_col, new_record.id)
             view.save()
 
+        if meter_copies:
+            Property.copy_meters_in_bulk(meter_copies, source_persists=False)
+
         # Also delete these unusable canonical records
         unused_canonical_ids += empty_criteria_views.values_list(canonical_id_col, flat=True)
 
@@ -151,8 +151,8 @@ def _merge_log_states(org_id, state_1, state_2, log_name, ignore_merge_protectio
         merged_state, state_1, state_2, priorities[StateClass.__name__], ignore_merge_protection
     )
 
-    state_1_audit_log = AuditLogClass.objects.filter(state=state_1).first()
-    state_2_audit_log = AuditLogClass.objects.filter(state=state_2).first()
+    state_1_audit_log = AuditLogClass.objects.filter(state=state_1).order_by('-id').first()
+    state_2_audit_log = AuditLogClass.objects.filter(state=state_2).order_by('-id').first()
 
     AuditLogClass.objects.create(
         organization_id=org_id,
@@ -181,14 +181,10 @@ def _merge_log_states(org_id, state_1, state_2, log_name, ignore_merge_protectio
 
 def _copy_meters_in_order(state_1_id, state_2_id, new_property):
     # Add meters in the following order without regard for the source persisting.
-    new_property.copy_meters(
+    Property.copy_meters_in_bulk([(new_property.id, [
         PropertyView.objects.get(state_id=state_1_id).property_id,
-        source_persists=False
-    )
-    new_property.copy_meters(
         PropertyView.objects.get(state_id=state_2_id).property_id,
-        source_persists=False
-    )
+    ])], source_persists=False)
 
 
 def _copy_propertyview_relationships(view_ids, new_view):
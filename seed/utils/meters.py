@@ -1,25 +1,15 @@
 # !/usr/bin/env python
 # encoding: utf-8
 
-from calendar import (
-    monthrange,
-    month_name,
-)
+from calendar import month_name
 
 from collections import defaultdict
 
 from config.settings.common import TIME_ZONE
 
-from datetime import (
-    datetime,
-    timedelta,
-)
-
-from django.utils.timezone import make_aware
-
 from pytz import timezone
 
-from seed.models import Meter
+from seed.models import Meter, MeterReading, MeterReadingAggregate
 from seed.data_importer.utils import (
     kbtu_thermal_conversion_factors,
     usage_point_id,
@@ -94,15 +84,16 @@ class PropertyMeterReadingsExporter():
         for meter in self.meters:
             field_name, conversion_factor = self._build_column_def(meter, column_defs)
 
-            for meter_reading in meter.meter_readings.all():
-                start_time = meter_reading.start_time.astimezone(tz=self.tz).strftime(time_format)
-                end_time = meter_reading.end_time.astimezone(tz=self.tz).strftime(time_format)
+            readings = meter.meter_readings.values_list('start_time', 'end_time', 'reading')
+            for start_time, end_time, reading in readings:
+                start_time = start_time.astimezone(tz=self.tz).strftime(time_format)
+                end_time = end_time.astimezone(tz=self.tz).strftime(time_format)
 
                 times_key = "-".join([start_time, end_time])
 
                 start_end_times[times_key]['start_time'] = start_time
                 start_end_times[times_key]['end_time'] = end_time
-                start_end_times[times_key][field_name] = meter_reading.reading / conversion_factor
+                start_end_times[times_key][field_name] = reading / conversion_factor
 
         return {
             'readings': list(start_end_times.values()),
@@ -118,7 +109,10 @@ class PropertyMeterReadingsExporter():
             - Identify the first start time and last end time
             - For each month between, aggregate the readings found in that month
                 - The highest possible reading total without overlapping times is found
-                - For more details how that monthly aggregation occurs, see _max_reading_total()
+                - For more details how that monthly aggregation occurs, see max_reading_total()
+                  in seed.utils.reading_totals
+
+        The monthly totals are precomputed in the MeterReadingAggregates of the meters.
         """
         # Used to consolidate different readings (types) within the same month
         monthly_readings = defaultdict(lambda: {})
@@ -131,32 +125,15 @@ class PropertyMeterReadingsExporter():
             },
         }
 
+        monthly_totals = self._reading_totals(MeterReadingAggregate.MONTH)
         for meter in self.meters:
             field_name, conversion_factor = self._build_column_def(meter, column_defs)
 
-            min_time = meter.meter_readings.earliest('start_time').start_time.astimezone(tz=self.tz)
-            max_time = meter.meter_readings.latest('end_time').end_time.astimezone(tz=self.tz)
-
-            # Iterate through months
-            current_month_time = min_time
-            while current_month_time < max_time:
-                _weekday, days_in_month = monthrange(current_month_time.year, current_month_time.month)
-
-                unaware_end = datetime(current_month_time.year, current_month_time.month, days_in_month, 23, 59, 59) + timedelta(seconds=1)
-                end_of_month = make_aware(unaware_end, timezone=self.tz)
-
-                # Find all meters fully contained within this month (second-level granularity)
-                interval_readings = meter.meter_readings.filter(start_time__range=(current_month_time, end_of_month), end_time__range=(current_month_time, end_of_month))
-                if interval_readings.exists():
-                    readings_list = list(interval_readings.order_by('end_time'))
-                    reading_month_total = self._max_reading_total(readings_list)
-
-                    if reading_month_total > 0:
-                        month_year = '{} {}'.format(month_name[current_month_time.month], current_month_time.year)
-                        monthly_readings[month_year]['month'] = month_year
-                        monthly_readings[month_year][field_name] = reading_month_total / conversion_factor
-
-                current_month_time = end_of_month
+            for current_month_time, reading_month_total in monthly_totals[meter.id]:
+                if reading_month_total > 0:
+                    month_year = '{} {}'.format(month_name[current_month_time.month], current_month_time.year)
+                    monthly_readings[month_year]['month'] = month_year
+                    monthly_readings[month_year][field_name] = reading_month_total / conversion_factor
 
         return {
             'readings': list(monthly_readings.values()),
@@ -179,30 +156,15 @@ class PropertyMeterReadingsExporter():
             },
         }
 
+        yearly_totals = self._reading_totals(MeterReadingAggregate.YEAR)
         for meter in self.meters:
             field_name, conversion_factor = self._build_column_def(meter, column_defs)
 
-            min_time = meter.meter_readings.earliest('start_time').start_time.astimezone(tz=self.tz)
-            max_time = meter.meter_readings.latest('end_time').end_time.astimezone(tz=self.tz)
-
-            # Iterate through years
-            current_year_time = min_time
-            while current_year_time < max_time:
-                unaware_end = datetime((current_year_time.year + 1), 1, 1, 0, 0, 0)
-                end_of_year = make_aware(unaware_end, timezone=self.tz)
-
-                # Find all meters fully contained within this month (second-level granularity)
-                interval_readings = meter.meter_readings.filter(start_time__range=(current_year_time, end_of_year), end_time__range=(current_year_time, end_of_year))
-                if interval_readings.exists():
-                    readings_list = list(interval_readings.order_by('end_time'))
-                    reading_year_total = self._max_reading_total(readings_list)
-
-                    if reading_year_total > 0:
-                        year = current_year_time.year
-                        yearly_readings[year]['year'] = year
-                        yearly_readings[year][field_name] = reading_year_total / conversion_factor
-
-                current_year_time = end_of_year
+            for current_year_time, reading_year_total in yearly_totals[meter.id]:
+                if reading_year_total > 0:
+                    year = current_year_time.year
+                    yearly_readings[year]['year'] = year
+                    yearly_readings[year][field_name] = reading_year_total / conversion_factor
 
         return {
             'readings': list(yearly_readings.values()),
@@ -230,62 +192,32 @@ class PropertyMeterReadingsExporter():
 
         return field_name, conversion_factor
 
-    def _latest_nonintersecting_index(self, sorted_readings, start_index):
-        """
-        Using indexes, finds the latest reading before the current reading.
-        Specifically, this latest reading must not end after the current reading
-        starts. The index of the latest reading or -1, if none exists, is returned.
-
-        Note that the readings are expected to be sorted by ascending end_times.
-
-        This binary search is taken from
-        https://www.geeksforgeeks.org/weighted-job-scheduling-log-n-time/
+    def _reading_totals(self, interval):
         """
-        lo = 0
-        hi = start_index - 1
-
-        while lo <= hi:
-            mid = (lo + hi) // 2
-            current_start_time = sorted_readings[start_index].start_time
-
-            if sorted_readings[mid].end_time <= current_start_time:
-                if sorted_readings[mid + 1].end_time <= current_start_time:
-                    lo = mid + 1
-                else:
-                    return mid
-            else:
-                hi = mid - 1
-        return -1
-
-    def _max_reading_total(self, sorted_readings):
+        Returns the start times and totals of the intervals of each meter, read from the
+        MeterReadingAggregates of the meters. The aggregates of meters that have readings but no
+        aggregates are refreshed first, e.g. if their readings were saved one at a time.
         """
-        Method to find maximum possible total of readings that do not
-        overlap each other within a given interval.
-
-        This is an implementation of the algorithm used to solve the
-        Weighted Job Scheduling problem and is taken from
-        https://www.geeksforgeeks.org/weighted-job-scheduling-log-n-time/
-
-        At a high level, a running maximum is tracked to ultimately find the max.
-
-        Note that the readings are expected to be sorted by ascending end_times.
-        """
-        # Create list to track running maximum and prefill first entry
-        n = len(sorted_readings)
-        running_max = [0 for _ in range(n)]
-        running_max[0] = sorted_readings[0].reading
-
-        # Fill the remaining entries in running_max
-        for i in range(1, n):
-            curr_max = sorted_readings[i].reading
-
-            latest_index = self._latest_nonintersecting_index(sorted_readings, i)
-
-            # If a latest index was found, add it's running_max value to curr_max
-            if (latest_index != -1):
-                curr_max += running_max[latest_index]
-
-            # Store maximum of curr_max and the prior running_max entry
-            running_max[i] = max(curr_max, running_max[i - 1])
-
-        return running_max[n - 1]
+        totals = defaultdict(list)
+        aggregates = MeterReadingAggregate.objects.filter(
+            meter__in=self.meters, interval=interval
+        ).order_by('start_time')
+        for aggregate in aggregates:
+            totals[aggregate.meter_id].append((aggregate.start_time.astimezone(tz=self.tz), aggregate.total))
+
+        # a meter with readings has aggregates for every interval, so a meter that is missing
+        # from the totals either has no readings or has stale aggregates
+        missing_meter_ids = [meter.id for meter in self.meters if meter.id not in totals]
+        stale_meter_ids = []
+        if missing_meter_ids:
+            stale_meter_ids = list(
+                MeterReading.objects.filter(meter_id__in=missing_meter_ids).values_list(
+                    'meter_id', flat=True
+                ).distinct()
+            )
+        if stale_meter_ids:
+            for aggregate in MeterReadingAggregate.refresh(stale_meter_ids):
+                if aggregate.interval == interval:
+                    totals[aggregate.meter_id].append((aggregate.start_time.astimezone(tz=self.tz), aggregate.total))
+
+        return totals
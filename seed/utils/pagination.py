@@ -10,9 +10,87 @@ All rights reserved.  # NOQA
 :author
 """
 from collections import OrderedDict
+
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
+from seed.utils.cache import (
+    get_cache_raw,
+    get_cache_version,
+    increment_cache_version,
+    set_cache_raw,
+)
+
+INVENTORY_COUNT_VERSION_KEY = 'SEED:inventory_count_version:{}'
+INVENTORY_COUNT_KEY = 'SEED:inventory_count:{}:{}:{}'
+INVENTORY_COUNT_TIMEOUT = 3600
+
+
+def invalidate_inventory_count(cycle_id):
+    """
+    Invalidate the cached counts of the property and tax lot views of a cycle. This is called
+    when views are created or deleted, e.g. on import, merge and delete.
+    """
+    increment_cache_version(INVENTORY_COUNT_VERSION_KEY.format(cycle_id))
+
+
+def get_inventory_count(inventory_type, org_id, cycle, queryset):
+    """
+    Return the number of views of an organization in a cycle, counting them with the queryset
+    only if the count is not cached.
+
+    :param inventory_type: str, 'property' or 'taxlot'
+    :param org_id: int, id of the organization
+    :param cycle: Cycle
+    :param queryset: QuerySet, all the views of the organization in the cycle
+    :return: int
+    """
+    version = get_cache_version(INVENTORY_COUNT_VERSION_KEY.format(cycle.id))
+    key = INVENTORY_COUNT_KEY.format(inventory_type, org_id, cycle.id)
+    cached = get_cache_raw(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    count = queryset.count()
+    set_cache_raw(key, (version, count), INVENTORY_COUNT_TIMEOUT)
+    return count
+
+
+class CountedPaginator(Paginator):
+    """Paginator that uses a count that is already known instead of counting the objects"""
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._count = count
+
+    @cached_property
+    def count(self):
+        return self._count
+
+
+def keyset_page(queryset, cursor, per_page):
+    """
+    Return a page of a queryset ordered by id, starting after the id of the cursor. Unlike
+    offset pagination, the cost of a page does not depend on how deep it is.
+
+    :param queryset: QuerySet, ordered by id
+    :param cursor: int, id of the last object of the previous page, or None for the first page
+    :param per_page: int, number of objects per page
+    :return: tuple, (list of the objects of the page, cursor of the next page or None)
+    """
+    if cursor is not None:
+        queryset = queryset.filter(id__gt=cursor)
+
+    # read one more object than needed to know if there is a next page
+    objects = list(queryset[:per_page + 1])
+    if len(objects) > per_page:
+        objects = objects[:per_page]
+        return objects, objects[-1].id
+
+    return objects, None
+
 
 class ResultsListPagination(PageNumberPagination):
     page_size_query_param = 'per_page'
@@ -28,7 +28,7 @@ from seed.models import (
     VIEW_LIST,
     VIEW_LIST_PROPERTY,
 )
-from seed.serializers.pint import apply_display_unit_preferences
+from seed.serializers.pint import apply_display_unit_preferences_to_list
 
 
 def get_changed_fields(old, new):
@@ -176,7 +176,7 @@ def properties_across_cycles(org_id, profile_id, cycle_ids=[]):
         related_results = TaxLotProperty.get_related(property_views, show_columns, columns_from_database)
 
         org = Organization.objects.get(pk=org_id)
-        unit_collapsed_results = [apply_display_unit_preferences(org, x) for x in related_results]
+        unit_collapsed_results = apply_display_unit_preferences_to_list(org, related_results)
 
         results[cycle_id] = unit_collapsed_results
 
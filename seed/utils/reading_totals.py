@@ -0,0 +1,107 @@
+# !/usr/bin/env python
+# encoding: utf-8
+"""
+:copyright (c) 2014 - 2020, The Regents of the University of California, through Lawrence Berkeley National Laboratory (subject to receipt of any required approvals from the U.S. Department of Energy) and contributors. All rights reserved.  # NOQA
+:author
+"""
+from bisect import bisect_right
+from calendar import monthrange
+from collections import defaultdict
+from datetime import (
+    datetime,
+    timedelta,
+)
+
+from django.utils.timezone import make_aware
+
+
+def end_of_month(time, tz):
+    """Returns the start of the month after the given time, in the timezone tz"""
+    _weekday, days_in_month = monthrange(time.year, time.month)
+
+    unaware_end = datetime(time.year, time.month, days_in_month, 23, 59, 59) + timedelta(seconds=1)
+    return make_aware(unaware_end, timezone=tz)
+
+
+def end_of_year(time, tz):
+    """Returns the start of the year after the given time, in the timezone tz"""
+    unaware_end = datetime((time.year + 1), 1, 1, 0, 0, 0)
+    return make_aware(unaware_end, timezone=tz)
+
+
+def max_reading_totals_by_interval(sorted_readings, end_of_interval, tz):
+    """
+    Returns the start time and the highest possible total of non-overlapping readings of
+    each interval (e.g. month) that has readings, in chronological order.
+
+    The first interval starts at the first start time of the readings and each interval ends
+    at end_of_interval(start of the interval, tz). A reading is in an interval if it starts and
+    ends within it, both inclusive (second-level granularity). Each reading is assigned to its
+    interval with a binary search over the interval boundaries.
+
+    :param sorted_readings: list, (start_time, end_time, reading) tuples sorted by ascending end_times
+    :param end_of_interval: function, end_of_month or end_of_year
+    :param tz: timezone of the intervals
+    :return: list, (start_time, total) tuples
+    """
+    if not sorted_readings:
+        return []
+
+    min_time = min(start_time for start_time, _end_time, _reading in sorted_readings).astimezone(tz=tz)
+    max_time = sorted_readings[-1][1].astimezone(tz=tz)
+
+    # Identify the boundaries of the intervals between the first start time and last end time
+    boundaries = [min_time]
+    while boundaries[-1] < max_time:
+        boundaries.append(end_of_interval(boundaries[-1], tz))
+
+    # Readings of each interval, still sorted by end_time
+    interval_readings = defaultdict(list)
+    for reading in sorted_readings:
+        start_time, end_time, _reading = reading
+        index = bisect_right(boundaries, start_time) - 1
+        if index + 1 < len(boundaries) and end_time <= boundaries[index + 1]:
+            interval_readings[index].append(reading)
+        # A reading that starts and ends on a boundary is also within the previous interval
+        if index > 0 and start_time == end_time == boundaries[index]:
+            interval_readings[index - 1].append(reading)
+
+    return [
+        (boundaries[index], max_reading_total(interval_readings[index]))
+        for index in sorted(interval_readings)
+    ]
+
+
+def max_reading_total(sorted_readings):
+    """
+    Method to find maximum possible total of readings that do not
+    overlap each other within a given interval.
+
+    This is an implementation of the algorithm used to solve the
+    Weighted Job Scheduling problem and is taken from
+    https://www.geeksforgeeks.org/weighted-job-scheduling-log-n-time/
+
+    At a high level, a running maximum is tracked to ultimately find the max.
+
+    Note that the readings are expected to be (start_time, end_time, reading)
+    tuples sorted by ascending end_times.
+    """
+    end_times = [end_time for _start_time, end_time, _reading in sorted_readings]
+
+    # Track the running maximum, the first entry being the first reading
+    running_max = []
+    for i, (start_time, _end_time, reading) in enumerate(sorted_readings):
+        curr_max = reading
+
+        # Find the latest reading before the current reading that does not end after the
+        # current reading starts (-1 if none exists)
+        latest_index = bisect_right(end_times, start_time, 0, i) - 1
+
+        # If a latest index was found, add it's running_max value to curr_max
+        if latest_index != -1:
+            curr_max += running_max[latest_index]
+
+        # Store maximum of curr_max and the prior running_max entry
+        running_max.append(max(curr_max, running_max[i - 1]) if i > 0 else curr_max)
+
+    return running_max[-1]
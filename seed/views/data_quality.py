@@ -8,6 +8,7 @@
 import csv
 
 from celery.utils.log import get_task_logger
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 from django.http import JsonResponse, HttpResponse
 from rest_framework import viewsets, serializers, status
 from rest_framework.decorators import list_route, detail_route
@@ -24,7 +25,6 @@ from seed.models.data_quality import (
     DataQualityCheck,
 )
 from seed.utils.api import api_endpoint_class
-from seed.utils.cache import get_cache_raw
 
 logger = get_task_logger(__name__)
 
@@ -157,7 +157,7 @@ class DataQualityViews(viewsets.ViewSet):
               required: true
               paramType: path
         """
-        data_quality_results = get_cache_raw(DataQualityCheck.cache_key(pk))
+        data_quality_results = DataQualityCheck.get_results(pk)
         response = HttpResponse(content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="Data Quality Check Results.csv"'
 
@@ -428,11 +428,61 @@ class DataQualityViews(viewsets.ViewSet):
         Return the result of the data quality based on the ID that was given during the
         creation of the data quality task. Note that it is not related to the object in the
         database, since the results are stored in redis!
+        ---
+        parameter_strategy: replace
+        parameters:
+            - name: organization_id
+              required: true
+              paramType: query
+            - name: data_quality_id
+              required: true
+              paramType: query
+            - name: page
+              description: The current page of results to return, all results are returned if
+                           not set
+              required: false
+              paramType: query
+            - name: per_page
+              description: The number of results to return per page, defaults to 100
+              required: false
+              paramType: query
         """
         Organization.objects.get(pk=request.query_params['organization_id'])
 
         data_quality_id = request.query_params['data_quality_id']
-        data_quality_results = get_cache_raw(DataQualityCheck.cache_key(data_quality_id))
+        data_quality_results = DataQualityCheck.get_results(data_quality_id)
+        if 'page' not in request.query_params or data_quality_results is None:
+            return JsonResponse({
+                'data': data_quality_results
+            })
+
+        try:
+            per_page = int(request.query_params.get('per_page', 100))
+        except ValueError:
+            per_page = 0
+        if per_page < 1:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'per_page must be a positive integer'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        paginator = Paginator(data_quality_results, per_page)
+        try:
+            results = paginator.page(request.query_params['page'])
+        except PageNotAnInteger:
+            results = paginator.page(1)
+        except EmptyPage:
+            results = paginator.page(paginator.num_pages)
+
         return JsonResponse({
-            'data': data_quality_results
+            'pagination': {
+                'page': results.number,
+                'start': results.start_index(),
+                'end': results.end_index(),
+                'num_pages': paginator.num_pages,
+                'has_next': results.has_next(),
+                'has_previous': results.has_previous(),
+                'total': paginator.count
+            },
+            'data': results.object_list
         })
@@ -1,6 +1,8 @@
 # !/usr/bin/env python
 # encoding: utf-8
 
+from itertools import islice
+
 from rest_framework import viewsets
 from rest_framework.decorators import list_route
 
@@ -52,15 +54,21 @@ class MeterViewSet(viewsets.ViewSet):
 
         import_file = ImportFile.objects.get(pk=file_id)
         parser = reader.GreenButtonParser(import_file.local_file)
-        raw_meter_data = list(parser.data)
+        raw_readings = parser.iter_readings()
 
+        # All the readings of a GreenButton file are of the same meter, type and unit, so only the
+        # first reading is parsed and the rest are only counted.
         property_id = PropertyView.objects.get(pk=view_id).property_id
-        meters_parser = MetersParser(org_id, raw_meter_data, source_type=Meter.GREENBUTTON, property_id=property_id)
+        meters_parser = MetersParser(
+            org_id, list(islice(raw_readings, 1)), source_type=Meter.GREENBUTTON, property_id=property_id
+        )
 
         result = {}
 
         result["validated_type_units"] = meters_parser.validated_type_units()
         result["proposed_imports"] = meters_parser.proposed_imports()
+        for proposed_import in result["proposed_imports"]:
+            proposed_import['incoming'] += sum(1 for _reading in raw_readings)
 
         import_file.matching_results_data['property_id'] = property_id
         import_file.save()
@@ -8,7 +8,7 @@ All rights reserved.  # NOQA
 :author
 """
 
-from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.core.paginator import EmptyPage, PageNotAnInteger
 from django.http import JsonResponse
 from rest_framework import status
 from rest_framework.decorators import detail_route, list_route
@@ -51,7 +51,7 @@ from seed.models import (
 from seed.models import Property as PropertyModel
 from seed.serializers.pint import PintJSONEncoder
 from seed.serializers.pint import (
-    apply_display_unit_preferences,
+    apply_display_unit_preferences_to_list,
     add_pint_unit_suffix
 )
 from seed.serializers.properties import (
@@ -71,6 +71,7 @@ from seed.utils.properties import (
     properties_across_cycles,
 )
 from seed.utils.merge import merge_properties
+from seed.utils.pagination import CountedPaginator, get_inventory_count, keyset_page
 from seed.utils.viewsets import (
     SEEDOrgCreateUpdateModelViewSet,
     SEEDOrgModelViewSet
@@ -214,12 +215,25 @@ class PropertyViewSet(GenericViewSet, ProfileIdMixin):
         cycle_id = request.query_params.get('cycle')
         # check if there is a query paramater for the profile_id. If so, then use that one
         profile_id = request.query_params.get('profile_id', profile_id)
+        # if there is a cursor (even empty), use keyset pagination instead of pages
+        cursor = request.query_params.get('cursor')
 
         if not org_id:
             return JsonResponse(
                 {'status': 'error', 'message': 'Need to pass organization_id as query parameter'},
                 status=status.HTTP_400_BAD_REQUEST)
 
+        if cursor is not None:
+            try:
+                cursor = int(cursor) if cursor else None
+                per_page = int(per_page)
+            except ValueError:
+                per_page = 0
+            if per_page < 1:
+                return JsonResponse(
+                    {'status': 'error', 'message': 'cursor must be an integer and per_page a positive integer'},
+                    status=status.HTTP_400_BAD_REQUEST)
+
         if cycle_id:
             cycle = Cycle.objects.get(organization_id=org_id, pk=cycle_id)
         else:
@@ -238,27 +252,47 @@ class PropertyViewSet(GenericViewSet, ProfileIdMixin):
                 })
 
         # Return property views limited to the 'inventory_ids' list.  Otherwise, if selected is empty, return all
+        cycle_views = PropertyView.objects.select_related('property', 'state', 'cycle') \
+            .filter(property__organization_id=org_id, cycle=cycle) \
+            .order_by('id')  # TODO: test adding .only(*fields['PropertyState'])
         if 'inventory_ids' in request.data and request.data['inventory_ids']:
-            property_views_list = PropertyView.objects.select_related('property', 'state', 'cycle') \
-                .filter(property_id__in=request.data['inventory_ids'],
-                        property__organization_id=org_id, cycle=cycle) \
-                .order_by('id')  # TODO: test adding .only(*fields['PropertyState'])
+            property_views_list = cycle_views.filter(property_id__in=request.data['inventory_ids'])
+            total = property_views_list.count()
         else:
-            property_views_list = PropertyView.objects.select_related('property', 'state', 'cycle') \
-                .filter(property__organization_id=org_id, cycle=cycle) \
-                .order_by('id')  # TODO: test adding .only(*fields['PropertyState'])
-
-        paginator = Paginator(property_views_list, per_page)
+            property_views_list = cycle_views
+            total = get_inventory_count('property', org_id, cycle, cycle_views)
+
+        if cursor is not None:
+            property_views, next_cursor = keyset_page(property_views_list, cursor, per_page)
+            pagination = {
+                'cursor': cursor,
+                'next_cursor': next_cursor,
+                'per_page': per_page,
+                'has_next': next_cursor is not None,
+                'total': total
+            }
+        else:
+            paginator = CountedPaginator(property_views_list, per_page, total)
 
-        try:
-            property_views = paginator.page(page)
-            page = int(page)
-        except PageNotAnInteger:
-            property_views = paginator.page(1)
-            page = 1
-        except EmptyPage:
-            property_views = paginator.page(paginator.num_pages)
-            page = paginator.num_pages
+            try:
+                property_views = paginator.page(page)
+                page = int(page)
+            except PageNotAnInteger:
+                property_views = paginator.page(1)
+                page = 1
+            except EmptyPage:
+                property_views = paginator.page(paginator.num_pages)
+                page = paginator.num_pages
+
+            pagination = {
+                'page': page,
+                'start': property_views.start_index(),
+                'end': property_views.end_index(),
+                'num_pages': paginator.num_pages,
+                'has_next': property_views.has_next(),
+                'has_previous': property_views.has_previous(),
+                'total': paginator.count
+            }
 
         org = Organization.objects.get(pk=org_id)
 
@@ -292,18 +326,10 @@ class PropertyViewSet(GenericViewSet, ProfileIdMixin):
 
         # collapse units here so we're only doing the last page; we're already a
         # realized list by now and not a lazy queryset
-        unit_collapsed_results = [apply_display_unit_preferences(org, x) for x in related_results]
+        unit_collapsed_results = apply_display_unit_preferences_to_list(org, related_results)
 
         response = {
-            'pagination': {
-                'page': page,
-                'start': paginator.page(page).start_index(),
-                'end': paginator.page(page).end_index(),
-                'num_pages': paginator.num_pages,
-                'has_next': paginator.page(page).has_next(),
-                'has_previous': paginator.page(page).has_previous(),
-                'total': paginator.count
-            },
+            'pagination': pagination,
             'cycle_id': cycle.id,
             'results': unit_collapsed_results
         }
@@ -363,6 +389,11 @@ class PropertyViewSet(GenericViewSet, ProfileIdMixin):
               description: The number of items per page to return
               required: false
               paramType: query
+            - name: cursor
+              description: The id of the last property view of the previous page. If passed (empty for
+                           the first page), the properties are paginated by id instead of page number
+              required: false
+              paramType: query
         """
         return self._get_filtered_results(request, profile_id=-1)
 
@@ -425,6 +456,11 @@ class PropertyViewSet(GenericViewSet, ProfileIdMixin):
               description: The number of items per page to return
               required: false
               paramType: query
+            - name: cursor
+              description: The id of the last property view of the previous page. If passed (empty for
+                           the first page), the properties are paginated by id instead of page number
+              required: false
+              paramType: query
             - name: profile_id
               description: Either an id of a list settings profile, or undefined
               paramType: body
@@ -584,8 +620,10 @@ class PropertyViewSet(GenericViewSet, ProfileIdMixin):
         new_property_2.id = None
         new_property_2.save()
 
-        Property.objects.get(pk=new_property.id).copy_meters(old_view.property_id)
-        Property.objects.get(pk=new_property_2.id).copy_meters(old_view.property_id)
+        Property.copy_meters_in_bulk([
+            (new_property.id, [old_view.property_id]),
+            (new_property_2.id, [old_view.property_id]),
+        ])
 
         # If canonical Property is NOT associated to a different -View, delete it
         if not PropertyView.objects.filter(property_id=old_view.property_id).exclude(id=old_view.id).exists():
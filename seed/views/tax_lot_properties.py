@@ -9,11 +9,15 @@ All rights reserved.  # NOQA
 """
 import csv
 import datetime
-import io
-from collections import OrderedDict
+import json
+import tempfile
+from collections import OrderedDict, defaultdict
+from itertools import islice
 
 import xlsxwriter
-from django.http import JsonResponse, HttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
 from quantityfield import ureg
 from rest_framework.decorators import list_route
 from rest_framework.renderers import JSONRenderer
@@ -22,7 +26,9 @@ from rest_framework.viewsets import GenericViewSet
 from seed.decorators import ajax_request_class
 from seed.lib.superperms.orgs.decorators import has_perm_class
 from seed.models import (
+    Note,
     PropertyView,
+    StatusLabel,
     TaxLotProperty,
     TaxLotView,
     ColumnListSetting,
@@ -45,6 +51,16 @@ from seed.utils.api import api_endpoint_class
 INVENTORY_MODELS = {'properties': PropertyView, 'taxlots': TaxLotView}
 
 
+class Echo(object):
+    """
+    File-like object for the csv writer that returns the written row instead of buffering it,
+    so that the rows can be streamed in the response.
+    """
+
+    def write(self, value):
+        return value
+
+
 class TaxLotPropertyViewSet(GenericViewSet):
     """
     The TaxLotProperty field is used to return the properties and tax lots from the join table.
@@ -54,6 +70,9 @@ class TaxLotPropertyViewSet(GenericViewSet):
     renderer_classes = (JSONRenderer,)
     serializer_class = TaxLotPropertySerializer
 
+    # number of views of which the data is in memory at once during an export
+    EXPORT_CHUNK_SIZE = 1000
+
     @api_endpoint_class
     @ajax_request_class
     @has_perm_class('requires_member')
@@ -125,7 +144,7 @@ class TaxLotPropertyViewSet(GenericViewSet):
         filter_str = {'cycle': cycle_pk}
         if hasattr(view_klass, 'property'):
             select_related.append('property')
-            prefetch_related = ['labels']
+            canonical_id = 'property_id'
             filter_str = {'property__organization_id': org_id}
             if ids:
                 filter_str['property__id__in'] = ids
@@ -135,7 +154,7 @@ class TaxLotPropertyViewSet(GenericViewSet):
 
         elif hasattr(view_klass, 'taxlot'):
             select_related.append('taxlot')
-            prefetch_related = ['labels']
+            canonical_id = 'taxlot_id'
             filter_str = {'taxlot__organization_id': org_id}
             if ids:
                 filter_str['taxlot__id__in'] = ids
@@ -143,88 +162,115 @@ class TaxLotPropertyViewSet(GenericViewSet):
             column_name_mappings['taxlot_notes'] = 'Tax Lot Notes'
             column_name_mappings['taxlot_labels'] = 'Tax Lot Labels'
 
-        model_views = view_klass.objects.select_related(*select_related).prefetch_related(
-            *prefetch_related).filter(**filter_str).order_by('id')
-
-        # get the data in a dict which includes the related data
-        data = TaxLotProperty.get_related(model_views, column_ids, columns_from_database)
-
-        # add labels and notes
-        for i, record in enumerate(model_views):
-            label_string = []
-            note_string = []
-            for label in list(record.labels.all().order_by('name')):
-                label_string.append(label.name)
-            for note in list(record.notes.all().order_by('created')):
-                note_string.append(
-                    note.created.astimezone().strftime("%Y-%m-%d %I:%M:%S %p") + "\n" +
-                    note.text
-                )
-
-            if hasattr(record, 'property'):
-                data[i]['property_labels'] = ','.join(label_string)
-                data[i]['property_notes'] = '\n----------\n'.join(note_string)
-            elif hasattr(record, 'taxlot'):
-                data[i]['taxlot_labels'] = ','.join(label_string)
-                data[i]['taxlot_notes'] = '\n----------\n'.join(note_string)
-
-        # force the data into the same order as the IDs
+        model_views = view_klass.objects.filter(**filter_str).order_by('id')
         if ids:
+            # force the data into the same order as the IDs. Only the ids of the views are kept in memory.
             order_dict = {obj_id: index for index, obj_id in enumerate(ids)}
-            data.sort(key=lambda x: order_dict[x['id']])  # x is the property/taxlot object
+            view_ids = [
+                view_id for view_id, _ in sorted(
+                    model_views.values_list('id', canonical_id), key=lambda x: order_dict[x[1]]
+                )
+            ]
+        else:
+            # read the ids with a server-side cursor instead of loading all of them
+            view_ids = model_views.values_list('id', flat=True).iterator(chunk_size=self.EXPORT_CHUNK_SIZE)
+
+        # the data of the views is only built one chunk at a time, while the response is streamed
+        data_chunks = self._iter_export_chunks(
+            view_klass, view_ids, select_related, column_ids, columns_from_database
+        )
 
         export_type = request.data.get('export_type', 'csv')
 
         filename = request.data.get('filename', f"ExportedData.{export_type}")
 
         if export_type == "csv":
-            return self._csv_response(filename, data, column_name_mappings)
+            return self._csv_response(filename, data_chunks, column_name_mappings)
         elif export_type == "geojson":
-            return self._json_response(filename, data, column_name_mappings)
+            return self._json_response(filename, data_chunks, column_name_mappings)
         elif export_type == "xlsx":
-            return self._spreadsheet_response(filename, data, column_name_mappings)
+            return self._spreadsheet_response(filename, data_chunks, column_name_mappings)
 
-    def _csv_response(self, filename, data, column_name_mappings):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
+    def _iter_export_chunks(self, view_klass, view_ids, select_related, column_ids, columns_from_database):
+        """
+        Yield the data of the exported views, with their labels and notes, in chunks of
+        EXPORT_CHUNK_SIZE views. The labels and notes of each chunk are read with one query each.
+
+        :param view_klass: PropertyView or TaxLotView
+        :param view_ids: iterable, ids of the views to export, in the order of the export
+        :param select_related: list, relations of the views to select with the views
+        :param column_ids: list, ids of the columns to export, None for all columns
+        :param columns_from_database: list, columns from the database as list of dict
+        """
+        if view_klass == PropertyView:
+            labels_key, notes_key = 'property_labels', 'property_notes'
+        else:
+            labels_key, notes_key = 'taxlot_labels', 'taxlot_notes'
+
+        view_ids = iter(view_ids)
+        while True:
+            chunk_ids = list(islice(view_ids, self.EXPORT_CHUNK_SIZE))
+            if not chunk_ids:
+                return
+
+            views_by_id = view_klass.objects.select_related(*select_related).prefetch_related(
+                Prefetch('labels', queryset=StatusLabel.objects.order_by('name')),
+                Prefetch('notes', queryset=Note.objects.order_by('created')),
+            ).in_bulk(chunk_ids)
+            chunk_views = [views_by_id[view_id] for view_id in chunk_ids if view_id in views_by_id]
+
+            # get the data in a dict which includes the related data
+            data = TaxLotProperty.get_related(chunk_views, column_ids, columns_from_database)
+
+            # add labels and notes
+            for record, datum in zip(chunk_views, data):
+                datum[labels_key] = ','.join(label.name for label in record.labels.all())
+                datum[notes_key] = '\n----------\n'.join(
+                    note.created.astimezone().strftime("%Y-%m-%d %I:%M:%S %p") + "\n" + note.text
+                    for note in record.notes.all()
+                )
+
+            yield data
 
-        writer = csv.writer(response)
+    def _export_value(self, datum, column):
+        """Return the value of a column of an exported record, formatted for CSV and XLSX"""
+        row_result = datum.get(column, None)
 
+        # Try grabbing the value out of the related field if not found yet.
+        if row_result is None and datum.get('related'):
+            row_result = datum['related'][0].get(column, None)
+
+        # Convert quantities (this is typically handled in the JSON Encoder, but that isn't here).
+        if isinstance(row_result, ureg.Quantity):
+            row_result = row_result.magnitude
+        elif isinstance(row_result, datetime.datetime):
+            row_result = row_result.strftime("%Y-%m-%d %H:%M:%S")
+        elif isinstance(row_result, datetime.date):
+            row_result = row_result.strftime("%Y-%m-%d")
+        return row_result
+
+    def _csv_response(self, filename, data_chunks, column_name_mappings):
         # check the first item in the header and make sure that it isn't ID (it can be id, or iD).
         # excel doesn't like the first item to be ID in a CSV
         header = list(column_name_mappings.values())
         if header[0] == 'ID':
             header[0] = 'id'
-        writer.writerow(header)
 
-        # iterate over the results to preserve column order and write row.
-        for datum in data:
-            row = []
-            for column in column_name_mappings:
-                row_result = datum.get(column, None)
-
-                # Try grabbing the value out of the related field if not found yet.
-                if row_result is None and datum.get('related'):
-                    row_result = datum['related'][0].get(column, None)
-
-                # Convert quantities (this is typically handled in the JSON Encoder, but that isn't here).
-                if isinstance(row_result, ureg.Quantity):
-                    row_result = row_result.magnitude
-                elif isinstance(row_result, datetime.datetime):
-                    row_result = row_result.strftime("%Y-%m-%d %H:%M:%S")
-                elif isinstance(row_result, datetime.date):
-                    row_result = row_result.strftime("%Y-%m-%d")
-                row.append(row_result)
-
-            writer.writerow(row)
+        def rows():
+            writer = csv.writer(Echo())
+            yield writer.writerow(header)
 
-        return response
+            # iterate over the results to preserve column order and write row.
+            for data in data_chunks:
+                for datum in data:
+                    yield writer.writerow([self._export_value(datum, column) for column in column_name_mappings])
 
-    def _spreadsheet_response(self, filename, data, column_name_mappings):
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response = StreamingHttpResponse(rows(), content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
 
+        return response
+
+    def _spreadsheet_response(self, filename, data_chunks, column_name_mappings):
         scenario_keys = (
             'id', 'name', 'description', 'annual_site_energy_savings', 'annual_source_energy_savings',
             'annual_cost_savings', 'analysis_state', 'analysis_state_message', 'annual_electricity_savings',
@@ -252,16 +298,12 @@ class TaxLotPropertyViewSet(GenericViewSet):
             'cost_installation', 'cost_material', 'cost_capital_replacement', 'cost_residual_value'
         )
         measure_keys = ('name', 'display_name', 'category', 'category_display_name')
-        # find measures and scenarios
-        for i, record in enumerate(data):
-            measures = PropertyMeasure.objects.filter(property_state_id=record['property_state_id'])
-            record['measures'] = measures
+        energy_types = dict(Meter.ENERGY_TYPES)
 
-            scenarios = Scenario.objects.filter(property_state_id=record['property_state_id'])
-            record['scenarios'] = scenarios
-
-        output = io.BytesIO()
-        wb = xlsxwriter.Workbook(output, {'remove_timezone': True})
+        # The workbook is written to a temporary file in constant memory mode (each row is
+        # flushed once the next row is written) and the file is streamed in the response.
+        output = tempfile.TemporaryFile()
+        wb = xlsxwriter.Workbook(output, {'remove_timezone': True, 'constant_memory': True})
 
         # add tabs
         ws1 = wb.add_worksheet('Properties')
@@ -270,6 +312,8 @@ class TaxLotPropertyViewSet(GenericViewSet):
         ws4 = wb.add_worksheet('Scenario Measure Join Table')
         ws5 = wb.add_worksheet('Meter Readings')
         bold = wb.add_format({'bold': True})
+        # datetime formatting
+        date_format = wb.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
 
         row = 0
         row2 = 0
@@ -286,228 +330,229 @@ class TaxLotPropertyViewSet(GenericViewSet):
             else:
                 ws1.write(row, index, val, bold)
 
+        # join table
+        ws4.write('A1', 'property_id', bold)
+        ws4.write('B1', 'scenario_id', bold)
+        ws4.write('C1', 'measure_id', bold)
+
+        # scenario meter readings
+        ws5.write('A1', 'scenario_id', bold)
+        ws5.write('B1', 'meter_id', bold)
+        ws5.write('C1', 'type', bold)
+        ws5.write('D1', 'start_time', bold)
+        ws5.write('E1', 'end_time', bold)
+        ws5.write('F1', 'reading', bold)
+        ws5.write('G1', 'units', bold)
+        ws5.write('H1', 'is_virtual', bold)
+
         # iterate over the results to preserve column order and write row.
         add_m_headers = True
         add_s_headers = True
-        for datum in data:
-            row += 1
-            id = None
-            for index, column in enumerate(column_name_mappings):
-                if column == 'id':
-                    id = datum.get(column, None)
-
-                row_result = datum.get(column, None)
-
-                # Try grabbing the value out of the related field if not found yet.
-                if row_result is None and datum.get('related'):
-                    row_result = datum['related'][0].get(column, None)
-
-                # Convert quantities (this is typically handled in the JSON Encoder, but that isn't here).
-                if isinstance(row_result, ureg.Quantity):
-                    row_result = row_result.magnitude
-                elif isinstance(row_result, datetime.datetime):
-                    row_result = row_result.strftime("%Y-%m-%d %H:%M:%S")
-                elif isinstance(row_result, datetime.date):
-                    row_result = row_result.strftime("%Y-%m-%d")
-                ws1.write(row, index, row_result)
-
-            # measures
-            for index, m in enumerate(datum['measures']):
-                if add_m_headers:
-                    # grab headers
+        for data in data_chunks:
+            # find the measures, scenarios and scenario meters of the chunk
+            state_ids = [datum.get('property_state_id') for datum in data]
+            measures = defaultdict(list)
+            for m in PropertyMeasure.objects.filter(property_state_id__in=state_ids).select_related('measure'):
+                measures[m.property_state_id].append(m)
+            scenarios = defaultdict(list)
+            for s in Scenario.objects.filter(property_state_id__in=state_ids).prefetch_related('measures'):
+                scenarios[s.property_state_id].append(s)
+            meters = defaultdict(list)
+            for m in Meter.objects.filter(
+                scenario__property_state_id__in=state_ids
+            ).prefetch_related(
+                Prefetch('meter_readings', queryset=MeterReading.objects.order_by('start_time'))
+            ):
+                meters[m.scenario_id].append(m)
+
+            for datum in data:
+                row += 1
+                id = None
+                for index, column in enumerate(column_name_mappings):
+                    if column == 'id':
+                        id = datum.get(column, None)
+
+                    ws1.write(row, index, self._export_value(datum, column))
+
+                # measures
+                for index, m in enumerate(measures[datum.get('property_state_id')]):
+                    if add_m_headers:
+                        # grab headers
+                        for key in property_measure_keys:
+                            ws2.write(row2, col2, key, bold)
+                            col2 += 1
+                        for key in measure_keys:
+                            ws2.write(row2, col2, 'measure ' + key, bold)
+                            col2 += 1
+                        add_m_headers = False
+
+                    row2 += 1
+                    col2 = 0
                     for key in property_measure_keys:
-                        ws2.write(row2, col2, key, bold)
+                        ws2.write(row2, col2, getattr(m, key))
                         col2 += 1
                     for key in measure_keys:
-                        ws2.write(row2, col2, 'measure ' + key, bold)
+                        ws2.write(row2, col2, getattr(m.measure, key))
                         col2 += 1
-                    add_m_headers = False
-
-                row2 += 1
-                col2 = 0
-                for key in property_measure_keys:
-                    ws2.write(row2, col2, getattr(m, key))
-                    col2 += 1
-                for key in measure_keys:
-                    ws2.write(row2, col2, getattr(m.measure, key))
-                    col2 += 1
-
-            # scenarios (and join table)
-            # join table
-            ws4.write('A1', 'property_id', bold)
-            ws4.write('B1', 'scenario_id', bold)
-            ws4.write('C1', 'measure_id', bold)
-            for index, s in enumerate(datum['scenarios']):
-                # print("EXPORT SCENARIO: {}".format(inspect.getmembers(s)))
-                scenario_id = s.id
-                if add_s_headers:
-                    # grab headers
+
+                # scenarios (and join table)
+                datum_scenarios = scenarios[datum.get('property_state_id')]
+                for index, s in enumerate(datum_scenarios):
+                    scenario_id = s.id
+                    if add_s_headers:
+                        # grab headers
+                        for key in scenario_keys:
+                            # double check scenario_key_mappings in case a different header is desired
+                            if key in scenario_key_mappings.keys():
+                                key = scenario_key_mappings[key]
+                            ws3.write(row3, col3, key, bold)
+                            col3 += 1
+                        add_s_headers = False
+                    row3 += 1
+                    col3 = 0
                     for key in scenario_keys:
-                        # double check scenario_key_mappings in case a different header is desired
-                        if key in scenario_key_mappings.keys():
-                            key = scenario_key_mappings[key]
-                        ws3.write(row3, col3, key, bold)
+                        ws3.write(row3, col3, getattr(s, key))
                         col3 += 1
-                    add_s_headers = False
-                row3 += 1
-                col3 = 0
-                for key in scenario_keys:
-                    ws3.write(row3, col3, getattr(s, key))
-                    col3 += 1
-
-                for sm in s.measures.all():
-                    row4 += 1
-                    ws4.write(row4, 0, id)
-                    ws4.write(row4, 1, scenario_id)
-                    ws4.write(row4, 2, sm.id)
-
-            # scenario meter readings
-            ws5.write('A1', 'scenario_id', bold)
-            ws5.write('B1', 'meter_id', bold)
-            ws5.write('C1', 'type', bold)
-            ws5.write('D1', 'start_time', bold)
-            ws5.write('E1', 'end_time', bold)
-            ws5.write('F1', 'reading', bold)
-            ws5.write('G1', 'units', bold)
-            ws5.write('H1', 'is_virtual', bold)
-            # datetime formatting
-            date_format = wb.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
-
-            for index, s in enumerate(datum['scenarios']):
-                scenario_id = s.id
-                # retrieve meters
-                meters = Meter.objects.filter(scenario_id=scenario_id)
-                for m in meters:
-                    # retrieve readings
-                    readings = MeterReading.objects.filter(meter_id=m.id).order_by('start_time')
-                    for r in readings:
-                        row5 += 1
-                        ws5.write(row5, 0, scenario_id)
-                        ws5.write(row5, 1, m.id)
-                        the_type = next((item for item in Meter.ENERGY_TYPES if item[0] == m.type), None)
-                        the_type = the_type[1] if the_type is not None else None
-                        ws5.write(row5, 2, the_type)  # use energy type enum to determine reading type
-                        ws5.write_datetime(row5, 3, r.start_time, date_format)
-                        ws5.write_datetime(row5, 4, r.end_time, date_format)
-                        ws5.write(row5, 5, r.reading)  # this is now a float field
-                        ws5.write(row5, 6, r.source_unit)
-                        ws5.write(row5, 7, m.is_virtual)
 
-        wb.close()
+                    for sm in s.measures.all():
+                        row4 += 1
+                        ws4.write(row4, 0, id)
+                        ws4.write(row4, 1, scenario_id)
+                        ws4.write(row4, 2, sm.id)
+
+                for index, s in enumerate(datum_scenarios):
+                    scenario_id = s.id
+                    for m in meters[scenario_id]:
+                        for r in m.meter_readings.all():
+                            row5 += 1
+                            ws5.write(row5, 0, scenario_id)
+                            ws5.write(row5, 1, m.id)
+                            # use energy type enum to determine reading type
+                            ws5.write(row5, 2, energy_types.get(m.type))
+                            ws5.write_datetime(row5, 3, r.start_time, date_format)
+                            ws5.write_datetime(row5, 4, r.end_time, date_format)
+                            ws5.write(row5, 5, r.reading)  # this is now a float field
+                            ws5.write(row5, 6, r.source_unit)
+                            ws5.write(row5, 7, m.is_virtual)
 
-        # xlsx_data contains the Excel file
-        xlsx_data = output.getvalue()
+        wb.close()
+        output.seek(0)
 
-        response.write(xlsx_data)
+        response = FileResponse(
+            output, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
         return response
 
-    def _json_response(self, filename, data, column_name_mappings):
-        polygon_fields = ["bounding_box", "centroid", "property_footprint", "taxlot_footprint", "long_lat"]
-        features = []
-
-        # extract related records
-        related_records = self._extract_related(data)
-
-        # append related_records to data
-        complete_data = data + related_records
-
-        for datum in complete_data:
-            feature = {
-                "type": "Feature",
-                "properties": {}
-            }
-
-            for key, value in datum.items():
-                if value is None:
-                    continue
-
-                if isinstance(value, ureg.Quantity):
-                    value = value.magnitude
-                elif isinstance(value, datetime.datetime):
-                    value = value.strftime("%Y-%m-%d %H:%M:%S")
-                elif isinstance(value, datetime.date):
-                    value = value.strftime("%Y-%m-%d")
-
-                if value and any(k in key for k in polygon_fields):
-                    """
-                    If object is a polygon and is populated, add the 'geometry'
-                    key-value-pair in the appropriate GeoJSON format.
-                    When the first geometry is added, the correct format is
-                    established. When/If a second geometry is added, this is
-                    appended alongside the previous geometry.
-                    """
-                    individual_geometry = {}
-
-                    print("VALUE:")
-                    print(value)
-
-                    # long_lat
-                    if key == 'long_lat':
-                        coordinates = self._serialized_point(value)
-                        # point
-                        individual_geometry = {
-                            "coordinates": coordinates,
-                            "type": "Point"
-                        }
-                    else:
-                        # polygons
-                        coordinates = self._serialized_coordinates(value)
-                        individual_geometry = {
-                            "coordinates": [coordinates],
-                            "type": "Polygon"
-                        }
-
-                    if feature.get("geometry", None) is None:
-                        feature["geometry"] = {
-                            "type": "GeometryCollection",
-                            "geometries": [individual_geometry]
-                        }
-                    else:
-                        feature["geometry"]["geometries"].append(individual_geometry)
-                else:
-                    """
-                    Non-polygon data
-                    """
-                    display_key = column_name_mappings.get(key, key)
-                    feature["properties"][display_key] = value
-
-                    # # store point geometry in case you need it
-                    # if display_key == "Longitude":
-                    #     point_geometry[0] = value
-                    # if display_key == "Latitude":
-                    #     point_geometry[1] = value
-
-            """
-            Before appending feature, ensure that if there is no geometry recorded.
-            Note that the GeoJson will not render if no lat/lng
-            """
-
-            # add style information
-            if feature["properties"].get("property_state_id") is not None:
-                feature["properties"]["stroke"] = "#185189"  # buildings color
-            elif feature["properties"].get("taxlot_state_id") is not None:
-                feature["properties"]["stroke"] = "#10A0A0"  # buildings color
-            feature["properties"]["marker-color"] = "#E74C3C"
-            # feature["properties"]["stroke-width"] = 3
-            feature["properties"]["fill-opacity"] = 0
-
-            # append feature
-            features.append(feature)
-
-            response_dict = {
+    def _json_response(self, filename, data_chunks, column_name_mappings):
+        def content():
+            # the features are written one at a time in the features list of the collection
+            collection = json.dumps({
                 "type": "FeatureCollection",
                 "crs": {
                     "type": "EPSG",
                     "properties": {"code": 4326}
-                },
-                "features": features
-            }
-
-        response = JsonResponse(response_dict)
+                }
+            })
+            yield collection[:-1] + ', "features": ['
+
+            # the unique related records are added after all the records
+            related_records = OrderedDict()
+            separator = ''
+            for data in data_chunks:
+                for datum in data:
+                    for record in datum.get('related') or []:
+                        related_records.setdefault(tuple(record.items()), record)
+
+                    yield separator + json.dumps(self._geojson_feature(datum, column_name_mappings),
+                                                 cls=DjangoJSONEncoder)
+                    separator = ', '
+
+            for datum in related_records.values():
+                yield separator + json.dumps(self._geojson_feature(datum, column_name_mappings),
+                                             cls=DjangoJSONEncoder)
+                separator = ', '
+
+            yield ']}'
+
+        response = StreamingHttpResponse(content(), content_type='application/json')
         response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
 
         return response
 
+    def _geojson_feature(self, datum, column_name_mappings):
+        polygon_fields = ["bounding_box", "centroid", "property_footprint", "taxlot_footprint", "long_lat"]
+        feature = {
+            "type": "Feature",
+            "properties": {}
+        }
+
+        for key, value in datum.items():
+            if value is None:
+                continue
+
+            if isinstance(value, ureg.Quantity):
+                value = value.magnitude
+            elif isinstance(value, datetime.datetime):
+                value = value.strftime("%Y-%m-%d %H:%M:%S")
+            elif isinstance(value, datetime.date):
+                value = value.strftime("%Y-%m-%d")
+
+            if value and any(k in key for k in polygon_fields):
+                """
+                If object is a polygon and is populated, add the 'geometry'
+                key-value-pair in the appropriate GeoJSON format.
+                When the first geometry is added, the correct format is
+                established. When/If a second geometry is added, this is
+                appended alongside the previous geometry.
+                """
+                individual_geometry = {}
+
+                # long_lat
+                if key == 'long_lat':
+                    coordinates = self._serialized_point(value)
+                    # point
+                    individual_geometry = {
+                        "coordinates": coordinates,
+                        "type": "Point"
+                    }
+                else:
+                    # polygons
+                    coordinates = self._serialized_coordinates(value)
+                    individual_geometry = {
+                        "coordinates": [coordinates],
+                        "type": "Polygon"
+                    }
+
+                if feature.get("geometry", None) is None:
+                    feature["geometry"] = {
+                        "type": "GeometryCollection",
+                        "geometries": [individual_geometry]
+                    }
+                else:
+                    feature["geometry"]["geometries"].append(individual_geometry)
+            else:
+                """
+                Non-polygon data
+                """
+                display_key = column_name_mappings.get(key, key)
+                feature["properties"][display_key] = value
+
+        """
+        Before appending feature, ensure that if there is no geometry recorded.
+        Note that the GeoJson will not render if no lat/lng
+        """
+
+        # add style information
+        if feature["properties"].get("property_state_id") is not None:
+            feature["properties"]["stroke"] = "#185189"  # buildings color
+        elif feature["properties"].get("taxlot_state_id") is not None:
+            feature["properties"]["stroke"] = "#10A0A0"  # buildings color
+        feature["properties"]["marker-color"] = "#E74C3C"
+        # feature["properties"]["stroke-width"] = 3
+        feature["properties"]["fill-opacity"] = 0
+
+        return feature
+
     def _serialized_coordinates(self, polygon_wkt):
         string_coord_pairs = polygon_wkt.lstrip('POLYGON (').rstrip(')').split(', ')
 
@@ -526,30 +571,3 @@ class TaxLotPropertyViewSet(GenericViewSet):
             coordinates.append(float(coord))
 
         return coordinates
-
-    def _extract_related(self, data):
-        # extract all related records into a separate array
-        related = []
-
-        # figure out if we are dealing with properties or taxlots
-        if data[0].get("property_state_id", None) is not None:
-            is_property = True
-        elif data[0].get("taxlot_state_id", None) is not None:
-            is_property = False
-
-        for datum in data:
-            if datum.get("related", None) is not None:
-                for record in datum["related"]:
-                    related.append(record)
-
-        # make array unique
-        if is_property:
-
-            unique = [dict(p) for p in set(tuple(i.items())
-                                           for i in related)]
-
-        else:
-            unique = [dict(p) for p in set(tuple(i.items())
-                                           for i in related)]
-
-        return unique
@@ -8,7 +8,7 @@ All rights reserved.  # NOQA
 :author
 """
 
-from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.core.paginator import EmptyPage, PageNotAnInteger
 from django.http import JsonResponse
 from rest_framework import status
 from rest_framework.decorators import detail_route, list_route
@@ -43,7 +43,7 @@ from seed.models import (
     VIEW_LIST,
     VIEW_LIST_TAXLOT)
 from seed.serializers.pint import (
-    apply_display_unit_preferences,
+    apply_display_unit_preferences_to_list,
     add_pint_unit_suffix
 )
 from seed.serializers.properties import (
@@ -56,6 +56,7 @@ from seed.serializers.taxlots import (
 )
 from seed.utils.api import api_endpoint_class, ProfileIdMixin
 from seed.utils.merge import merge_taxlots
+from seed.utils.pagination import CountedPaginator, get_inventory_count, keyset_page
 from seed.utils.properties import (
     get_changed_fields,
     pair_unpair_property_taxlot,
@@ -80,11 +81,24 @@ class TaxLotViewSet(GenericViewSet, ProfileIdMixin):
         cycle_id = request.query_params.get('cycle')
         # check if there is a query paramater for the profile_id. If so, then use that one
         profile_id = request.query_params.get('profile_id', profile_id)
+        # if there is a cursor (even empty), use keyset pagination instead of pages
+        cursor = request.query_params.get('cursor')
         if not org_id:
             return JsonResponse(
                 {'status': 'error', 'message': 'Need to pass organization_id as query parameter'},
                 status=status.HTTP_400_BAD_REQUEST)
 
+        if cursor is not None:
+            try:
+                cursor = int(cursor) if cursor else None
+                per_page = int(per_page)
+            except ValueError:
+                per_page = 0
+            if per_page < 1:
+                return JsonResponse(
+                    {'status': 'error', 'message': 'cursor must be an integer and per_page a positive integer'},
+                    status=status.HTTP_400_BAD_REQUEST)
+
         if cycle_id:
             cycle = Cycle.objects.get(organization_id=org_id, pk=cycle_id)
         else:
@@ -103,27 +117,47 @@ class TaxLotViewSet(GenericViewSet, ProfileIdMixin):
                 })
 
         # Return taxlot views limited to the 'inventory_ids' list.  Otherwise, if selected is empty, return all
+        cycle_views = TaxLotView.objects.select_related('taxlot', 'state', 'cycle') \
+            .filter(taxlot__organization_id=org_id, cycle=cycle) \
+            .order_by('id')
         if 'inventory_ids' in request.data and request.data['inventory_ids']:
-            taxlot_views_list = TaxLotView.objects.select_related('taxlot', 'state', 'cycle') \
-                .filter(taxlot_id__in=request.data['inventory_ids'], taxlot__organization_id=org_id,
-                        cycle=cycle) \
-                .order_by('id')
+            taxlot_views_list = cycle_views.filter(taxlot_id__in=request.data['inventory_ids'])
+            total = taxlot_views_list.count()
         else:
-            taxlot_views_list = TaxLotView.objects.select_related('taxlot', 'state', 'cycle') \
-                .filter(taxlot__organization_id=org_id, cycle=cycle) \
-                .order_by('id')
-
-        paginator = Paginator(taxlot_views_list, per_page)
+            taxlot_views_list = cycle_views
+            total = get_inventory_count('taxlot', org_id, cycle, cycle_views)
+
+        if cursor is not None:
+            taxlot_views, next_cursor = keyset_page(taxlot_views_list, cursor, per_page)
+            pagination = {
+                'cursor': cursor,
+                'next_cursor': next_cursor,
+                'per_page': per_page,
+                'has_next': next_cursor is not None,
+                'total': total
+            }
+        else:
+            paginator = CountedPaginator(taxlot_views_list, per_page, total)
 
-        try:
-            taxlot_views = paginator.page(page)
-            page = int(page)
-        except PageNotAnInteger:
-            taxlot_views = paginator.page(1)
-            page = 1
-        except EmptyPage:
-            taxlot_views = paginator.page(paginator.num_pages)
-            page = paginator.num_pages
+            try:
+                taxlot_views = paginator.page(page)
+                page = int(page)
+            except PageNotAnInteger:
+                taxlot_views = paginator.page(1)
+                page = 1
+            except EmptyPage:
+                taxlot_views = paginator.page(paginator.num_pages)
+                page = paginator.num_pages
+
+            pagination = {
+                'page': page,
+                'start': taxlot_views.start_index(),
+                'end': taxlot_views.end_index(),
+                'num_pages': paginator.num_pages,
+                'has_next': taxlot_views.has_next(),
+                'has_previous': taxlot_views.has_previous(),
+                'total': paginator.count
+            }
 
         org = Organization.objects.get(pk=org_id)
 
@@ -157,18 +191,10 @@ class TaxLotViewSet(GenericViewSet, ProfileIdMixin):
 
         # collapse units here so we're only doing the last page; we're already a
         # realized list by now and not a lazy queryset
-        unit_collapsed_results = [apply_display_unit_preferences(org, x) for x in related_results]
+        unit_collapsed_results = apply_display_unit_preferences_to_list(org, related_results)
 
         response = {
-            'pagination': {
-                'page': page,
-                'start': paginator.page(page).start_index(),
-                'end': paginator.page(page).end_index(),
-                'num_pages': paginator.num_pages,
-                'has_next': paginator.page(page).has_next(),
-                'has_previous': paginator.page(page).has_previous(),
-                'total': paginator.count
-            },
+            'pagination': pagination,
             'cycle_id': cycle.id,
             'results': unit_collapsed_results
         }
@@ -201,6 +227,11 @@ class TaxLotViewSet(GenericViewSet, ProfileIdMixin):
               description: The number of items per page to return
               required: false
               paramType: query
+            - name: cursor
+              description: The id of the last taxlot view of the previous page. If passed (empty for
+                           the first page), the taxlots are paginated by id instead of page number
+              required: false
+              paramType: query
         """
         return self._get_filtered_results(request, profile_id=-1)
 
@@ -265,6 +296,11 @@ class TaxLotViewSet(GenericViewSet, ProfileIdMixin):
               description: The number of items per page to return
               required: false
               paramType: query
+            - name: cursor
+              description: The id of the last taxlot view of the previous page. If passed (empty for
+                           the first page), the taxlots are paginated by id instead of page number
+              required: false
+              paramType: query
             - name: profile_id
               description: Either an id of a list settings profile, or undefined
               paramType: body